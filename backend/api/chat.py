@@ -2,8 +2,11 @@ from typing import Any, Dict, List
 
 from fastapi import APIRouter, HTTPException
 
-from ..app.dependencies import get_llm_client, get_storage
+from ..app.dependencies import get_async_storage, get_llm_client, get_token_counter
+from ..core.context.builder import ContextBuilder, context_budget, conversation_context
 from ..core.conversations.models import Message, SendMessageReq, SendMessageResp
+from ..core.llm.tokens import call_usage
+from .usage import record_usage
 
 
 router = APIRouter(prefix="/api/conversations", tags=["chat"])
@@ -11,25 +14,24 @@ router = APIRouter(prefix="/api/conversations", tags=["chat"])
 
 @router.post("/{cid}/messages", response_model=SendMessageResp)
 async def send_message(cid: str, req: SendMessageReq):
-    st = get_storage()
+    st = get_async_storage()
     try:
         # Ensure conversation exists
-        st.get_messages(cid)
+        await st.get_messages_page(cid, limit=1)
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="conversation not found")
 
     # Append user message
     user_msg = Message(role="user", content=req.content)
-    st.append_message(cid, user_msg)
+    await st.append_message(cid, user_msg)
 
-    # Build history for LLM: include all messages
-    history = st.get_messages(cid)
-    messages: List[Dict[str, Any]] = [
-        {"role": m.role, "content": m.content} for m in history
-    ]
+    # Build history for LLM: fit into the model's context budget (older turns are summarized)
+    client = get_llm_client()
+    counter = get_token_counter()
+    budget = context_budget(req.model or client.default_model) - (req.max_tokens or 0)
+    messages: List[Dict[str, Any]] = await conversation_context(st, cid, ContextBuilder(client, budget, counter))
 
     # Call LLM
-    client = get_llm_client()
     try:
         result = await client.chat_completion(
             messages=messages,
@@ -48,5 +50,7 @@ async def send_message(cid: str, req: SendMessageReq):
         content = ""
 
     assistant_msg = Message(role="assistant", content=content)
-    st.append_message(cid, assistant_msg)
-    return SendMessageResp(assistant=assistant_msg)
+    await st.append_message(cid, assistant_msg)
+    usage = call_usage(counter, messages, content, result.get("usage"))
+    await record_usage("conversation", cid, usage)
+    return SendMessageResp(assistant=assistant_msg, usage=usage)
@@ -1,8 +1,9 @@
 import json
+from typing import Optional
 
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Query, Request
 
-from ..app.dependencies import get_storage
+from ..app.dependencies import get_async_storage, get_storage
 from ..core.conversations.models import ConversationMeta, CreateConversationReq, Message
 from ..infrastructure.paths import prompts_dir
 
@@ -32,11 +33,11 @@ async def create_conversation(req: CreateConversationReq, request: Request):
             # prompt 只作为system prompt
             system = prompt_data.get("prompt") or prompt_data.get("content") or str(prompt_data)
             greeting = prompt_data.get("greeting")
-    storage = get_storage()
-    meta = storage.create_conversation(req.title, system)
+    storage = get_async_storage()
+    meta = await storage.create_conversation(req.title, system)
     # 创建后将greeting作为assistant消息加入
     if greeting:
-        storage.append_message(meta.id, Message(role="assistant", content=greeting))
+        await storage.append_message(meta.id, Message(role="assistant", content=greeting))
     return meta
 
 
@@ -61,9 +62,18 @@ def delete_conversation(cid: str):
 
 
 @router.get("/{cid}/messages")
-def get_messages(cid: str):
+def get_messages(
+    cid: str,
+    before: Optional[int] = Query(None, ge=0),
+    after: Optional[int] = Query(None, ge=-1),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+):
+    # 不带分页参数时返回全量历史（兼容旧客户端）；否则按消息序号游标分页
     try:
-        msgs = get_storage().get_messages(cid)
-        return {"id": cid, "messages": msgs}
+        if before is None and after is None and limit is None:
+            msgs = get_storage().get_messages(cid)
+            return {"id": cid, "messages": msgs}
+        page = get_storage().get_messages_page(cid, before=before, after=after, limit=limit or 50)
+        return {"id": cid, **page.model_dump()}
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="conversation not found")
@@ -3,42 +3,66 @@ from __future__ import annotations
 import asyncio
 import json
 import time
-from typing import Any, AsyncGenerator, Dict, List, Optional
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional
 
-from fastapi import APIRouter, HTTPException
-from starlette.responses import StreamingResponse
+import anyio
+from fastapi import APIRouter, Header, HTTPException, Query
 
 from ..app.dependencies import (
+    get_async_group_storage,
+    get_group_broadcast,
+    get_group_signal_hub,
     get_group_storage,
     get_llm_client,
     get_provider_registry,
+    get_provider_router,
     get_settings,
+    get_stream_registry,
+    get_token_counter,
 )
-from ..core.groups.repository import GroupStorage
-from ..core.llm.client import LLMClient
+from ..core.backends import GroupStore
+from ..core.context.builder import ContextBuilder, Turn, context_budget
+from ..core.conversations.models import ConversationSummary
+from ..core.groups.orchestrator import (
+    HEURISTIC_MARGIN,
+    JUDGE_TOP_K,
+    decisive,
+    history_block,
+    predict_speakers,
+    roster_for,
+    score_speakers,
+)
+from ..core.llm.retry import deadline_in
+from ..core.llm.router import ChatClient
 from ..core.llm.streams import OpenAICompatProvider
-from ..core.roles.registry import RoleCardRegistry
+from ..core.llm.tokens import call_usage
+from ..core.roles.registry import RoleCard, RoleCardRegistry
+from ..infrastructure.async_io import AsyncStore
 from ..infrastructure.paths import ensure_dir, resolve_data_dir
+from ..infrastructure.sse import EventStreamResponse, parse_last_event_id
+from .usage import record_usage
 
 
 router = APIRouter(prefix="/api", tags=["group-chat"])
 
 
-def _gstore() -> GroupStorage:
+def _gstore() -> GroupStore:
     return get_group_storage()
 
 
+def _agstore() -> AsyncStore:
+    return get_async_group_storage()
+
+
 def _registry() -> RoleCardRegistry:
     return RoleCardRegistry()
 
 
 def _provider_for(alias: Optional[str]) -> OpenAICompatProvider:
-    preg = get_provider_registry()
-    acc = preg.get(alias)
-    if not acc:
-        raise HTTPException(status_code=500, detail="no provider available")
-    client = LLMClient(base_url=acc.base_url, api_key=acc.api_key, default_model=acc.default_model)
-    return OpenAICompatProvider(client)
+    # alias 只是首选账号：不可用时由 ProviderRouter 按优先级/权重换用其他健康账号
+    return OpenAICompatProvider(get_provider_router().bound(alias), counter=get_token_counter())
 
 
 @router.get("/group-conversations")
@@ -52,22 +76,24 @@ def create_group_conversation(payload: Dict[str, Any]):
     title = (payload.get("title") or "").strip() or None
     if not isinstance(participants, list) or not participants:
         raise HTTPException(status_code=400, detail="participants is required")
-    if len(participants) > 3:
-        raise HTTPException(status_code=400, detail="at most 3 participants are allowed")
+    limit = get_settings().group_max_participants
+    if len(participants) > limit:
+        raise HTTPException(status_code=400, detail=f"at most {limit} participants are allowed")
+    agent_ids = [p.get("agentId") for p in participants if isinstance(p, dict) and p.get("agentId")]
+    if len(agent_ids) != len(set(agent_ids)):
+        raise HTTPException(status_code=400, detail="agentId must be unique")
     # validate roleCardId exists
     reg = _registry()
     for p in participants:
         slug = p.get("roleCardId")
         if not isinstance(slug, str) or not reg.get(slug):
             raise HTTPException(status_code=400, detail=f"invalid roleCardId: {slug}")
-    # assign providerAlias if missing using providers.json accounts (exclude env-derived defaults)
+    # providerAlias 可选：未指定的参与者每次发言时由 ProviderRouter 在健康账号间分发
     preg = get_provider_registry()
-    file_accounts = [a for a in preg.list() if not a.alias.startswith("default")]
-    for idx, p in enumerate(participants):
-        if not p.get("providerAlias"):
-            acc = file_accounts[idx % len(file_accounts)] if file_accounts else None
-            if acc:
-                p["providerAlias"] = acc.alias
+    for p in participants:
+        alias = p.get("providerAlias")
+        if alias and not preg.get(alias):
+            raise HTTPException(status_code=400, detail=f"unknown providerAlias: {alias}")
     # Auto-generate a friendly Chinese title if not provided: 与A、B、C的对话
     if not title:
         names: List[str] = []
@@ -89,9 +115,17 @@ def create_group_conversation(payload: Dict[str, Any]):
 
 
 @router.get("/group-conversations/{gid}")
-def get_group(gid: str):
+def get_group(
+    gid: str,
+    before: Optional[int] = Query(None, ge=0),
+    after: Optional[int] = Query(None, ge=-1),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+):
+    # 不带分页参数时返回全量历史（兼容旧客户端）；否则 messages 只含一页并附带 page 信息
     try:
-        return _gstore().get(gid)
+        if before is None and after is None and limit is None:
+            return _gstore().get(gid)
+        return _gstore().get_page(gid, before=before, after=after, limit=limit or 50)
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="group conversation not found")
 
@@ -106,23 +140,159 @@ def _referee_log_write(gid: str, turn: int, obj: Dict[str, Any]) -> None:
         f.write(json.dumps(obj, ensure_ascii=False) + "\n")
 
 
-def _judge_client() -> LLMClient:
+def _judge_client() -> ChatClient:
     return get_llm_client()
 
 
-async def _sse_round(gid: str, text: Optional[str]) -> AsyncGenerator[bytes, None]:
-    reg = _registry()
-    gs = _gstore()
+_REPLY_MAX_TOKENS = 300
+_END = object()
+
+
+@dataclass
+class _Reply:
+    """一次发言所需的全部上下文：人设、provider、裁剪后的历史与扩展后的摘要（未扩展为 None）。"""
+
+    agent_id: str
+    rc: RoleCard
+    provider: OpenAICompatProvider
+    model: Optional[str]
+    history: List[Dict[str, str]]
+    summary: Optional[Dict[str, Any]] = None
+
+    def stream(self) -> AsyncGenerator[str, None]:
+        return self.provider.stream_reply(self.rc, self.history, model=self.model, max_tokens=_REPLY_MAX_TOKENS)
+
+
+async def _prepare(reg: RoleCardRegistry, participant: Dict[str, Any], conv: Dict[str, Any], deadline: Optional[float]) -> _Reply:
+    rc = reg.get(participant["roleCardId"])
+    provider = _provider_for(participant.get("providerAlias"))
+    model = participant.get("model")
+    sys = rc.system_prompt + (f"\n风格：{rc.style_hints}" if rc.style_hints else "")
+    names = {p["agentId"]: p.get("name") or p["roleCardId"] for p in conv.get("participants", [])}
+    turns = [
+        Turn(i, m["role"], m["content"], names.get(m.get("agentId")) if m.get("agentId") else "用户")
+        for i, m in enumerate(conv.get("messages", []))
+        if m.get("state") != "aborted"
+    ]
+    # 群聊共用一份滚动摘要（由判官账号生成），各发言者的人设 system 各自保留
+    raw_summary = conv.get("summary")
+    summary = ConversationSummary.model_validate(raw_summary) if raw_summary else None
+    builder = ContextBuilder(
+        _judge_client(), context_budget(model or provider.client.default_model) - _REPLY_MAX_TOKENS, provider.counter, deadline=deadline
+    )
+    history, extended = await builder.build(sys, turns, summary)
+    return _Reply(participant["agentId"], rc, provider, model, history, extended.model_dump(mode="json") if extended else None)
+
+
+class _Speculation:
+    """判官决定前为预测的发言者提前生成：增量先缓存在队列里，命中后从头消费，未命中则取消。"""
+
+    def __init__(self, prepare: Awaitable[_Reply]) -> None:
+        self.reply: Optional[_Reply] = None
+        self.chunks: List[str] = []
+        self._prepared: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(prepare))
+
+    async def _run(self, prepare: Awaitable[_Reply]) -> None:
+        try:
+            self.reply = await prepare
+        except Exception:
+            self._prepared.set_result(None)
+            return
+        self._prepared.set_result(self.reply)
+        try:
+            async with aclosing(self.reply.stream()) as deltas:
+                async for delta in deltas:
+                    self.chunks.append(delta)
+                    self._queue.put_nowait(delta)
+        except Exception as e:
+            self._queue.put_nowait(e)
+        else:
+            self._queue.put_nowait(_END)
+
+    async def ready(self) -> Optional[_Reply]:
+        """等待上下文准备完成；准备失败返回 None，由调用方走常规路径重新准备。"""
+        return await asyncio.shield(self._prepared)
+
+    async def deltas(self) -> AsyncGenerator[str, None]:
+        try:
+            while True:
+                item = await self._queue.get()
+                if item is _END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self.cancel()
+
+    def cancel(self) -> None:
+        self._task.cancel()
+        if not self._prepared.done():
+            self._prepared.cancel()
+
+    async def discard(self, gid: str) -> None:
+        """取消未被选中的投机生成；已经生成的部分同样消耗了 token，计入本群用量。"""
+        self.cancel()
+        await asyncio.wait([self._task])
+        if self.reply is not None and self.chunks:
+            await record_usage("group", gid, call_usage(self.reply.provider.counter, self.reply.history, "".join(self.chunks)))
+
+
+@dataclass
+class _RoundState:
+    """跨轮复用的状态：连续运行时会话与角色卡只准备一次，每轮提交后就地更新（名册按群缓存，见 roster_for）。"""
+
+    reg: RoleCardRegistry
+    conv: Optional[Dict[str, Any]] = None  # None 表示下一轮开始前需要从存储读取
+    panel: bool = False  # 每轮由全体参与者同时作答（不论编排配置的 mode）
+    tokens: int = 0
+    completed: bool = False  # 最近一轮是否正常完成
+
+
+async def _round(gid: str, text: Optional[str], state: _RoundState) -> AsyncGenerator[bytes, None]:
+    speculations: Dict[str, _Speculation] = {}
+    state.completed = False
     try:
-        conv = gs.get(gid)
-    except FileNotFoundError:
-        yield _sse_event("error", {"code": "not_found", "message": "group conversation not found"})
+        async with aclosing(_round_events(gid, text, speculations, state)) as events:
+            async for chunk in events:
+                yield chunk
+    finally:
+        # 客户端中途断开时，仍在进行的投机生成一并取消
+        for spec in speculations.values():
+            spec.cancel()
+
+
+async def _sse_round(gid: str, text: Optional[str], panel: bool = False) -> AsyncGenerator[bytes, None]:
+    state = _RoundState(_registry(), panel=panel)
+    async for chunk in _round(gid, text, state):
+        yield chunk
+    if not state.completed:
         return
+    # if paused, emit status.paused
+    if state.conv.get("paused"):
+        yield _sse_event("status.paused", {"conversationId": gid})
+    yield b"event: done\n\n"
 
-    # append user message if provided
+
+async def _round_events(
+    gid: str, text: Optional[str], speculations: Dict[str, "_Speculation"], state: _RoundState
+) -> AsyncGenerator[bytes, None]:
+    reg = state.reg
+    gs = _agstore()
+    conv = state.conv
+    if conv is None:
+        try:
+            conv = await gs.get(gid)
+        except FileNotFoundError:
+            yield _sse_event("error", {"code": "not_found", "message": "group conversation not found"})
+            return
+
+    # append user message if provided（一次写入并直接拿到更新后的会话）
     if isinstance(text, str) and text.strip():
-        gs.append_user(gid, text)
-        conv = gs.get(gid)
+        conv = await gs.commit_round(gid, messages=[{"role": "user", "content": text}])
+        yield _sse_event("user.message", {"conversationId": gid, "content": text})
 
     participants: List[Dict[str, Any]] = conv.get("participants", [])
     if not participants:
@@ -148,14 +318,26 @@ async def _sse_round(gid: str, text: Optional[str]) -> AsyncGenerator[bytes, Non
 
     # Orchestrator config
     orch = conv.get("orchestrator") or {}
+    if state.panel or orch.get("mode") == "panel":
+        async for chunk in _panel_events(gid, conv, participants, state):
+            yield chunk
+        return
     allow_repeated = bool(orch.get("allowRepeated") is True)
     max_attempts = int(orch.get("maxSelectorAttempts") or 1)
 
     last_speaker = conv.get("lastSpeaker")
+    cards = {p["roleCardId"]: rc for p in participants if (rc := reg.get(p["roleCardId"]))}
+    roster = roster_for(gid, participants, cards)
+    card_names = {slug: rc.name for slug, rc in cards.items()}
     candidates = [p["agentId"] for p in participants]
     if not allow_repeated and last_speaker in candidates and len(candidates) > 1:
         candidates = [c for c in candidates if c != last_speaker]
 
+    # 判官与摘要调用共用一个截止时间：上游变慢时本轮退回轮询选人，而不是一直等待
+    deadline = deadline_in(get_settings().llm_deadline)
+    # 本轮对编排配置与摘要的修改先记下，与发言一起在结束时一次提交
+    orch_patch: Dict[str, Any] = {}
+
     # Judge selection only when >=2 candidates; else pick the only one
     chosen: Optional[str] = None
     reason = None
@@ -167,68 +349,94 @@ async def _sse_round(gid: str, text: Optional[str]) -> AsyncGenerator[bytes, Non
         chosen = override_next
         reason = "override_next"
         # clear override
-        gs.update_orchestrator(gid, {"overrideNext": None})
+        orch_patch["overrideNext"] = None
     elif len(candidates) == 1:
         chosen = candidates[0]
         reason = "single_candidate"
     else:
-        judge_client = _judge_client()
-        # Build judge prompt
-        lines = []
-        # participants roles summary
-        for p in participants:
-            slug = p["roleCardId"]
-            rc = reg.get(slug)
-            if not rc:
-                continue
-            desc = rc.style_hints or "角色"
-            lines.append(f"{p['agentId']}: {rc.name} - {desc}")
-        roles_block = "\n".join(lines)
-        # history compact
-        hlines = []
-        for m in conv.get("messages", [])[-6:]:
-            src = m.get("agentId") if m.get("agentId") else m.get("role")
-            hlines.append(f"{src}: {m['content']}")
-        history_block = "\n".join(hlines)
-        participants_list = ", ".join(candidates)
-        base_prompt = (
-            "你是群聊的判官。请仅从候选人中选择下一位发言者的agentId，严格只输出那个agentId，不要其他内容。\n"
-            f"候选: [{participants_list}]\n不允许连续发言: {'是' if not allow_repeated else '否'}；上一位: {last_speaker or '无'}\n"
-            f"角色列表:\n{roles_block}\n\n最近历史:\n{history_block}\n"
-        )
-        while attempts < max_attempts:
-            attempts += 1
-            # call judge
-            messages = [{"role": "user", "content": base_prompt}]
-            jresp = await judge_client.chat_completion(messages=messages, stream=False, max_tokens=16)
-            raw = ""
-            try:
-                raw = jresp["choices"][0]["message"]["content"].strip()
-            except Exception:
+        ranked: List[str] = []
+        top_k = orch.get("judgeTopK")
+        top_k = JUDGE_TOP_K if top_k is None else int(top_k)
+        if orch.get("mode") == "heuristic" or 0 < top_k < len(candidates):
+            scores = score_speakers(participants, candidates, conv.get("messages", []), roster.index, card_names)
+            ranked = [sc.agentId for sc in scores]
+            if orch.get("mode") == "heuristic":
+                # 本地打分选人：差距足够大时不调用判官模型，难以区分时再交给判官
+                yield _sse_event("judge.scores", {"scores": [sc.as_dict() for sc in scores]})
+                margin = orch.get("heuristicMargin")
+                pick = decisive(scores, HEURISTIC_MARGIN if margin is None else float(margin))
+                if pick:
+                    chosen = pick
+                    reason = "heuristic"
+        # 大群：判官只看本地打分的前 k 位（名册与历史都已截断），提示词长度不随人数增长
+        shortlist = ranked[:top_k] if ranked and 0 < top_k < len(candidates) else candidates
+        if not chosen and shortlist is not candidates:
+            yield _sse_event("judge.prefilter", {"candidates": shortlist, "total": len(candidates)})
+        if not chosen:
+            judge_client = _judge_client()
+            roles_block = roster.block(shortlist)
+            recent = history_block(conv.get("messages", []))
+            # 投机生成（opt-in）：按本地预测先为最可能的候选开始生成，与判官调用并行
+            if orch.get("speculative"):
+                by_id = {p["agentId"]: p for p in participants}
+                k = int(orch.get("speculativeCandidates") or 1)
+                predicted = ranked[:k] if ranked else predict_speakers(participants, candidates, last_speaker, conv.get("messages", []), k, card_names)
+                for agent_id in predicted:
+                    speculations[agent_id] = _Speculation(_prepare(reg, by_id[agent_id], conv, deadline))
+                if speculations:
+                    yield _sse_event("judge.speculate", {"agentIds": list(speculations)})
+            participants_list = ", ".join(shortlist)
+            base_prompt = (
+                "你是群聊的判官。请仅从候选人中选择下一位发言者的agentId，严格只输出那个agentId，不要其他内容。\n"
+                f"候选: [{participants_list}]\n不允许连续发言: {'是' if not allow_repeated else '否'}；上一位: {last_speaker or '无'}\n"
+                f"角色列表:\n{roles_block}\n\n最近历史:\n{recent}\n"
+            )
+            while attempts < max_attempts:
+                attempts += 1
+                # call judge
+                messages = [{"role": "user", "content": base_prompt}]
+                # 同一提示词的首次判定可复用缓存（重试/刷新/多标签页）；判定不合法的重试必须真正重新请求
+                try:
+                    jresp = await judge_client.chat_completion(
+                        messages=messages,
+                        stream=False,
+                        max_tokens=16,
+                        cache=attempts == 1,
+                        retry=True,
+                        hedge=True,
+                        deadline=deadline,
+                    )
+                except Exception as e:
+                    yield _sse_event("judge.feedback", {"text": f"判官调用失败：{type(e).__name__}"})
+                    break
                 raw = ""
-            log_entry = {"attempt": attempts, "prompt": base_prompt, "raw": raw, "candidates": candidates, "last": last_speaker}
-            _referee_log_write(gid, int(conv.get("turn") or 0) + 1, log_entry)
-            # normalize
-            out = raw.strip().strip("` ")
-            # accept if exact match to candidate
-            if out in candidates:
-                chosen = out
-                reason = "judge_ok"
-                break
-            # try match by roleCard name or display name
-            lower = out.lower()
-            for p in participants:
-                if p["agentId"] in candidates:
-                    if lower in (p.get("name") or "").lower() or lower == p["roleCardId"].lower():
-                        if (not allow_repeated) and p["agentId"] == last_speaker:
-                            yield _sse_event("judge.feedback", {"text": "不能选择与上一位相同的发言者"})
+                try:
+                    raw = jresp["choices"][0]["message"]["content"].strip()
+                except Exception:
+                    raw = ""
+                log_entry = {"attempt": attempts, "prompt": base_prompt, "raw": raw, "candidates": shortlist, "last": last_speaker}
+                await gs.run(_referee_log_write, gid, int(conv.get("turn") or 0) + 1, log_entry)
+                # normalize
+                out = raw.strip().strip("` ")
+                # accept if exact match to candidate
+                if out in shortlist:
+                    chosen = out
+                    reason = "judge_ok"
+                    break
+                # try match by roleCard name or display name
+                lower = out.lower()
+                for p in participants:
+                    if p["agentId"] in shortlist:
+                        if lower in (p.get("name") or "").lower() or lower == p["roleCardId"].lower():
+                            if (not allow_repeated) and p["agentId"] == last_speaker:
+                                yield _sse_event("judge.feedback", {"text": "不能选择与上一位相同的发言者"})
+                                break
+                            chosen = p["agentId"]
+                            reason = "judge_name_match"
                             break
-                        chosen = p["agentId"]
-                        reason = "judge_name_match"
-                        break
-            if chosen:
-                break
-            yield _sse_event("judge.feedback", {"text": "输出不合法，请只输出一个候选 agentId。"})
+                if chosen:
+                    break
+                yield _sse_event("judge.feedback", {"text": "输出不合法，请只输出一个候选 agentId。"})
         if not chosen:
             # fallback round-robin
             order = [p["agentId"] for p in participants]
@@ -243,58 +451,303 @@ async def _sse_round(gid: str, text: Optional[str]) -> AsyncGenerator[bytes, Non
             chosen = rr
             reason = "fallback_round_robin"
 
-    yield _sse_event("judge.decision", {"agentId": chosen, "reason": reason})
+    decision: Dict[str, Any] = {"agentId": chosen, "reason": reason}
+    spec = speculations.get(chosen)
+    if speculations:
+        for agent_id, other in speculations.items():
+            if agent_id != chosen:
+                await other.discard(gid)
+        stats = dict(orch.get("speculation") or {})
+        stats["rounds"] = int(stats.get("rounds") or 0) + 1
+        stats["hits"] = int(stats.get("hits") or 0) + (spec is not None)
+        orch_patch["speculation"] = stats
+        decision["speculation"] = {"agentIds": list(speculations), "hit": spec is not None}
+    yield _sse_event("judge.decision", decision)
 
     # Produce chosen agent's message
     chosen_p = next((p for p in participants if p["agentId"] == chosen), None)
     if not chosen_p:
         yield _sse_event("error", {"code": "chosen_not_found", "message": "chosen agent not found"})
         return
-    slug = chosen_p["roleCardId"]
-    rc = reg.get(slug)
-    provider = _provider_for(chosen_p.get("providerAlias"))
-    model = chosen_p.get("model")
-
-    history = []
-    sys = rc.system_prompt + (f"\n风格：{rc.style_hints}" if rc.style_hints else "")
-    history.append({"role": "system", "content": sys})
-    for m in conv.get("messages", []):
-        history.append({"role": m["role"], "content": m["content"]})
+    reply = await spec.ready() if spec is not None else None
+    if reply is None:
+        spec = None
+        reply = await _prepare(reg, chosen_p, conv, deadline)
+    provider, history = reply.provider, reply.history
 
     message_id = f"{chosen}-{int(time.time()*1000)}"
     yield _sse_event("agent.message.created", {"agentId": chosen, "messageId": message_id})
     chunks: List[str] = []
-    async for delta in provider.stream_reply(rc, history, model=model):
-        chunks.append(delta)
-        yield _sse_event("agent.message.delta", {"agentId": chosen, "messageId": message_id, "delta": delta})
+    finished = False
+    try:
+        # 投机命中时直接消费已缓存的增量（从头开始），否则正常发起流式请求
+        async with aclosing(spec.deltas() if spec is not None else reply.stream()) as deltas:
+            async for delta in deltas:
+                chunks.append(delta)
+                yield _sse_event("agent.message.delta", {"agentId": chosen, "messageId": message_id, "delta": delta})
+        finished = True
+    finally:
+        if not finished:
+            # 客户端断开（或上游出错）：记下中断的发言，不计入轮次与上一位发言者
+            partial = "".join(chunks)
+            with anyio.CancelScope(shield=True):
+                await gs.commit_round(
+                    gid,
+                    messages=[{"role": "assistant", "content": partial, "agentId": chosen, "state": "partial" if partial else "aborted"}],
+                    orchestrator=orch_patch,
+                    summary=reply.summary,
+                )
+                await record_usage("group", gid, call_usage(provider.counter, history, partial))
     final_text = "".join(chunks)
-    gs.append_assistant(gid, chosen, final_text)
-    gs.set_last_speaker(gid, chosen)
-    turn_no = gs.bump_turn(gid)
-    yield _sse_event("agent.message.completed", {"agentId": chosen, "messageId": message_id, "usage": {"promptTokens": 0, "completionTokens": len(final_text)//4}, "finishReason": "stop", "turn": turn_no})
+    conv = await gs.commit_round(
+        gid,
+        messages=[{"role": "assistant", "content": final_text, "agentId": chosen}],
+        last_speaker=chosen,
+        bump_turn=True,
+        orchestrator=orch_patch,
+        summary=reply.summary,
+    )
+    turn_no = conv["turn"]
+    latency = provider.last_timing.as_dict() if provider.last_timing else None
+    usage = provider.last_usage or call_usage(provider.counter, history, final_text)
+    await record_usage("group", gid, usage)
+    state.conv = conv
+    state.tokens += int(usage.get("totalTokens") or 0)
+    state.completed = True
+    yield _sse_event("agent.message.completed", {"agentId": chosen, "messageId": message_id, "usage": usage, "finishReason": "stop", "turn": turn_no, "latency": latency})
+
+
+@dataclass
+class _PanelSlot:
+    """面板轮中一位参与者的作答进度。"""
+
+    participant: Dict[str, Any]
+    message_id: str
+    reply: Optional[_Reply] = None
+    chunks: List[str] = field(default_factory=list)
+    done: bool = False
+    error: Optional[str] = None
+
+    def message(self) -> Dict[str, Any]:
+        text = "".join(self.chunks)
+        msg = {"role": "assistant", "content": text, "agentId": self.participant["agentId"]}
+        if not self.done:
+            msg["state"] = "partial" if text else "aborted"
+        return msg
+
+    def usage(self) -> Optional[Dict[str, Any]]:
+        if self.reply is None or not (self.done or self.chunks):
+            return None
+        provider = self.reply.provider
+        if self.done and provider.last_usage:
+            return provider.last_usage
+        return call_usage(provider.counter, self.reply.history, "".join(self.chunks))
+
+
+async def _panel_events(
+    gid: str, conv: Dict[str, Any], participants: List[Dict[str, Any]], state: _RoundState
+) -> AsyncGenerator[bytes, None]:
+    """面板轮：同一问题同时发给全体参与者（各自的 providerAlias），增量按 agentId 交织推送，结束后一次写入全部回复。
+
+    并发数受 GROUP_PANEL_CONCURRENCY 限制；某位参与者出错不影响其他人，其回复以 partial / aborted 保存。
+    """
+    gs = _agstore()
+    deadline = deadline_in(get_settings().llm_deadline)
+    stamp = int(time.time() * 1000)
+    slots = [_PanelSlot(p, f"{p['agentId']}-{stamp}") for p in participants]
+    queue: asyncio.Queue = asyncio.Queue()
+    limit = asyncio.Semaphore(max(1, get_settings().group_panel_concurrency))
+
+    async def answer(slot: _PanelSlot) -> None:
+        try:
+            async with limit:
+                slot.reply = await _prepare(state.reg, slot.participant, conv, deadline)
+                async with aclosing(slot.reply.stream()) as deltas:
+                    async for delta in deltas:
+                        slot.chunks.append(delta)
+                        queue.put_nowait((slot, delta))
+            slot.done = True
+        except Exception as e:
+            slot.error = type(e).__name__
+        finally:
+            # 取消时同样投递结束标记，由消费方统一收尾
+            queue.put_nowait((slot, None))
+
+    yield _sse_event("panel.start", {"agentIds": [p["agentId"] for p in participants]})
+    for slot in slots:
+        yield _sse_event("agent.message.created", {"agentId": slot.participant["agentId"], "messageId": slot.message_id})
+    tasks = [asyncio.create_task(answer(slot)) for slot in slots]
+    finished = False
+    try:
+        remaining = len(slots)
+        while remaining:
+            slot, delta = await queue.get()
+            agent_id = slot.participant["agentId"]
+            if delta is not None:
+                yield _sse_event("agent.message.delta", {"agentId": agent_id, "messageId": slot.message_id, "delta": delta})
+                continue
+            remaining -= 1
+            provider = slot.reply.provider if slot.reply is not None else None
+            yield _sse_event(
+                "agent.message.completed",
+                {
+                    "agentId": agent_id,
+                    "messageId": slot.message_id,
+                    "usage": slot.usage(),
+                    "finishReason": "stop" if slot.done else "error",
+                    **({"error": slot.error} if slot.error else {}),
+                    "latency": provider.last_timing.as_dict() if provider is not None and slot.done and provider.last_timing else None,
+                },
+            )
+        finished = True
+    finally:
+        if not finished:
+            # 客户端断开：取消仍在生成的参与者，已生成的部分一次写入
+            for task in tasks:
+                task.cancel()
+            with anyio.CancelScope(shield=True):
+                await asyncio.gather(*tasks, return_exceptions=True)
+                await gs.commit_round(gid, messages=[slot.message() for slot in slots], summary=_panel_summary(slots))
+                await _record_panel_usage(gid, slots)
+    answered = [slot.participant["agentId"] for slot in slots if slot.done]
+    conv = await gs.commit_round(
+        gid,
+        messages=[slot.message() for slot in slots],
+        last_speaker=answered[-1] if answered else None,
+        bump_turn=bool(answered),
+        summary=_panel_summary(slots),
+    )
+    state.tokens += await _record_panel_usage(gid, slots)
+    state.conv = conv
+    state.completed = bool(answered)
+    yield _sse_event("panel.completed", {"agentIds": answered, "turn": conv["turn"]})
+    if not answered:
+        yield _sse_event("error", {"code": "panel_failed", "message": "no participant answered"})
 
-    # if paused, emit status.paused
-    conv2 = gs.get(gid)
-    if conv2.get("paused"):
-        yield _sse_event("status.paused", {"conversationId": gid})
-    yield b"event: done\n\n"
+
+def _panel_summary(slots: List[_PanelSlot]) -> Optional[Dict[str, Any]]:
+    # 各参与者基于同一份会话扩展摘要，取覆盖最多消息的那份
+    summaries = [slot.reply.summary for slot in slots if slot.reply is not None and slot.reply.summary]
+    return max(summaries, key=lambda sm: sm.get("upto") or 0) if summaries else None
+
+
+async def _record_panel_usage(gid: str, slots: List[_PanelSlot]) -> int:
+    usages = [u for u in (slot.usage() for slot in slots) if u]
+    await asyncio.gather(*(record_usage("group", gid, u) for u in usages))
+    return sum(int(u.get("totalTokens") or 0) for u in usages)
 
 
 def _sse_event(event: str, data: Dict[str, Any]) -> bytes:
     return f"event: {event}\n".encode() + f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
 
 
+def _serve_group(
+    gid: str, last_event_id: Optional[str], text: Optional[str], factory: Callable[[], AsyncGenerator[bytes, None]]
+) -> EventStreamResponse:
+    """群聊的一轮 / 连续运行：同一群在本进程内同时只有一个生成，其事件广播给 GET .../events 的观看者。
+
+    已有生成在进行时，不带文本的请求直接跟随它（不重复调用模型），带文本的请求返回 409。
+    """
+    registry = get_stream_registry()
+    if parse_last_event_id(last_event_id) is not None:
+        return registry.serve(last_event_id, factory)
+    hub = get_group_broadcast()
+    live = hub.live(gid)
+    if live is not None:
+        if text and text.strip():
+            raise HTTPException(status_code=409, detail="a round is already running; insert text via /user")
+        return registry.response(live)
+    return registry.response(hub.produce(gid, registry, factory()))
+
+
 @router.post("/group-conversations/{gid}/assistant/stream")
-async def group_round(gid: str, payload: Dict[str, Any]):
+async def group_round(gid: str, payload: Dict[str, Any], last_event_id: Optional[str] = Header(None)):
+    text = payload.get("text")
+    text = text if isinstance(text, str) else None
+    return _serve_group(gid, last_event_id, text, lambda: _sse_round(gid, text))
+
+
+@router.post("/group-conversations/{gid}/panel/stream")
+async def group_panel(gid: str, payload: Dict[str, Any], last_event_id: Optional[str] = Header(None)):
+    """面板作答：全体参与者同时回答同一问题，增量按 agentId 交织在一条 SSE 中。"""
     text = payload.get("text")
-    gen = _sse_round(gid, text if isinstance(text, str) else None)
-    return StreamingResponse(gen, media_type="text/event-stream")
+    text = text if isinstance(text, str) else None
+    return _serve_group(gid, last_event_id, text, lambda: _sse_round(gid, text, panel=True))
+
+
+@router.get("/group-conversations/{gid}/events")
+async def group_events(
+    gid: str,
+    policy: Optional[str] = Query(None, pattern="^(drop|catchup)$"),
+    last_event_id: Optional[str] = Header(None),
+) -> EventStreamResponse:
+    """观看群聊：持续推送该群每一轮的事件（谁发起的都一样），直到客户端断开；不会触发生成。"""
+    try:
+        await _agstore().get_page(gid, after=-1, limit=1)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="group conversation not found")
+    return EventStreamResponse(get_group_broadcast().subscribe(gid, policy, last_event_id))
+
+
+_AUTO_MAX_ROUNDS = 20
+
+
+async def _sse_auto(gid: str, text: Optional[str], rounds: int, token_budget: Optional[int]) -> AsyncGenerator[bytes, None]:
+    """在一条 SSE 中连续运行多轮：会话状态留在内存里，每轮结束各自提交；
+    暂停 / 插话 / 点名通过进程内信号即时生效（插话与点名在下一轮开始前重新读取会话）。"""
+    state = _RoundState(_registry())
+    with get_group_signal_hub().subscribe(gid) as signals:
+        stop = "rounds"
+        done = 0
+        for i in range(rounds):
+            if state.conv is None or signals.consume_dirty():
+                try:
+                    state.conv = await _agstore().get(gid)
+                except FileNotFoundError:
+                    yield _sse_event("error", {"code": "not_found", "message": "group conversation not found"})
+                    return
+            if signals.paused or state.conv.get("paused"):
+                stop = "paused"
+                break
+            if token_budget is not None and state.tokens >= token_budget:
+                stop = "token_budget"
+                break
+            yield _sse_event("auto.round", {"round": i + 1, "rounds": rounds, "tokens": state.tokens})
+            async for chunk in _round(gid, text if i == 0 else None, state):
+                yield chunk
+            if not state.completed:
+                stop = "error"
+                break
+            done += 1
+        yield _sse_event("auto.stopped", {"reason": stop, "rounds": done, "tokens": state.tokens})
+        if stop == "error":
+            return
+        if stop == "paused":
+            yield _sse_event("status.paused", {"conversationId": gid})
+        yield b"event: done\n\n"
+
+
+@router.post("/group-conversations/{gid}/auto/stream")
+async def group_auto_run(gid: str, payload: Dict[str, Any], last_event_id: Optional[str] = Header(None)):
+    text = payload.get("text")
+    text = text if isinstance(text, str) else None
+    try:
+        rounds = int(payload.get("rounds", 5))
+        budget = payload.get("maxTokens")
+        budget = int(budget) if budget is not None else None
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="rounds / maxTokens must be integers")
+    if not 1 <= rounds <= _AUTO_MAX_ROUNDS:
+        raise HTTPException(status_code=400, detail=f"rounds must be between 1 and {_AUTO_MAX_ROUNDS}")
+    return _serve_group(gid, last_event_id, text, lambda: _sse_auto(gid, text, rounds, budget))
 
 
 @router.post("/group-conversations/{gid}/pause")
 def pause_group(gid: str, payload: Dict[str, Any] | None = None):
     try:
         conv = _gstore().set_paused(gid, True)
+        get_group_signal_hub().publish(gid, "pause")
+        get_group_broadcast().publish(gid, _sse_event("status.paused", {"conversationId": gid}))
         return {"id": gid, "paused": conv.get("paused")}
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="group conversation not found")
@@ -304,6 +757,8 @@ def pause_group(gid: str, payload: Dict[str, Any] | None = None):
 def resume_group(gid: str):
     try:
         conv = _gstore().set_paused(gid, False)
+        get_group_signal_hub().publish(gid, "resume")
+        get_group_broadcast().publish(gid, _sse_event("status.resumed", {"conversationId": gid}))
         return {"id": gid, "paused": conv.get("paused")}
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="group conversation not found")
@@ -316,6 +771,8 @@ def user_insert(gid: str, payload: Dict[str, Any]):
         raise HTTPException(status_code=400, detail="text is required")
     try:
         _gstore().append_user(gid, text)
+        get_group_signal_hub().publish(gid, "user")
+        get_group_broadcast().publish(gid, _sse_event("user.message", {"conversationId": gid, "content": text}))
         return {"ok": True}
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="group conversation not found")
@@ -336,4 +793,30 @@ def override_next(gid: str, payload: Dict[str, Any]):
         raise HTTPException(status_code=400, detail="agentId not in participants")
     # Store hint
     _gstore().update_orchestrator(gid, {"overrideNext": agent_id})
+    get_group_signal_hub().publish(gid, "override")
     return {"ok": True, "agentId": agent_id}
+
+
+# 可通过 PATCH 调整的编排配置；值为 null 表示恢复默认
+_ORCHESTRATOR_KEYS = {
+    "mode",
+    "heuristicMargin",
+    "judgeTopK",
+    "allowRepeated",
+    "maxSelectorAttempts",
+    "speculative",
+    "speculativeCandidates",
+}
+
+
+@router.patch("/group-conversations/{gid}/orchestrator")
+def patch_orchestrator(gid: str, payload: Dict[str, Any]):
+    unknown = set(payload) - _ORCHESTRATOR_KEYS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown orchestrator keys: {', '.join(sorted(unknown))}")
+    try:
+        conv = _gstore().update_orchestrator(gid, payload)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="group conversation not found")
+    get_group_signal_hub().publish(gid, "config")
+    return conv.get("orchestrator") or {}
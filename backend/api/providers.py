@@ -2,7 +2,7 @@ from typing import Any, Dict, List
 
 from fastapi import APIRouter
 
-from ..app.dependencies import get_provider_registry
+from ..app.dependencies import get_llm_metrics, get_provider_registry, get_provider_router, get_response_cache
 
 
 router = APIRouter(prefix="/api/providers", tags=["providers"])
@@ -20,6 +20,27 @@ def list_providers() -> List[Dict[str, Any]]:
                 "hasApiKey": bool(acc.api_key),
                 "defaultModel": acc.default_model,
                 "priority": acc.priority,
+                "weight": acc.weight,
             }
         )
     return items
+
+
+# 以下快照读取事件循环中持续更新的 deque（健康窗口、延迟、限流桶），用 async def 在事件循环内读取，
+# 避免在线程池中遍历时与更新交错（deque mutated during iteration）
+@router.get("/metrics")
+async def provider_metrics() -> Dict[str, Any]:
+    """按账号聚合的上游调用指标：调用/错误数，TTFT 与总耗时分位数。"""
+    return get_llm_metrics().snapshot()
+
+
+@router.get("/status")
+async def provider_status() -> List[Dict[str, Any]]:
+    """各账号的实时健康状态：熔断状态、滚动错误率与延迟、在途请求数。"""
+    return get_provider_router().status()
+
+
+@router.get("/cache")
+async def provider_cache() -> Dict[str, Any]:
+    """LLM 响应缓存的命中/未命中统计与占用。"""
+    return get_response_cache().snapshot()
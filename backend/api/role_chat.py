@@ -2,15 +2,19 @@ from __future__ import annotations
 
 import json
 import time
-from typing import AsyncGenerator, Dict
+from contextlib import aclosing
+from typing import AsyncGenerator, Dict, List, Optional
 
-from fastapi import APIRouter, HTTPException
-from starlette.responses import StreamingResponse
+import anyio
+from fastapi import APIRouter, Header, HTTPException
 
-from ..app.dependencies import get_llm_client, get_storage
+from ..app.dependencies import get_async_storage, get_llm_client, get_storage, get_stream_registry, get_token_counter
+from ..core.context.builder import ContextBuilder, context_budget, conversation_context
 from ..core.conversations.models import Message
 from ..core.llm.streams import OpenAICompatProvider
+from ..core.llm.tokens import call_usage
 from ..core.roles.registry import RoleCardRegistry
+from .usage import record_usage
 
 
 router = APIRouter(prefix="/api", tags=["role-chat"])
@@ -20,13 +24,16 @@ def _storage():
     return get_storage()
 
 
+def _astorage():
+    return get_async_storage()
+
+
 def _registry() -> RoleCardRegistry:
     return RoleCardRegistry()
 
 
 def _provider() -> OpenAICompatProvider:
-    client = get_llm_client()
-    return OpenAICompatProvider(client)
+    return OpenAICompatProvider(get_llm_client(), counter=get_token_counter())
 
 
 @router.post("/role-conversations")
@@ -60,35 +67,52 @@ async def _sse(role_slug: str, cid: str, text: str, temperature: float = 0.7, ma
         yield _sse_event("error", {"code": "role_not_found", "message": "role card not found"})
         return
 
-    st = _storage()
+    st = _astorage()
     try:
-        st.get_messages(cid)
+        await st.get_messages_page(cid, limit=1)
     except FileNotFoundError:
         yield _sse_event("error", {"code": "not_found", "message": "conversation not found"})
         return
 
     # append user message first
     user_msg = Message(role="user", content=text)
-    st.append_message(cid, user_msg)
+    await st.append_message(cid, user_msg)
 
     provider = _provider()
-    # build minimal history
-    history = [{"role": m.role, "content": m.content} for m in st.get_messages(cid)]
+    # 按模型上下文预算组装历史：放不下的早期轮次并入滚动摘要
+    builder = ContextBuilder(provider.client, context_budget(provider.client.default_model) - max_tokens, provider.counter)
+    history = await conversation_context(st, cid, builder)
 
     # Create an assistant message shell id using timestamp surrogate
     message_id = f"asst-{int(time.time()*1000)}"
     yield _sse_event("status.start", {"conversationId": cid, "roleCardId": rc.slug, "model": "openai-compatible", "promptVersion": 1})
     yield _sse_event("message.created", {"messageId": message_id, "state": "generating"})
 
-    collected = []
-    async for delta in provider.stream_reply(rc, history, temperature=temperature, max_tokens=max_tokens):
-        collected.append(delta)
-        yield _sse_event("message.delta", {"messageId": message_id, "delta": delta})
+    collected: List[str] = []
+    finished = False
+    try:
+        async with aclosing(provider.stream_reply(rc, history, temperature=temperature, max_tokens=max_tokens)) as deltas:
+            async for delta in deltas:
+                collected.append(delta)
+                yield _sse_event("message.delta", {"messageId": message_id, "delta": delta})
+        finished = True
+    finally:
+        if not finished:
+            # 客户端断开（或上游出错）：上游请求已随生成器关闭而取消，这里记下中断的回复
+            partial = "".join(collected)
+            with anyio.CancelScope(shield=True):
+                await st.append_message(
+                    cid, Message(role="assistant", content=partial, state="partial" if partial else "aborted")
+                )
+                await record_usage("conversation", cid, call_usage(provider.counter, history, partial))
 
     final_text = "".join(collected)
     asst_msg = Message(role="assistant", content=final_text)
-    st.append_message(cid, asst_msg)
-    yield _sse_event("message.completed", {"messageId": message_id, "usage": {"promptTokens": 0, "completionTokens": len(final_text) // 4}, "finishReason": "stop"})
+    await st.append_message(cid, asst_msg)
+    latency = provider.last_timing.as_dict() if provider.last_timing else None
+    usage = provider.last_usage or call_usage(provider.counter, history, final_text)
+    await record_usage("conversation", cid, usage)
+    yield _sse_event("message.completed", {"messageId": message_id, "usage": usage, "finishReason": "stop", "latency": latency})
     yield b"event: done\n\n"
 
 
@@ -97,7 +121,7 @@ def _sse_event(event: str, data: Dict[str, Any]) -> bytes:
 
 
 @router.post("/role-conversations/{cid}/assistant/stream")
-async def role_assistant_stream(cid: str, payload: Dict[str, object]):
+async def role_assistant_stream(cid: str, payload: Dict[str, object], last_event_id: Optional[str] = Header(None)):
     text = payload.get("text")
     role = payload.get("roleCardId") or payload.get("slug")
     if not isinstance(text, str) or not text.strip():
@@ -106,5 +130,7 @@ async def role_assistant_stream(cid: str, payload: Dict[str, object]):
         raise HTTPException(status_code=400, detail="roleCardId is required")
     temperature = float(payload.get("temperature") or 0.7)
     max_tokens = int(payload.get("max_tokens") or 300)
-    generator = _sse(role, cid, text, temperature=temperature, max_tokens=max_tokens)
-    return StreamingResponse(generator, media_type="text/event-stream")
+    # 断线重连带 Last-Event-ID 时续接正在进行的生成，不会重复提交用户消息或再次调用模型
+    return get_stream_registry().serve(
+        last_event_id, lambda: _sse(role, cid, text, temperature=temperature, max_tokens=max_tokens)
+    )
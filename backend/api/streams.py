@@ -0,0 +1,25 @@
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query
+
+from ..app.dependencies import get_stream_registry
+from ..infrastructure.sse import EventStreamResponse
+
+
+router = APIRouter(prefix="/api/streams", tags=["streams"])
+
+
+@router.get("/{sid}")
+async def resume_stream(
+    sid: str,
+    after: Optional[int] = Query(None, ge=0),
+    last_event_id: Optional[str] = Header(None),
+) -> EventStreamResponse:
+    """以 GET 续接（便于 EventSource 自动重连）：从 Last-Event-ID（或 ?after=）之后补发并跟随直到结束。"""
+    stream = get_stream_registry().get(sid)
+    if stream is None:
+        raise HTTPException(status_code=404, detail="stream not found or expired")
+    if after is None:
+        seq = (last_event_id or "").rpartition(":")[2]
+        after = int(seq) if seq.isdigit() else 0
+    return get_stream_registry().response(stream, after)
@@ -0,0 +1,41 @@
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, HTTPException
+
+from ..app.dependencies import get_async_usage_storage, get_token_counter, get_usage_storage
+from ..core.usage.repository import USAGE_SCOPES
+
+
+router = APIRouter(prefix="/api/usage", tags=["usage"])
+
+
+@router.get("/tokenizer")
+def tokenizer_info() -> Dict[str, Any]:
+    """当前使用的本地计数方式及记忆化命中率。"""
+    return get_token_counter().snapshot()
+
+
+@router.get("/{scope}")
+def list_usage(scope: str) -> List[Dict[str, Any]]:
+    """某一维度（conversation / group / provider）下各 key 的累计 token 用量，按总量降序。"""
+    if scope not in USAGE_SCOPES:
+        raise HTTPException(status_code=404, detail="unknown usage scope")
+    return get_usage_storage().list(scope)
+
+
+@router.get("/{scope}/{key}")
+def get_usage(scope: str, key: str) -> Dict[str, Any]:
+    if scope not in USAGE_SCOPES:
+        raise HTTPException(status_code=404, detail="unknown usage scope")
+    totals = get_usage_storage().get(scope, key)
+    if totals is None:
+        raise HTTPException(status_code=404, detail="no usage recorded")
+    return totals
+
+
+async def record_usage(scope: str, key: str, usage: Dict[str, Any]) -> None:
+    """累计一次调用的用量；统计失败不影响对话本身。"""
+    try:
+        await get_async_usage_storage().record(scope, key, usage)
+    except Exception:
+        pass
@@ -1,12 +1,30 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
+from pathlib import Path
 
 from ..core.settings import Settings, get_settings as load_settings
-from ..core.conversations.repository import Storage
-from ..core.groups.repository import GroupStorage
-from ..core.llm.client import LLMClient
+from ..core.backends import (
+    ConversationStore,
+    GroupStore,
+    UsageStore,
+    create_group_storage,
+    create_storage,
+    create_usage_storage,
+)
+from ..core.groups.signals import GroupSignalHub
+from ..core.llm.cache import ResponseCache
+from ..core.llm.metrics import LLMMetrics
+from ..core.llm.pool import HTTPClientPool
 from ..core.llm.providers import ProviderRegistry
+from ..core.llm.retry import RetryPolicy
+from ..core.llm.router import ProviderRouter, RoutedClient
+from ..core.llm.tokens import TokenCounter, load_counter
+from ..infrastructure.async_io import AsyncStore
+from ..infrastructure.broadcast import GroupBroadcast
+from ..infrastructure.paths import resolve_data_dir
+from ..infrastructure.sse import StreamRegistry
 
 
 @lru_cache(maxsize=1)
@@ -16,22 +34,132 @@ def get_settings() -> Settings:
 
 
 @lru_cache(maxsize=1)
-def get_storage() -> Storage:
+def get_storage() -> ConversationStore:
+    return create_storage(get_settings())
+
+
+@lru_cache(maxsize=1)
+def get_group_storage() -> GroupStore:
+    return create_group_storage(get_settings())
+
+
+@lru_cache(maxsize=1)
+def get_storage_executor() -> ThreadPoolExecutor:
+    settings = get_settings()
+    return ThreadPoolExecutor(max_workers=max(1, settings.storage_workers), thread_name_prefix="storage")
+
+
+@lru_cache(maxsize=1)
+def get_async_storage() -> AsyncStore:
+    """供 async 路由使用：存储调用在线程池中执行，不阻塞事件循环。"""
+    return AsyncStore(get_storage(), get_storage_executor())
+
+
+@lru_cache(maxsize=1)
+def get_async_group_storage() -> AsyncStore:
+    return AsyncStore(get_group_storage(), get_storage_executor())
+
+
+@lru_cache(maxsize=1)
+def get_group_signal_hub() -> GroupSignalHub:
+    """进程内群聊信号（暂停 / 插话 / 点名），供自动连续运行的群聊即时响应。"""
+    return GroupSignalHub()
+
+
+@lru_cache(maxsize=1)
+def get_stream_registry() -> StreamRegistry:
+    """进程内可续传 SSE 流（Last-Event-ID 重连时补发并续接同一次生成）。"""
+    settings = get_settings()
+    spill_dir = resolve_data_dir(settings.data_dir) / "streams" if settings.sse_spill else None
+    return StreamRegistry(settings.sse_buffer_events, settings.sse_resume_grace, settings.sse_retain, spill_dir)
+
+
+@lru_cache(maxsize=1)
+def get_group_broadcast() -> GroupBroadcast:
+    """按 gid 广播群聊事件，供多人同时观看；配置 GROUP_BROADCAST_IPC 时在同机多个 worker 间共享。"""
     settings = get_settings()
-    return Storage(settings.data_dir)
+    ipc = Path(settings.group_broadcast_ipc) if settings.group_broadcast_ipc else None
+    return GroupBroadcast(settings.group_broadcast_queue, settings.group_broadcast_backlog, settings.group_broadcast_policy, ipc)
+
+
+@lru_cache(maxsize=1)
+def get_usage_storage() -> UsageStore:
+    return create_usage_storage(get_settings())
+
+
+@lru_cache(maxsize=1)
+def get_async_usage_storage() -> AsyncStore:
+    return AsyncStore(get_usage_storage(), get_storage_executor())
+
+
+@lru_cache(maxsize=1)
+def get_token_counter() -> TokenCounter:
+    """进程级本地 token 计数器（TOKENIZER 配置词表，按文本记忆化）。"""
+    return load_counter(get_settings().tokenizer)
 
 
 @lru_cache(maxsize=1)
-def get_group_storage() -> GroupStorage:
+def get_http_pool() -> HTTPClientPool:
+    """进程级上游连接池，由应用 lifespan 在关闭时释放。"""
     settings = get_settings()
-    return GroupStorage(settings.data_dir)
+    return HTTPClientPool(
+        timeout=settings.llm_timeout,
+        max_connections=settings.llm_max_connections,
+        max_keepalive=settings.llm_max_keepalive,
+        keepalive_expiry=settings.llm_keepalive_expiry,
+        http2=settings.llm_http2,
+    )
 
 
-def get_llm_client() -> LLMClient:
+@lru_cache(maxsize=1)
+def get_llm_metrics() -> LLMMetrics:
+    return LLMMetrics()
+
+
+@lru_cache(maxsize=1)
+def get_response_cache() -> ResponseCache:
+    """进程级 LLM 响应缓存，所有账号共享（key 含模型与完整请求体）。"""
     settings = get_settings()
-    return LLMClient(base_url=settings.llm_base_url, api_key=settings.llm_api_key, default_model=settings.llm_model)
+    disk_dir = resolve_data_dir(settings.data_dir) / "llm_cache" if settings.llm_cache_disk else None
+    return ResponseCache(
+        max_entries=settings.llm_cache_size,
+        ttl=settings.llm_cache_ttl,
+        disk_dir=disk_dir,
+        max_disk_bytes=settings.llm_cache_disk_mb * 1024 * 1024,
+    )
+
+
+def get_llm_client() -> RoutedClient:
+    """以 env 配置的默认账号为首选的路由客户端：该账号失败或熔断时自动换用其他账号。"""
+    reg = get_provider_registry()
+    if reg.env_alias is None:
+        raise RuntimeError("LLM_BASE_URL is not set in env")
+    return get_provider_router().bound(reg.env_alias)
 
 
 @lru_cache(maxsize=1)
 def get_provider_registry() -> ProviderRegistry:
-    return ProviderRegistry()
+    return ProviderRegistry(
+        pool=get_http_pool(),
+        metrics=get_llm_metrics(),
+        cache=get_response_cache(),
+        counter=get_token_counter(),
+        usage=get_async_usage_storage(),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_provider_router() -> ProviderRouter:
+    settings = get_settings()
+    return ProviderRouter(
+        get_provider_registry(),
+        failure_threshold=settings.llm_breaker_failures,
+        error_rate=settings.llm_breaker_error_rate,
+        cooldown=settings.llm_breaker_cooldown,
+        retry_policy=RetryPolicy(
+            attempts=settings.llm_retry_attempts,
+            base=settings.llm_retry_backoff,
+            cap=settings.llm_retry_backoff_max,
+        ),
+        hedge_percentile=settings.llm_hedge_percentile or None,
+    )
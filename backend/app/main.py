@@ -1,11 +1,12 @@
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Dict
+from typing import AsyncIterator, Dict
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from .dependencies import get_settings
+from .dependencies import get_group_broadcast, get_http_pool, get_provider_registry, get_settings, get_storage_executor
 from ..api.conversations import router as conversations_router
 from ..api.chat import router as chat_router
 from ..api.roles import router as roles_router
@@ -14,9 +15,37 @@ from ..api.providers import router as providers_router
 from ..api.group_chat import router as group_chat_router
 from ..api.kb import router as kb_router
 from ..api.suggestions import router as suggestions_router
+from ..api.usage import router as usage_router
+from ..api.streams import router as streams_router
 
 
-app = FastAPI(title="Philohumanities-AI (local)")
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    # 启动时建立共享连接池并为各 provider 账号预建客户端、启动群聊广播（含 worker 间中继）；关闭时依次释放
+    pool = None
+    try:
+        pool = get_http_pool()
+        for acc in get_provider_registry().list():
+            pool.client_for(acc.base_url)
+    except Exception:
+        # LLM settings missing: keep /health usable
+        pool = None
+    broadcast = None
+    try:
+        broadcast = get_group_broadcast()
+        await broadcast.start()
+    except Exception:
+        broadcast = None
+    yield
+    if broadcast is not None:
+        await broadcast.aclose()
+    if pool is not None:
+        await pool.aclose()
+    if get_storage_executor.cache_info().currsize:
+        get_storage_executor().shutdown(wait=True)
+
+
+app = FastAPI(title="Philohumanities-AI (local)", lifespan=lifespan)
 
 # CORS: if serving static from same origin, not strictly needed; safe default
 try:
@@ -40,6 +69,8 @@ app.include_router(providers_router)
 app.include_router(group_chat_router)
 app.include_router(kb_router)
 app.include_router(suggestions_router)
+app.include_router(usage_router)
+app.include_router(streams_router)
 
 
 # Serve static frontend (index.html at project root / static)
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from typing import Union
+
+from ..infrastructure.paths import resolve_data_dir
+from .conversations.repository import Storage
+from .conversations.sqlite_repository import SQLiteStorage
+from .groups.repository import GroupStorage
+from .groups.sqlite_repository import SQLiteGroupStorage
+from .settings import Settings
+from .usage.repository import UsageStorage
+from .usage.sqlite_repository import SQLiteUsageStorage
+
+
+ConversationStore = Union[Storage, SQLiteStorage]
+GroupStore = Union[GroupStorage, SQLiteGroupStorage]
+UsageStore = Union[UsageStorage, SQLiteUsageStorage]
+
+
+def create_storage(settings: Settings) -> ConversationStore:
+    """按 STORAGE_BACKEND 构造会话存储。"""
+    if settings.storage_backend == "sqlite":
+        return SQLiteStorage(resolve_data_dir(settings.sqlite_path))
+    return Storage(settings.data_dir)
+
+
+def create_group_storage(settings: Settings) -> GroupStore:
+    """按 STORAGE_BACKEND 构造群聊存储。"""
+    if settings.storage_backend == "sqlite":
+        return SQLiteGroupStorage(resolve_data_dir(settings.sqlite_path))
+    return GroupStorage(settings.data_dir)
+
+
+def create_usage_storage(settings: Settings) -> UsageStore:
+    """按 STORAGE_BACKEND 构造 token 用量存储。"""
+    if settings.storage_backend == "sqlite":
+        return SQLiteUsageStorage(resolve_data_dir(settings.sqlite_path))
+    return UsageStorage(settings.data_dir)
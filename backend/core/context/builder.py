@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from ..conversations.models import ConversationSummary
+from ..llm.router import ChatClient
+from ..llm.tokens import TokenCounter
+from ..settings import get_settings
+from ...infrastructure.async_io import AsyncStore
+
+
+def context_budget(model: Optional[str]) -> int:
+    """模型的上下文 token 预算（CONTEXT_TOKENS_BY_MODEL 优先，否则 CONTEXT_TOKENS）。"""
+    s = get_settings()
+    return s.context_tokens_by_model.get(model or "", s.context_tokens)
+
+
+@dataclass
+class Turn:
+    seq: int
+    role: str
+    content: str
+    speaker: Optional[str] = None  # 群聊中发言者的显示名，仅用于写摘要
+
+
+class ContextBuilder:
+    """在 token 预算内组装发给模型的消息。
+
+    人设 system 与最近若干轮原样保留；放不下的更早轮次并入滚动摘要。
+    摘要只在已有内容上扩展（把新移出窗口的轮次交给模型续写），不会从头重算；
+    扩展时一次移出较多轮次（只保留约 ``keep_ratio`` 的预算给原文），避免每轮都触发摘要调用。
+    摘要调用按幂等调用重试，并受 ``deadline`` 约束；失败或超时时本轮只丢弃旧轮次。
+    """
+
+    def __init__(
+        self,
+        client: ChatClient,
+        budget: int,
+        counter: Optional[TokenCounter] = None,
+        keep_ratio: float = 0.5,
+        summary_tokens: int = 400,
+        deadline: Optional[float] = None,
+    ) -> None:
+        self.client = client
+        self.budget = budget
+        self.counter = counter or TokenCounter()
+        self.keep_ratio = keep_ratio
+        self.summary_tokens = summary_tokens
+        self.deadline = deadline
+
+    def _cost(self, text: str) -> int:
+        return self.counter.count_message(text)
+
+    async def build(
+        self, system: Optional[str], turns: List[Turn], summary: Optional[ConversationSummary]
+    ) -> Tuple[List[Dict[str, str]], Optional[ConversationSummary]]:
+        """返回 (messages, 扩展后的新摘要或 None)；turns 按 seq 升序，摘要已覆盖的轮次会被忽略。"""
+        start = summary.upto if summary else 0
+        turns = [t for t in turns if t.seq >= start]
+        fixed = self._cost(system) if system else 0
+        if summary:
+            fixed += self._cost(summary.content)
+        if fixed + sum(self._cost(t.content) for t in turns) <= self.budget:
+            return _assemble(system, summary, turns), None
+
+        room = self.budget - (self._cost(system) if system else 0) - self.summary_tokens
+        keep_budget = max(0, int(room * self.keep_ratio))
+        kept: List[Turn] = []
+        used = 0
+        for t in reversed(turns):
+            cost = self._cost(t.content)
+            if kept and used + cost > keep_budget:
+                break
+            kept.append(t)
+            used += cost
+        kept.reverse()
+        folded = turns[: len(turns) - len(kept)]
+        extended = await self._extend(summary, folded, max(1, room - keep_budget))
+        if extended is None or extended is summary:
+            # 摘要扩展失败：本轮仅丢弃放不下的旧轮次，不落盘
+            return _assemble(system, summary, kept), None
+        return _assemble(system, extended, kept), extended
+
+    async def _extend(
+        self, summary: Optional[ConversationSummary], folded: List[Turn], chunk_budget: int
+    ) -> Optional[ConversationSummary]:
+        """把 folded 分批并入摘要；中途失败时返回已完成部分。"""
+        current = summary
+        batch: List[Turn] = []
+        used = 0
+        for t in folded:
+            cost = self._cost(t.content)
+            if batch and used + cost > chunk_budget:
+                nxt = await self._extend_once(current, batch)
+                if nxt is None:
+                    return current
+                current, batch, used = nxt, [], 0
+            batch.append(t)
+            used += cost
+        if batch:
+            nxt = await self._extend_once(current, batch)
+            if nxt is not None:
+                current = nxt
+        return current
+
+    async def _extend_once(
+        self, summary: Optional[ConversationSummary], batch: List[Turn]
+    ) -> Optional[ConversationSummary]:
+        lines = []
+        for t in batch:
+            who = t.speaker or {"user": "用户", "assistant": "助手"}.get(t.role, t.role)
+            lines.append(f"[{who}] {t.content}")
+        prompt = (
+            f"已有摘要：\n{summary.content if summary else '（无）'}\n\n"
+            "新增对话：\n" + "\n".join(lines)
+        )
+        messages = [
+            {
+                "role": "system",
+                "content": (
+                    "你负责维护一段对话的滚动摘要。请在已有摘要的基础上并入新增对话，输出更新后的完整摘要："
+                    "保留关键事实、各方观点与立场、用户的偏好与未决问题，按时间顺序组织，"
+                    f"不超过{self.summary_tokens}字，只输出摘要正文。"
+                ),
+            },
+            {"role": "user", "content": prompt},
+        ]
+        try:
+            resp = await self.client.chat_completion(
+                messages=messages,
+                stream=False,
+                max_tokens=self.summary_tokens * 2,
+                temperature=0.2,
+                cache=True,
+                retry=True,
+                deadline=self.deadline,
+            )
+            content = (resp["choices"][0]["message"]["content"] or "").strip()
+        except Exception:
+            return None
+        if not content:
+            return None
+        return ConversationSummary(upto=batch[-1].seq + 1, content=content)
+
+
+def _assemble(
+    system: Optional[str], summary: Optional[ConversationSummary], turns: List[Turn]
+) -> List[Dict[str, str]]:
+    out: List[Dict[str, str]] = []
+    if system:
+        out.append({"role": "system", "content": system})
+    if summary:
+        out.append({"role": "system", "content": f"（此前对话摘要，涵盖前 {summary.upto} 条消息）\n{summary.content}"})
+    out.extend({"role": t.role, "content": t.content} for t in turns)
+    return out
+
+
+async def conversation_context(storage: AsyncStore, cid: str, builder: ContextBuilder) -> List[Dict[str, str]]:
+    """单人会话的上下文：只读取摘要之后的消息，必要时扩展并保存摘要。"""
+    head = await storage.get_messages_page(cid, after=-1, limit=1)
+    first = head.messages[0] if head.messages else None
+    system = first.content if first is not None and first.role == "system" else None
+    summary = await storage.get_summary(cid)
+    start = summary.upto if summary else 0
+    # 从摘要之后（没有摘要时从 seq 0）读起；人设 system 按角色剔除，没有人设的会话首条用户消息不能丢
+    page = await storage.get_messages_page(cid, after=start - 1, limit=max(head.total, 1))
+    turns = [
+        Turn(page.start + i, m.role, m.content)
+        for i, m in enumerate(page.messages)
+        if m.role != "system" and m.state != "aborted"
+    ]
+    messages, extended = await builder.build(system, turns, summary)
+    if extended is not None:
+        await storage.set_summary(cid, extended)
+    return messages
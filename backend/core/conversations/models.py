@@ -1,18 +1,21 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import List, Literal, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
 
 Role = Literal["system", "user", "assistant"]
+# 生成被中断的助手消息：partial 为客户端断开前已生成的部分文本，aborted 为尚未产出任何内容
+MessageState = Literal["partial", "aborted"]
 
 
 class Message(BaseModel):
     role: Role
     content: str
     ts: datetime = Field(default_factory=lambda: datetime.utcnow())
+    state: Optional[MessageState] = None
 
 
 class ConversationMeta(BaseModel):
@@ -22,12 +25,30 @@ class ConversationMeta(BaseModel):
     updatedAt: datetime
 
 
+class ConversationSummary(BaseModel):
+    """滚动摘要：概括序号 < upto 的全部消息。只会被扩展（upto 单调递增），不会从头重算。"""
+
+    upto: int
+    content: str
+    updatedAt: datetime = Field(default_factory=lambda: datetime.utcnow())
+
+
 class Conversation(BaseModel):
     id: str
     title: str
     createdAt: datetime
     updatedAt: datetime
     messages: List[Message] = Field(default_factory=list)
+    summary: Optional[ConversationSummary] = None
+
+
+class MessagePage(BaseModel):
+    """一页消息：messages[i] 的序号为 start + i；total 为会话消息总数。"""
+
+    messages: List[Message] = Field(default_factory=list)
+    start: int = 0
+    total: int = 0
+    hasMore: bool = False
 
 
 class CreateConversationReq(BaseModel):
@@ -44,4 +65,5 @@ class SendMessageReq(BaseModel):
 
 class SendMessageResp(BaseModel):
     assistant: Message
+    usage: Optional[Dict[str, Any]] = None  # promptTokens / completionTokens / totalTokens / estimated
 
@@ -1,28 +1,52 @@
 from __future__ import annotations
 
+import bisect
 import json
 import uuid
 from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
 
 from filelock import FileLock
 
 from ...infrastructure.paths import ensure_dir, resolve_data_dir
-from .models import Conversation, ConversationMeta, Message
+from .models import Conversation, ConversationMeta, ConversationSummary, Message, MessagePage
+
+
+# 会话消息日志（conversations/<cid>.jsonl）：
+#   第一行为 header 记录 {"type": "header", "version", "id", "title", "createdAt", "updatedAt"}，
+#   之后每行一条记录：
+#     {"type": "message", "seq": n, "message": {...}, "updatedAt": ...}  追加消息（seq 从 0 递增）
+#     {"type": "meta", "title"?: ..., "updatedAt": ...}        元信息变更（重命名等）
+#     {"type": "summary", "summary": {"upto", "content", "updatedAt"}}  滚动摘要（以最后一条为准）
+# 追加只写一行（O(1)），读取时按顺序回放；被覆盖的 meta 记录累积到阈值后整体压缩重写。
+_LOG_VERSION = 1
+_COMPACT_AFTER = 32
+_INDEX_COMPACT_AFTER = 256
+_TAIL_BLOCK = 16 * 1024
 
 
 def _now() -> datetime:
     return datetime.utcnow()
 
 
+def _dumps(record: Dict[str, Any]) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
 class Storage:
     def __init__(self, data_dir: str) -> None:
         self.base = resolve_data_dir(data_dir)
         self.index_path = self.base / "index.json"
         self.conv_dir = self.base / "conversations"
+        self.journal_path = self.base / "index.journal"
         self.locks_dir = self.base / ".locks"
+        self._index: Dict[str, ConversationMeta] = {}
+        self._order: List[ConversationMeta] = []
+        self._index_sig: Tuple[int, int, int] | None = None
+        self._journal_offset = 0
+        self._journal_records = 0
         self._ensure_dirs()
 
     def _ensure_dirs(self) -> None:
@@ -45,33 +69,122 @@ class Storage:
             json.dump(data, f, ensure_ascii=False, indent=2, default=str)
         tmp.replace(path)
 
+    def _atomic_write_lines(self, path: Path, records: Iterable[Dict[str, Any]]) -> None:
+        tmp = path.with_name(f"{path.name}.tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            for rec in records:
+                f.write(_dumps(rec) + "\n")
+        tmp.replace(path)
+
     # Index operations
-    def _read_index(self) -> List[ConversationMeta]:
-        with self._lock("index"):
+    #
+    # index.json 是快照，index.journal 追加增量记录（put/touch/del）。进程内缓存按
+    # updatedAt 有序，通过快照的 (inode, mtime_ns, size) 与已消费的 journal 偏移判断是否失效，
+    # 因此多个 worker 共享同一目录时依然安全；增量累积到阈值后合并回快照。
+    def _index_signature(self) -> Tuple[int, int, int]:
+        st = self.index_path.stat()
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _sync_index(self) -> None:
+        """Bring the in-process index up to date (caller must hold the index lock)."""
+        sig = self._index_signature()
+        journal_size = self.journal_path.stat().st_size if self.journal_path.exists() else 0
+        if sig != self._index_sig or journal_size < self._journal_offset:
             with self.index_path.open("r", encoding="utf-8") as f:
                 raw = json.load(f)
-        return [ConversationMeta.model_validate(i) for i in raw]
+            self._index = {}
+            self._order = []
+            for item in raw:
+                self._apply_index_put(ConversationMeta.model_validate(item))
+            self._index_sig = sig
+            self._journal_offset = 0
+            self._journal_records = 0
+            self._replay_journal()
+            self._heal_index()
+        elif journal_size > self._journal_offset:
+            self._replay_journal()
+
+    def _replay_journal(self) -> None:
+        if not self.journal_path.exists():
+            return
+        with self.journal_path.open("rb") as f:
+            f.seek(self._journal_offset)
+            for raw_line in f:
+                if not raw_line.endswith(b"\n"):
+                    # partial line still being written by another worker
+                    break
+                self._journal_offset += len(raw_line)
+                self._journal_records += 1
+                try:
+                    rec = json.loads(raw_line)
+                except json.JSONDecodeError:
+                    continue
+                self._apply_index_delta(rec)
+
+    def _heal_index(self) -> None:
+        # Filter out stale entries whose files were removed externally
+        for cid in [cid for cid in self._index if not self._exists(cid)]:
+            self._append_index_delta({"op": "del", "id": cid})
+
+    def _apply_index_delta(self, rec: Dict[str, Any]) -> None:
+        op = rec.get("op")
+        if op == "put":
+            self._apply_index_put(ConversationMeta.model_validate(rec["meta"]))
+        elif op == "touch":
+            cur = self._index.get(rec.get("id"))
+            if cur is not None:
+                patch = {k: rec[k] for k in ("title", "updatedAt") if k in rec}
+                self._apply_index_put(ConversationMeta.model_validate({**cur.model_dump(), **patch}))
+        elif op == "del":
+            self._apply_index_del(rec.get("id"))
+
+    @staticmethod
+    def _order_key(meta: ConversationMeta) -> Tuple[datetime, str]:
+        return meta.updatedAt, meta.id
+
+    def _apply_index_put(self, meta: ConversationMeta) -> None:
+        self._apply_index_del(meta.id)
+        self._index[meta.id] = meta
+        bisect.insort(self._order, meta, key=self._order_key)
+
+    def _apply_index_del(self, cid: str | None) -> None:
+        cur = self._index.pop(cid, None) if cid else None
+        if cur is None:
+            return
+        i = bisect.bisect_left(self._order, self._order_key(cur), key=self._order_key)
+        if i < len(self._order) and self._order[i].id == cid:
+            self._order.pop(i)
+        else:
+            self._order = [m for m in self._order if m.id != cid]
 
-    def _write_index(self, metas: List[ConversationMeta]) -> None:
-        raw = [m.model_dump(mode="json") for m in metas]
+    def _append_index_delta(self, rec: Dict[str, Any]) -> None:
+        """Persist one index delta (caller must hold the index lock and have synced)."""
+        line = (_dumps(rec) + "\n").encode("utf-8")
+        with self.journal_path.open("ab") as f:
+            f.write(line)
+        self._journal_offset += len(line)
+        self._journal_records += 1
+        self._apply_index_delta(rec)
+        if self._journal_records >= _INDEX_COMPACT_AFTER:
+            self._compact_index()
+
+    def _compact_index(self) -> None:
+        raw = [m.model_dump(mode="json") for m in reversed(self._order)]
+        self._atomic_write(self.index_path, raw)
+        self.journal_path.write_bytes(b"")
+        self._index_sig = self._index_signature()
+        self._journal_offset = 0
+        self._journal_records = 0
+
+    def _update_index(self, rec: Dict[str, Any]) -> None:
         with self._lock("index"):
-            self._atomic_write(self.index_path, raw)
+            self._sync_index()
+            self._append_index_delta(rec)
 
     def list_conversations(self) -> List[ConversationMeta]:
-        metas = self._read_index()
-        # Filter out stale entries whose files were removed externally
-        valid: List[ConversationMeta] = []
-        changed = False
-        for m in metas:
-            if self._conv_path(m.id).exists():
-                valid.append(m)
-            else:
-                changed = True
-        if changed:
-            # Auto-heal index if we detected missing conversation files
-            self._write_index(valid)
-        valid.sort(key=lambda m: m.updatedAt, reverse=True)
-        return valid
+        with self._lock("index"):
+            self._sync_index()
+            return list(reversed(self._order))
 
     def create_conversation(self, title: str | None, system: str | None) -> ConversationMeta:
         cid = str(uuid.uuid4())
@@ -81,69 +194,311 @@ class Storage:
         if system:
             conv.messages.append(Message(role="system", content=system, ts=now))
         self._write_conversation(conv)
-        metas = self._read_index()
-        metas.append(meta)
-        self._write_index(metas)
+        self._update_index({"op": "put", "meta": meta.model_dump(mode="json")})
         return meta
 
     def _conv_path(self, cid: str) -> Path:
+        return self.conv_dir / f"{cid}.jsonl"
+
+    def _legacy_conv_path(self, cid: str) -> Path:
         return self.conv_dir / f"{cid}.json"
 
+    def _exists(self, cid: str) -> bool:
+        return self._conv_path(cid).exists() or self._legacy_conv_path(cid).exists()
+
     @contextmanager
     def _conv_lock(self, cid: str):
         with self._lock(f"conv-{cid}"):
             yield
 
-    def _read_conversation(self, cid: str) -> Conversation:
+    # Message log (caller must hold the conversation lock)
+    def _ensure_log(self, cid: str) -> Path:
+        """返回会话日志路径；旧版整文件 JSON 会话在首次访问时迁移为日志格式。"""
         path = self._conv_path(cid)
-        if not path.exists():
+        if path.exists():
+            return path
+        legacy = self._legacy_conv_path(cid)
+        if not legacy.exists():
+            raise FileNotFoundError(cid)
+        with legacy.open("r", encoding="utf-8") as f:
+            conv = Conversation.model_validate(json.load(f))
+        self._atomic_write_lines(path, self._snapshot_records(conv))
+        legacy.unlink()
+        return path
+
+    def _snapshot_records(self, conv: Conversation) -> List[Dict[str, Any]]:
+        header = {
+            "type": "header",
+            "version": _LOG_VERSION,
+            "id": conv.id,
+            "title": conv.title,
+            "createdAt": conv.createdAt.isoformat(),
+            "updatedAt": conv.updatedAt.isoformat(),
+        }
+        records = [header]
+        for seq, m in enumerate(conv.messages):
+            records.append({"type": "message", "seq": seq, "message": m.model_dump(mode="json", exclude_none=True)})
+        if conv.summary is not None:
+            # 摘要放在消息之后：回放与位置无关，get_summary/set_summary 从文件尾倒序查找时立即命中
+            records.append({"type": "summary", "summary": conv.summary.model_dump(mode="json")})
+        return records
+
+    @staticmethod
+    def _parse_record(line: bytes) -> Dict[str, Any] | None:
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError:
+            # torn write from an interrupted append
+            return {"type": "torn"}
+
+    def _iter_records(self, path: Path) -> Iterator[Dict[str, Any]]:
+        with path.open("rb") as f:
+            for line in f:
+                rec = self._parse_record(line)
+                if rec is not None:
+                    yield rec
+
+    def _iter_records_reversed(self, path: Path) -> Iterator[Dict[str, Any]]:
+        """从文件尾部按块倒序读取记录，只触及所需的尾部字节。"""
+        with path.open("rb") as f:
+            pos = f.seek(0, 2)
+            buf = b""
+            while pos > 0:
+                step = min(_TAIL_BLOCK, pos)
+                pos -= step
+                f.seek(pos)
+                buf = f.read(step) + buf
+                lines = buf.split(b"\n")
+                buf = lines[0]
+                for line in reversed(lines[1:]):
+                    rec = self._parse_record(line)
+                    if rec is not None:
+                        yield rec
+            rec = self._parse_record(buf)
+            if rec is not None:
+                yield rec
+
+    def _last_seq(self, path: Path) -> int:
+        for rec in self._iter_records_reversed(path):
+            kind = rec.get("type")
+            if kind == "header":
+                break
+            if kind == "message":
+                if "seq" not in rec:
+                    return len(self._replay(path)[0].messages) - 1
+                return int(rec["seq"])
+        return -1
+
+    def _replay(self, path: Path) -> Tuple[Conversation, int]:
+        """按顺序回放日志，返回会话与可被压缩掉的冗余记录数。"""
+        header: Dict[str, Any] | None = None
+        messages: List[Message] = []
+        summary: ConversationSummary | None = None
+        garbage = 0
+        for rec in self._iter_records(path):
+            kind = rec.get("type")
+            if kind == "header":
+                header = rec
+            elif header is None:
+                garbage += 1
+            elif kind == "message":
+                messages.append(Message.model_validate(rec["message"]))
+                if rec.get("updatedAt"):
+                    header["updatedAt"] = rec["updatedAt"]
+            elif kind == "meta":
+                header.update({k: v for k, v in rec.items() if k != "type"})
+                garbage += 1
+            elif kind == "summary":
+                if summary is not None:
+                    garbage += 1
+                summary = ConversationSummary.model_validate(rec["summary"])
+            else:
+                garbage += 1
+        if header is None:
+            raise ValueError(f"conversation log without header: {path}")
+        conv = Conversation(
+            id=header["id"],
+            title=header["title"],
+            createdAt=header["createdAt"],
+            updatedAt=header["updatedAt"],
+            messages=messages,
+            summary=summary,
+        )
+        return conv, garbage
+
+    def _append_record(self, path: Path, record: Dict[str, Any]) -> None:
+        with path.open("r+b") as f:
+            f.seek(0, 2)
+            if f.tell() > 0:
+                f.seek(-1, 2)
+                if f.read(1) != b"\n":
+                    # Isolate a torn trailing line so replay can skip it
+                    f.write(b"\n")
+            f.write((_dumps(record) + "\n").encode("utf-8"))
+
+    def _read_conversation(self, cid: str) -> Conversation:
+        if not self._exists(cid):
             raise FileNotFoundError(cid)
         with self._conv_lock(cid):
-            with path.open("r", encoding="utf-8") as f:
-                raw = json.load(f)
-        return Conversation.model_validate(raw)
+            path = self._ensure_log(cid)
+            conv, garbage = self._replay(path)
+            if garbage >= _COMPACT_AFTER:
+                self._atomic_write_lines(path, self._snapshot_records(conv))
+        return conv
 
     def _write_conversation(self, conv: Conversation) -> None:
         path = self._conv_path(conv.id)
-        raw = conv.model_dump(mode="json")
         with self._conv_lock(conv.id):
-            self._atomic_write(path, raw)
+            self._atomic_write_lines(path, self._snapshot_records(conv))
+            legacy = self._legacy_conv_path(conv.id)
+            if legacy.exists():
+                legacy.unlink()
 
     def get_messages(self, cid: str) -> List[Message]:
         return self._read_conversation(cid).messages
 
-    def append_message(self, cid: str, message: Message) -> Conversation:
-        conv = self._read_conversation(cid)
-        conv.messages.append(message)
-        conv.updatedAt = _now()
-        self._write_conversation(conv)
-        metas = self._read_index()
-        for m in metas:
-            if m.id == cid:
-                m.updatedAt = conv.updatedAt
+    def get_messages_page(
+        self, cid: str, before: int | None = None, after: int | None = None, limit: int = 50
+    ) -> MessagePage:
+        """按消息序号做游标分页。
+
+        - ``before``：返回序号 < before 的最后 ``limit`` 条（向前翻页）
+        - ``after``：返回序号 > after 的前 ``limit`` 条（向后追赶）
+        - 都不传：返回最后 ``limit`` 条
+        向前翻页和取尾部只从文件尾倒序读取，不回放整个会话。
+        """
+        if not self._exists(cid):
+            raise FileNotFoundError(cid)
+        limit = max(0, int(limit))
+        with self._conv_lock(cid):
+            path = self._ensure_log(cid)
+            if after is not None:
+                return self._page_forward(path, after, limit)
+            page = self._page_backward(path, before, limit)
+            if page is None:
+                messages = self._replay(path)[0].messages
+                end = len(messages) if before is None else max(0, min(before, len(messages)))
+                start = max(0, end - limit)
+                page = MessagePage(messages=messages[start:end], start=start, total=len(messages), hasMore=start > 0)
+            return page
+
+    def tail_messages(self, cid: str, n: int) -> List[Message]:
+        """最近 n 条消息（只读取文件尾部）。"""
+        return self.get_messages_page(cid, limit=n).messages
+
+    def _page_backward(self, path: Path, before: int | None, limit: int) -> MessagePage | None:
+        collected: List[Dict[str, Any]] = []
+        total: int | None = None
+        for rec in self._iter_records_reversed(path):
+            kind = rec.get("type")
+            if kind == "header":
                 break
-        self._write_index(metas)
-        return conv
+            if kind != "message":
+                continue
+            if "seq" not in rec:
+                return None
+            seq = int(rec["seq"])
+            if total is None:
+                total = seq + 1
+            if before is not None and seq >= before:
+                continue
+            if len(collected) >= limit:
+                break
+            collected.append(rec)
+        collected.reverse()
+        start = int(collected[0]["seq"]) if collected else min(before or 0, total or 0)
+        return MessagePage(
+            messages=[Message.model_validate(r["message"]) for r in collected],
+            start=start,
+            total=total or 0,
+            hasMore=start > 0,
+        )
 
-    def rename_conversation(self, cid: str, title: str) -> ConversationMeta:
-        conv = self._read_conversation(cid)
-        conv.title = title
-        conv.updatedAt = _now()
-        self._write_conversation(conv)
-        metas = self._read_index()
-        for m in metas:
-            if m.id == cid:
-                m.title = title
-                m.updatedAt = conv.updatedAt
+    def _page_forward(self, path: Path, after: int, limit: int) -> MessagePage:
+        collected: List[Message] = []
+        start: int | None = None
+        seq = -1
+        has_more = False
+        for rec in self._iter_records(path):
+            if rec.get("type") != "message":
+                continue
+            seq = int(rec.get("seq", seq + 1))
+            if seq <= after:
+                continue
+            if len(collected) >= limit:
+                has_more = True
                 break
-        self._write_index(metas)
+            if start is None:
+                start = seq
+            collected.append(Message.model_validate(rec["message"]))
+        total = seq + 1 if not has_more else self._last_seq(path) + 1
+        return MessagePage(messages=collected, start=start if start is not None else after + 1, total=total, hasMore=has_more)
+
+    def append_message(self, cid: str, message: Message) -> Message:
+        if not self._exists(cid):
+            raise FileNotFoundError(cid)
+        updated = _now()
+        with self._conv_lock(cid):
+            path = self._ensure_log(cid)
+            record = {
+                "type": "message",
+                "seq": self._last_seq(path) + 1,
+                "message": message.model_dump(mode="json", exclude_none=True),
+                "updatedAt": updated.isoformat(),
+            }
+            self._append_record(path, record)
+        self._update_index({"op": "touch", "id": cid, "updatedAt": updated.isoformat()})
+        return message
+
+    def get_summary(self, cid: str) -> ConversationSummary | None:
+        """最新的滚动摘要（从文件尾倒序查找；摘要之后通常只有少量消息）。"""
+        if not self._exists(cid):
+            raise FileNotFoundError(cid)
+        with self._conv_lock(cid):
+            path = self._ensure_log(cid)
+            for rec in self._iter_records_reversed(path):
+                kind = rec.get("type")
+                if kind == "header":
+                    break
+                if kind == "summary":
+                    return ConversationSummary.model_validate(rec["summary"])
+        return None
+
+    def set_summary(self, cid: str, summary: ConversationSummary) -> ConversationSummary:
+        """保存扩展后的摘要；覆盖范围不超过现有摘要时保留现有的（摘要只增不减）。"""
+        if not self._exists(cid):
+            raise FileNotFoundError(cid)
+        with self._conv_lock(cid):
+            path = self._ensure_log(cid)
+            for rec in self._iter_records_reversed(path):
+                kind = rec.get("type")
+                if kind == "header":
+                    break
+                if kind == "summary":
+                    current = ConversationSummary.model_validate(rec["summary"])
+                    if current.upto >= summary.upto:
+                        return current
+                    break
+            self._append_record(path, {"type": "summary", "summary": summary.model_dump(mode="json")})
+        return summary
+
+    def rename_conversation(self, cid: str, title: str) -> ConversationMeta:
+        if not self._exists(cid):
+            raise FileNotFoundError(cid)
+        updated = _now()
+        with self._conv_lock(cid):
+            path = self._ensure_log(cid)
+            self._append_record(path, {"type": "meta", "title": title, "updatedAt": updated.isoformat()})
+            conv, _ = self._replay(path)
+        self._update_index({"op": "touch", "id": cid, "title": title, "updatedAt": conv.updatedAt.isoformat()})
         return ConversationMeta(id=conv.id, title=conv.title, createdAt=conv.createdAt, updatedAt=conv.updatedAt)
 
     def delete_conversation(self, cid: str) -> None:
-        path = self._conv_path(cid)
-        if path.exists():
-            with self._conv_lock(cid):
-                path.unlink()
-        metas = self._read_index()
-        metas = [m for m in metas if m.id != cid]
-        self._write_index(metas)
+        with self._conv_lock(cid):
+            for path in (self._conv_path(cid), self._legacy_conv_path(cid)):
+                if path.exists():
+                    path.unlink()
+        self._update_index({"op": "del", "id": cid})
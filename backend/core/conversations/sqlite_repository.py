@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import sqlite3
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+from ...infrastructure.sqlite import SQLiteDatabase
+from .models import ConversationMeta, ConversationSummary, Message, MessagePage
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_updated ON conversations(updated_at DESC);
+CREATE TABLE IF NOT EXISTS messages (
+    conversation_id TEXT NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    ts TEXT NOT NULL,
+    state TEXT,
+    PRIMARY KEY (conversation_id, seq)
+);
+CREATE TABLE IF NOT EXISTS conversation_summaries (
+    conversation_id TEXT PRIMARY KEY REFERENCES conversations(id) ON DELETE CASCADE,
+    upto INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+"""
+
+
+def _now() -> datetime:
+    return datetime.utcnow()
+
+
+def _message(row: sqlite3.Row) -> Message:
+    return Message(role=row["role"], content=row["content"], ts=row["ts"], state=row["state"])
+
+
+def _meta(row: sqlite3.Row) -> ConversationMeta:
+    return ConversationMeta(id=row["id"], title=row["title"], createdAt=row["created_at"], updatedAt=row["updated_at"])
+
+
+class SQLiteStorage:
+    """SQLite (WAL) 版会话存储，接口与 ``Storage`` 保持一致。"""
+
+    def __init__(self, db_path: str | Path) -> None:
+        self.db = SQLiteDatabase(Path(db_path))
+        self.db.executescript(_SCHEMA)
+        self.db.ensure_column("messages", "state", "TEXT")
+
+    def _require(self, conn: sqlite3.Connection, cid: str) -> None:
+        if conn.execute("SELECT 1 FROM conversations WHERE id = ?", (cid,)).fetchone() is None:
+            raise FileNotFoundError(cid)
+
+    def list_conversations(self) -> List[ConversationMeta]:
+        rows = self.db.connection().execute(
+            "SELECT id, title, created_at, updated_at FROM conversations ORDER BY updated_at DESC"
+        ).fetchall()
+        return [_meta(r) for r in rows]
+
+    def create_conversation(self, title: str | None, system: str | None) -> ConversationMeta:
+        cid = str(uuid.uuid4())
+        now = _now()
+        meta = ConversationMeta(id=cid, title=title or "新的会话", createdAt=now, updatedAt=now)
+        with self.db.transaction() as conn:
+            conn.execute(
+                "INSERT INTO conversations (id, title, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (cid, meta.title, now.isoformat(), now.isoformat()),
+            )
+            if system:
+                conn.execute(
+                    "INSERT INTO messages (conversation_id, seq, role, content, ts) VALUES (?, 0, 'system', ?, ?)",
+                    (cid, system, now.isoformat()),
+                )
+        return meta
+
+    def get_messages(self, cid: str) -> List[Message]:
+        conn = self.db.connection()
+        self._require(conn, cid)
+        rows = conn.execute(
+            "SELECT role, content, ts, state FROM messages WHERE conversation_id = ? ORDER BY seq", (cid,)
+        ).fetchall()
+        return [_message(r) for r in rows]
+
+    def get_messages_page(
+        self, cid: str, before: int | None = None, after: int | None = None, limit: int = 50
+    ) -> MessagePage:
+        limit = max(0, int(limit))
+        conn = self.db.connection()
+        self._require(conn, cid)
+        last = conn.execute("SELECT MAX(seq) FROM messages WHERE conversation_id = ?", (cid,)).fetchone()[0]
+        total = 0 if last is None else int(last) + 1
+        if after is not None:
+            rows = conn.execute(
+                "SELECT seq, role, content, ts, state FROM messages WHERE conversation_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (cid, after, limit),
+            ).fetchall()
+            start = int(rows[0]["seq"]) if rows else after + 1
+            has_more = bool(rows) and int(rows[-1]["seq"]) < total - 1
+        else:
+            end = total if before is None else before
+            rows = conn.execute(
+                "SELECT seq, role, content, ts, state FROM messages WHERE conversation_id = ? AND seq < ? "
+                "ORDER BY seq DESC LIMIT ?",
+                (cid, end, limit),
+            ).fetchall()
+            rows.reverse()
+            start = int(rows[0]["seq"]) if rows else max(0, min(end, total))
+            has_more = start > 0
+        return MessagePage(
+            messages=[_message(r) for r in rows],
+            start=start,
+            total=total,
+            hasMore=has_more,
+        )
+
+    def tail_messages(self, cid: str, n: int) -> List[Message]:
+        return self.get_messages_page(cid, limit=n).messages
+
+    def append_message(self, cid: str, message: Message) -> Message:
+        updated = _now()
+        with self.db.transaction() as conn:
+            self._require(conn, cid)
+            conn.execute(
+                "INSERT INTO messages (conversation_id, seq, role, content, ts, state) "
+                "SELECT ?, COALESCE(MAX(seq), -1) + 1, ?, ?, ?, ? FROM messages WHERE conversation_id = ?",
+                (cid, message.role, message.content, message.ts.isoformat(), message.state, cid),
+            )
+            conn.execute("UPDATE conversations SET updated_at = ? WHERE id = ?", (updated.isoformat(), cid))
+        return message
+
+    def get_summary(self, cid: str) -> ConversationSummary | None:
+        conn = self.db.connection()
+        self._require(conn, cid)
+        row = conn.execute(
+            "SELECT upto, content, updated_at FROM conversation_summaries WHERE conversation_id = ?", (cid,)
+        ).fetchone()
+        if row is None:
+            return None
+        return ConversationSummary(upto=row["upto"], content=row["content"], updatedAt=row["updated_at"])
+
+    def set_summary(self, cid: str, summary: ConversationSummary) -> ConversationSummary:
+        with self.db.transaction() as conn:
+            self._require(conn, cid)
+            # 摘要只增不减：仅当覆盖范围更大时才替换
+            conn.execute(
+                "INSERT INTO conversation_summaries (conversation_id, upto, content, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(conversation_id) DO UPDATE SET upto = excluded.upto, content = excluded.content, "
+                "updated_at = excluded.updated_at WHERE excluded.upto > conversation_summaries.upto",
+                (cid, summary.upto, summary.content, summary.updatedAt.isoformat()),
+            )
+        return self.get_summary(cid) or summary
+
+    def rename_conversation(self, cid: str, title: str) -> ConversationMeta:
+        updated = _now()
+        with self.db.transaction() as conn:
+            cur = conn.execute(
+                "UPDATE conversations SET title = ?, updated_at = ? WHERE id = ?", (title, updated.isoformat(), cid)
+            )
+            if cur.rowcount == 0:
+                raise FileNotFoundError(cid)
+            row = conn.execute(
+                "SELECT id, title, created_at, updated_at FROM conversations WHERE id = ?", (cid,)
+            ).fetchone()
+        return _meta(row)
+
+    def delete_conversation(self, cid: str) -> None:
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM conversations WHERE id = ?", (cid,))
+
+    def import_conversation(self, meta: ConversationMeta, messages: List[Message]) -> None:
+        """批量导入一条完整会话（迁移用），已存在则整体覆盖。"""
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM conversations WHERE id = ?", (meta.id,))
+            conn.execute(
+                "INSERT INTO conversations (id, title, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (meta.id, meta.title, meta.createdAt.isoformat(), meta.updatedAt.isoformat()),
+            )
+            conn.executemany(
+                "INSERT INTO messages (conversation_id, seq, role, content, ts, state) VALUES (?, ?, ?, ?, ?, ?)",
+                [(meta.id, i, m.role, m.content, m.ts.isoformat(), m.state) for i, m in enumerate(messages)],
+            )
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import math
+import re
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..roles.registry import RoleCard
+
+
+# 启发式选人的各项权重：被点名 > 话题与人设相关度 > 久未发言
+MENTION_WEIGHT = 1.0
+TOPIC_WEIGHT = 0.6
+RECENCY_WEIGHT = 0.3
+# heuristic 模式下第一名至少领先这么多分才直接选中，否则调用判官模型
+HEURISTIC_MARGIN = 0.2
+# 相似度都低于该值时认为话题与各人设无关，不计 topic 分（避免把噪声放大成差距）
+MIN_TOPIC_SIMILARITY = 0.05
+# 候选多于该数时先在本地打分，只把前 k 位交给判官，判官提示词的长度与群规模无关
+JUDGE_TOP_K = 5
+# 判官提示词里每位角色简介、每条历史消息的最大字数
+ROSTER_HINT_CHARS = 60
+HISTORY_CHARS = 200
+# 进程内缓存名册的群数
+_ROSTER_CACHE_SIZE = 256
+
+_LATIN = re.compile(r"[a-z0-9]+")
+_CJK_RUN = re.compile(r"[\u4e00-\u9fff]+")
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isascii() and (ch.isalnum() or ch == "_")
+
+
+@lru_cache(maxsize=1024)
+def _mention_pattern(key: str) -> "re.Pattern[str]":
+    """@key 总算点名；直接提到时拉丁名须是整词，中文名按整串匹配，单字符的名字只认 @。"""
+    head = r"(?<![A-Za-z0-9_])" if _is_word_char(key[0]) else ""
+    body = re.escape(key) + (r"(?![A-Za-z0-9_])" if _is_word_char(key[-1]) else "")
+    if len(key) < 2:
+        return re.compile("@" + body, re.IGNORECASE)
+    return re.compile(f"@{body}|{head}{body}", re.IGNORECASE)
+
+
+def mentioned(
+    participants: List[Dict[str, Any]],
+    text: str,
+    card_names: Optional[Dict[str, str]] = None,
+) -> List[str]:
+    """文本中被点名的参与者 agentId，按首次出现的位置排序。
+
+    认 agentId、参与者名字、roleCardId 与角色卡名字（card_names 为 roleCardId -> 名字）。
+    """
+    card_names = card_names or {}
+    hits = []
+    for p in participants:
+        keys = {p["agentId"], p.get("name") or "", p["roleCardId"], card_names.get(p["roleCardId"]) or ""}
+        positions = [m.start() for k in keys if k and (m := _mention_pattern(k).search(text))]
+        if positions:
+            hits.append((min(positions), p["agentId"]))
+    return [agent_id for _, agent_id in sorted(hits)]
+
+
+def pending_mentions(
+    participants: List[Dict[str, Any]],
+    messages: List[Dict[str, Any]],
+    card_names: Optional[Dict[str, str]] = None,
+) -> List[str]:
+    """最近一条用户消息中被点名、且在那之后还没发过言的参与者（已回应过的点名不再计入）。"""
+    gaps = speaker_gaps(messages)
+    for gap, m in enumerate(reversed(messages)):
+        if m.get("role") == "user":
+            return [a for a in mentioned(participants, m.get("content") or "", card_names) if gaps.get(a, gap + 1) > gap]
+    return []
+
+
+def round_robin(participants: List[Dict[str, Any]], last_speaker: Optional[str]) -> List[str]:
+    """从上一位发言者之后开始的轮询顺序。"""
+    order = [p["agentId"] for p in participants]
+    if last_speaker in order:
+        i = order.index(last_speaker) + 1
+        order = order[i:] + order[:i]
+    return order
+
+
+def predict_speakers(
+    participants: List[Dict[str, Any]],
+    candidates: List[str],
+    last_speaker: Optional[str],
+    messages: List[Dict[str, Any]],
+    k: int = 1,
+    card_names: Optional[Dict[str, str]] = None,
+) -> List[str]:
+    """不调用模型，猜测判官最可能选中的 k 位候选：被点名且尚未回应者优先，其次按轮询顺序。"""
+    ranked: List[str] = []
+    for agent_id in pending_mentions(participants, messages, card_names) + round_robin(participants, last_speaker):
+        if agent_id in candidates and agent_id not in ranked:
+            ranked.append(agent_id)
+    return ranked[: max(0, k)]
+
+
+def terms(text: str) -> List[str]:
+    """切词：拉丁字母/数字按词，中文按相邻二字组（单字成段时取单字），不依赖分词库。"""
+    lowered = text.lower()
+    out = _LATIN.findall(lowered)
+    for run in _CJK_RUN.findall(lowered):
+        if len(run) == 1:
+            out.append(run)
+        else:
+            out.extend(run[i : i + 2] for i in range(len(run) - 1))
+    return out
+
+
+class PersonaIndex:
+    """角色卡人设（system prompt + 风格）的 TF-IDF 向量，IDF 按全部角色卡计算。"""
+
+    def __init__(self, docs: Dict[str, str]) -> None:
+        counts = {slug: Counter(terms(text)) for slug, text in docs.items()}
+        df: Counter = Counter()
+        for c in counts.values():
+            df.update(c.keys())
+        n = len(counts)
+        self.idf = {t: math.log((1 + n) / (1 + d)) + 1.0 for t, d in df.items()}
+        self.vectors = {slug: self._normalize(c) for slug, c in counts.items()}
+
+    def _normalize(self, counts: Counter) -> Dict[str, float]:
+        vec = {t: (1 + math.log(tf)) * self.idf.get(t, 0.0) for t, tf in counts.items()}
+        norm = math.sqrt(sum(v * v for v in vec.values()))
+        return {t: v / norm for t, v in vec.items()} if norm else {}
+
+    def similarity(self, slug: str, text: str) -> float:
+        """text 与角色人设的余弦相似度（0..1）；未收录的词不计分。"""
+        return self.similarities([slug], text)[slug]
+
+    def similarities(self, slugs: List[str], text: str) -> Dict[str, float]:
+        """text 与多个角色人设的相似度，text 只切词、向量化一次。"""
+        query = self._normalize(Counter(t for t in terms(text) if t in self.idf))
+        out = {}
+        for slug in slugs:
+            persona = self.vectors.get(slug) or {}
+            out[slug] = sum(v * persona.get(t, 0.0) for t, v in query.items())
+        return out
+
+
+@lru_cache(maxsize=8)
+def _persona_index(docs: Tuple[Tuple[str, str], ...]) -> PersonaIndex:
+    return PersonaIndex(dict(docs))
+
+
+def persona_index(cards: List[RoleCard]) -> PersonaIndex:
+    """按角色卡内容缓存的 PersonaIndex（角色卡不变时只构建一次）。"""
+    return _persona_index(tuple(sorted((rc.slug, f"{rc.system_prompt}\n{rc.style_hints or ''}") for rc in cards)))
+
+
+@dataclass
+class Roster:
+    """群成员的紧凑名册：判官提示词用的一行简介与本群角色卡的 PersonaIndex，成员与角色卡不变时跨轮复用。"""
+
+    lines: Dict[str, str]  # agentId -> "agentId: 名字 - 风格"
+    index: PersonaIndex
+
+    def block(self, agent_ids: List[str]) -> str:
+        return "\n".join(self.lines[a] for a in agent_ids if a in self.lines)
+
+
+_rosters: "OrderedDict[str, Tuple[Tuple[Any, ...], Roster]]" = OrderedDict()
+
+
+def _clip(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def roster_for(gid: str, participants: List[Dict[str, Any]], cards: Dict[str, RoleCard]) -> Roster:
+    """按群缓存的名册；参与者或其角色卡变化时重建。cards 为 roleCardId -> RoleCard（缺失的参与者不进名册）。"""
+    fingerprint = tuple(
+        (p["agentId"], p["roleCardId"], p.get("name"), rc.name, rc.style_hints, rc.system_prompt)
+        for p in participants
+        if (rc := cards.get(p["roleCardId"])) is not None
+    )
+    hit = _rosters.get(gid)
+    if hit is not None and hit[0] == fingerprint:
+        _rosters.move_to_end(gid)
+        return hit[1]
+    lines = {
+        agent_id: f"{agent_id}: {rc_name} - {_clip(style or '角色', ROSTER_HINT_CHARS)}"
+        for agent_id, _, _, rc_name, style, _ in fingerprint
+    }
+    used = {p["roleCardId"]: cards[p["roleCardId"]] for p in participants if p["roleCardId"] in cards}
+    roster = Roster(lines, persona_index(list(used.values())))
+    _rosters[gid] = (fingerprint, roster)
+    while len(_rosters) > _ROSTER_CACHE_SIZE:
+        _rosters.popitem(last=False)
+    return roster
+
+
+def history_block(messages: List[Dict[str, Any]], n: int = 6) -> str:
+    """判官提示词中的最近 n 条消息，每条截断到 HISTORY_CHARS 字。"""
+    return "\n".join(
+        f"{m.get('agentId') or m.get('role')}: {_clip(m.get('content') or '', HISTORY_CHARS)}" for m in messages[-n:]
+    )
+
+
+def speaker_gaps(messages: List[Dict[str, Any]]) -> Dict[str, int]:
+    """一次倒序扫描得到每位发言者距今隔了多少条消息（最近一条为 0）。"""
+    gaps: Dict[str, int] = {}
+    for gap, m in enumerate(reversed(messages)):
+        agent_id = m.get("agentId")
+        if agent_id and agent_id not in gaps:
+            gaps[agent_id] = gap
+    return gaps
+
+
+@dataclass
+class SpeakerScore:
+    agentId: str
+    score: float
+    mention: float
+    topic: float
+    recency: float
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {k: round(v, 3) if isinstance(v, float) else v for k, v in self.__dict__.items()}
+
+
+def score_speakers(
+    participants: List[Dict[str, Any]],
+    candidates: List[str],
+    messages: List[Dict[str, Any]],
+    index: PersonaIndex,
+    card_names: Optional[Dict[str, str]] = None,
+) -> List[SpeakerScore]:
+    """给候选打分并按分数降序返回。
+
+    mention：最近一条用户消息中被点名且之后还没发过言（按点名先后递减）；topic：最近两条消息与人设的 TF-IDF 相似度，
+    按候选中的最大值归一（都很低时记 0）；recency：距上次发言隔了多少条消息（从未发言为 1）。
+    """
+    names = pending_mentions(participants, messages, card_names)
+    query = "\n".join(m.get("content") or "" for m in messages[-2:])
+    by_id = {p["agentId"]: p for p in participants}
+    by_card = index.similarities(list({by_id[a]["roleCardId"] for a in candidates}), query)
+    raw_topic = {a: by_card[by_id[a]["roleCardId"]] for a in candidates}
+    top_topic = max(raw_topic.values(), default=0.0)
+    span = max(1, len(participants))
+    gaps = speaker_gaps(messages)
+    scores = []
+    for agent_id in candidates:
+        mention = 1.0 / (1 + names.index(agent_id)) if agent_id in names else 0.0
+        topic = raw_topic[agent_id] / top_topic if top_topic >= MIN_TOPIC_SIMILARITY else 0.0
+        recency = min(1.0, gaps[agent_id] / span) if agent_id in gaps else 1.0
+        total = MENTION_WEIGHT * mention + TOPIC_WEIGHT * topic + RECENCY_WEIGHT * recency
+        scores.append(SpeakerScore(agent_id, total, mention, topic, recency))
+    scores.sort(key=lambda s: s.score, reverse=True)
+    return scores
+
+
+def decisive(scores: List[SpeakerScore], margin: float) -> Optional[str]:
+    """第一名领先第二名至少 margin 时返回其 agentId，否则视为难以区分（交给判官模型）。"""
+    if not scores:
+        return None
+    if len(scores) == 1 or scores[0].score - scores[1].score >= margin:
+        return scores[0].agentId
+    return None
@@ -1,18 +1,24 @@
 from __future__ import annotations
 
 import json
+import threading
 import uuid
+from collections import OrderedDict
 from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
 from filelock import FileLock
 
 from ...infrastructure.paths import ensure_dir, resolve_data_dir
 
 
+# 进程内缓存已解析快照的群数（LRU）
+_SNAPSHOT_CACHE_SIZE = 64
+
+
 def _now() -> datetime:
     return datetime.utcnow()
 
@@ -44,6 +50,60 @@ class GroupConversation:
     messages: List[GroupMessage]
 
 
+def normalize_participants(participants: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    parts: List[Dict[str, Any]] = []
+    for i, p in enumerate(participants):
+        agent_id = p.get("agentId") or f"agent-{i+1}"
+        parts.append(
+            {
+                "agentId": agent_id,
+                "roleCardId": p["roleCardId"],
+                "name": p.get("name") or p["roleCardId"],
+                "model": p.get("model"),
+                "providerAlias": p.get("providerAlias"),
+            }
+        )
+    return parts
+
+
+def default_orchestrator() -> Dict[str, Any]:
+    return {
+        "mode": "selector",
+        "allowRepeated": False,
+        "maxSelectorAttempts": 1,
+    }
+
+
+def patch_orchestrator(orch: Optional[Dict[str, Any]], patch: Dict[str, Any]) -> Dict[str, Any]:
+    """合并编排配置补丁：值为 None 的键表示清除（如用过的 overrideNext）。"""
+    out = dict(orch or {})
+    for k, v in patch.items():
+        if v is None:
+            out.pop(k, None)
+        else:
+            out[k] = v
+    return out
+
+
+def _merge_summary(conv: Dict[str, Any], summary: Dict[str, Any]) -> None:
+    current = conv.get("summary")
+    # 摘要只增不减：仅当覆盖范围更大时才替换
+    if not current or int(current.get("upto") or 0) < int(summary["upto"]):
+        conv["summary"] = summary
+
+
+def page_bounds(total: int, before: Optional[int], after: Optional[int], limit: int) -> Tuple[int, int, bool]:
+    """按消息序号（即下标）计算分页区间 [start, end) 以及是否还有更多。"""
+    limit = max(0, int(limit))
+    if after is not None:
+        start = max(0, after + 1)
+        end = min(total, start + limit)
+        return start, end, end < total
+    end = total if before is None else max(0, min(before, total))
+    start = max(0, end - limit)
+    return start, end, start > 0
+
+
 class GroupStorage:
     def __init__(self, data_dir: str) -> None:
         base = resolve_data_dir(data_dir)
@@ -51,6 +111,11 @@ class GroupStorage:
         self.index_path = self.root / "index.json"
         self.conv_dir = self.root / "conversations"
         self.locks_dir = self.root / ".locks"
+        # 只读快照缓存（LRU）：gid -> ((inode, mtime_ns, size), conv)，供分页/尾部读取复用解析结果
+        self._snapshots: "OrderedDict[str, Tuple[Tuple[int, int, int], Dict[str, Any]]]" = OrderedDict()
+        self._guard = threading.Lock()
+        self._local_locks: Dict[str, threading.Lock] = {}
+        self._index_pending: Dict[str, Any] = {}
         self._ensure_dirs()
 
     def _ensure_dirs(self) -> None:
@@ -62,9 +127,12 @@ class GroupStorage:
 
     @contextmanager
     def _lock(self, name: str):
+        # 同进程的线程先在内存锁上排队，避免多个线程同时轮询同一个文件锁（filelock 默认 50ms 轮询一次）
+        with self._guard:
+            local = self._local_locks.setdefault(name, threading.Lock())
         lock_path = self.locks_dir / f"{name}.lock"
         lock = FileLock(str(lock_path))
-        with lock:
+        with local, lock:
             yield
 
     def _atomic_write(self, path: Path, data) -> None:
@@ -78,10 +146,6 @@ class GroupStorage:
             with self.index_path.open("r", encoding="utf-8") as f:
                 return json.load(f)
 
-    def _write_index(self, items: List[Dict[str, Any]]) -> None:
-        with self._lock("index"):
-            self._atomic_write(self.index_path, items)
-
     def _conv_path(self, gid: str) -> Path:
         return self.conv_dir / f"{gid}.json"
 
@@ -93,18 +157,7 @@ class GroupStorage:
     def create_conversation(self, title: Optional[str], participants: List[Dict[str, Any]]) -> Dict[str, Any]:
         gid = str(uuid.uuid4())
         now = _now()
-        parts: List[Dict[str, Any]] = []
-        for i, p in enumerate(participants):
-            agent_id = p.get("agentId") or f"agent-{i+1}"
-            parts.append(
-                {
-                    "agentId": agent_id,
-                    "roleCardId": p["roleCardId"],
-                    "name": p.get("name") or p["roleCardId"],
-                    "model": p.get("model"),
-                    "providerAlias": p.get("providerAlias"),
-                }
-            )
+        parts = normalize_participants(participants)
         conv = {
             "id": gid,
             "title": title or "群聊会话",
@@ -112,19 +165,13 @@ class GroupStorage:
             "updatedAt": now,
             "participants": parts,
             "messages": [],
-            "orchestrator": {
-                "mode": "selector",
-                "allowRepeated": False,
-                "maxSelectorAttempts": 1,
-            },
+            "orchestrator": default_orchestrator(),
             "lastSpeaker": None,
             "paused": False,
             "turn": 0,
         }
         self._write_conv(conv)
-        idx = self._read_index()
-        idx.append({"id": gid, "title": conv["title"], "createdAt": now, "updatedAt": now})
-        self._write_index(idx)
+        self._update_index(lambda items: items.append({"id": gid, "title": conv["title"], "createdAt": now, "updatedAt": now}))
         return {"id": gid, "title": conv["title"], "createdAt": now, "updatedAt": now, "participants": parts}
 
     def _write_conv(self, conv: Dict[str, Any]) -> None:
@@ -143,49 +190,167 @@ class GroupStorage:
     def get(self, gid: str) -> Dict[str, Any]:
         return self._read_conv(gid)
 
+    def _snapshot(self, gid: str) -> Dict[str, Any]:
+        """返回已解析的会话快照（只读，调用方不得修改）；文件未变时不重新解析。"""
+        path = self._conv_path(gid)
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            with self._guard:
+                self._snapshots.pop(gid, None)
+            raise FileNotFoundError(gid)
+        sig = (st.st_ino, st.st_mtime_ns, st.st_size)
+        with self._guard:
+            cached = self._snapshots.get(gid)
+            if cached and cached[0] == sig:
+                self._snapshots.move_to_end(gid)
+                return cached[1]
+        conv = self._read_conv(gid)
+        with self._guard:
+            self._snapshots[gid] = (sig, conv)
+            self._snapshots.move_to_end(gid)
+            while len(self._snapshots) > _SNAPSHOT_CACHE_SIZE:
+                self._snapshots.popitem(last=False)
+        return conv
+
+    def get_page(
+        self, gid: str, before: Optional[int] = None, after: Optional[int] = None, limit: int = 50
+    ) -> Dict[str, Any]:
+        """返回会话信息与一页消息（游标为消息序号），附带 page: {start, total, hasMore}。"""
+        snap = self._snapshot(gid)
+        messages = snap.get("messages", [])
+        start, end, has_more = page_bounds(len(messages), before, after, limit)
+        out = {k: v for k, v in snap.items() if k != "messages"}
+        out["messages"] = [dict(m) for m in messages[start:end]]
+        out["page"] = {"start": start, "total": len(messages), "hasMore": has_more}
+        return out
+
+    def tail_messages(self, gid: str, n: int) -> List[Dict[str, Any]]:
+        messages = self._snapshot(gid).get("messages", [])
+        return [dict(m) for m in messages[-n:]] if n > 0 else []
+
     def list(self) -> List[Dict[str, Any]]:
         items = self._read_index()
         items.sort(key=lambda x: x["updatedAt"], reverse=True)
         return items
 
+    def _mutate(self, gid: str, fn: Callable[[Dict[str, Any]], Any]) -> Any:
+        """在会话锁内完成一次 read-modify-write；``updatedAt`` 变化时同步到 index.json。"""
+        path = self._conv_path(gid)
+        if not path.exists():
+            raise FileNotFoundError(gid)
+        with self._conv_lock(gid):
+            with path.open("r", encoding="utf-8") as f:
+                conv = json.load(f)
+            before = conv.get("updatedAt")
+            result = fn(conv)
+            self._atomic_write(path, conv)
+        if conv.get("updatedAt") != before:
+            self._touch_index(gid, conv["updatedAt"])
+        return result
+
+    def _update_index(self, fn: Callable[[List[Dict[str, Any]]], None]) -> None:
+        with self._lock("index"):
+            self._apply_index(fn)
+
+    def _apply_index(self, fn: Callable[[List[Dict[str, Any]]], None]) -> None:
+        with self.index_path.open("r", encoding="utf-8") as f:
+            items = json.load(f)
+        fn(items)
+        self._atomic_write(self.index_path, items)
+
+    def _touch_index(self, gid: str, updated_at: Any) -> None:
+        """把会话的 updatedAt 同步到 index.json。
+
+        并发提交时先登记到待写表，拿到锁的线程一次写入全部待写项，排在后面的线程发现已被写入即直接返回，
+        多个群聊同时提交时 index.json 不必逐个重写。
+        """
+        with self._guard:
+            self._index_pending[gid] = updated_at
+        with self._lock("index"):
+            with self._guard:
+                pending, self._index_pending = self._index_pending, {}
+            if not pending:
+                return
+
+            def touch(items: List[Dict[str, Any]]) -> None:
+                for item in items:
+                    if item.get("id") in pending:
+                        item["updatedAt"] = pending[item["id"]]
+
+            self._apply_index(touch)
+
     def append_user(self, gid: str, text: str) -> None:
-        conv = self._read_conv(gid)
-        conv["messages"].append({"role": "user", "content": text, "ts": _now(), "agentId": None})
-        conv["updatedAt"] = _now()
-        self._write_conv(conv)
+        self.commit_round(gid, messages=[{"role": "user", "content": text}])
 
-    def append_assistant(self, gid: str, agent_id: str, text: str) -> None:
-        conv = self._read_conv(gid)
-        conv["messages"].append({"role": "assistant", "content": text, "ts": _now(), "agentId": agent_id})
-        conv["updatedAt"] = _now()
-        self._write_conv(conv)
+    def append_assistant(self, gid: str, agent_id: str, text: str, state: Optional[str] = None) -> None:
+        """追加助手消息；state 为 partial / aborted 时表示生成被中断（见 MessageState）。"""
+        self.commit_round(gid, messages=[{"role": "assistant", "content": text, "agentId": agent_id, "state": state}])
 
     def set_paused(self, gid: str, paused: bool) -> Dict[str, Any]:
-        conv = self._read_conv(gid)
-        conv["paused"] = bool(paused)
-        conv["updatedAt"] = _now()
-        self._write_conv(conv)
-        return conv
+        def apply(conv: Dict[str, Any]) -> Dict[str, Any]:
+            conv["paused"] = bool(paused)
+            conv["updatedAt"] = _now()
+            return conv
+
+        return self._mutate(gid, apply)
 
     def set_last_speaker(self, gid: str, agent_id: Optional[str]) -> Dict[str, Any]:
-        conv = self._read_conv(gid)
-        conv["lastSpeaker"] = agent_id
-        conv["updatedAt"] = _now()
-        self._write_conv(conv)
-        return conv
+        def apply(conv: Dict[str, Any]) -> Dict[str, Any]:
+            conv["lastSpeaker"] = agent_id
+            conv["updatedAt"] = _now()
+            return conv
+
+        return self._mutate(gid, apply)
 
     def bump_turn(self, gid: str) -> int:
-        conv = self._read_conv(gid)
-        conv["turn"] = int(conv.get("turn") or 0) + 1
-        conv["updatedAt"] = _now()
-        self._write_conv(conv)
-        return conv["turn"]
+        return self.commit_round(gid, bump_turn=True)["turn"]
+
+    def get_summary(self, gid: str) -> Optional[Dict[str, Any]]:
+        """滚动摘要 {upto, content, updatedAt}（见 ConversationSummary），没有则为 None。"""
+        return self._snapshot(gid).get("summary")
+
+    def set_summary(self, gid: str, summary: Dict[str, Any]) -> Dict[str, Any]:
+        def apply(conv: Dict[str, Any]) -> Dict[str, Any]:
+            _merge_summary(conv, summary)
+            return conv["summary"]
+
+        return self._mutate(gid, apply)
 
     def update_orchestrator(self, gid: str, patch: Dict[str, Any]) -> Dict[str, Any]:
-        conv = self._read_conv(gid)
-        orch = conv.get("orchestrator") or {}
-        orch.update({k: v for k, v in patch.items() if v is not None})
-        conv["orchestrator"] = orch
-        conv["updatedAt"] = _now()
-        self._write_conv(conv)
-        return conv
+        return self.commit_round(gid, orchestrator=patch)
+
+    def commit_round(
+        self,
+        gid: str,
+        messages: Sequence[Dict[str, Any]] = (),
+        last_speaker: Optional[str] = None,
+        bump_turn: bool = False,
+        orchestrator: Optional[Dict[str, Any]] = None,
+        summary: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """一次 read-modify-write 提交一轮的全部变更，返回提交后的会话。
+
+        messages 为 {role, content, agentId?, state?}，按顺序追加；last_speaker 为 None 时不修改；
+        orchestrator 是补丁，值为 None 的键会被删除；summary 按只增不减的规则合并。
+        """
+
+        def apply(conv: Dict[str, Any]) -> Dict[str, Any]:
+            now = _now()
+            for m in messages:
+                msg = {"role": m["role"], "content": m["content"], "ts": now, "agentId": m.get("agentId")}
+                if m.get("state"):
+                    msg["state"] = m["state"]
+                conv["messages"].append(msg)
+            if last_speaker is not None:
+                conv["lastSpeaker"] = last_speaker
+            if bump_turn:
+                conv["turn"] = int(conv.get("turn") or 0) + 1
+            if orchestrator:
+                conv["orchestrator"] = patch_orchestrator(conv.get("orchestrator"), orchestrator)
+            if summary:
+                _merge_summary(conv, summary)
+            conv["updatedAt"] = now
+            return conv
+
+        return self._mutate(gid, apply)
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Set
+
+
+# 信号种类：pause / resume 改变暂停状态；user / override / config 表示会话被外部修改过
+SIGNAL_KINDS = ("pause", "resume", "user", "override", "config")
+
+
+class GroupSignals:
+    """一个正在自动运行的群聊收到的进程内信号。
+
+    信号通过 ``call_soon_threadsafe`` 投递到订阅方的事件循环，状态只在该循环中修改，
+    同步接口（线程池）发布时无需额外加锁。
+    """
+
+    def __init__(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self.paused = False
+        self.dirty = False  # 会话在运行期间被外部修改过，下一轮前需要重新读取
+
+    def _deliver(self, kind: str) -> None:
+        if kind == "pause":
+            self.paused = True
+        elif kind == "resume":
+            self.paused = False
+        self.dirty = True
+
+    def consume_dirty(self) -> bool:
+        dirty, self.dirty = self.dirty, False
+        return dirty
+
+
+class GroupSignalHub:
+    """按 gid 分发群聊信号；没有订阅者时发布是空操作。"""
+
+    def __init__(self) -> None:
+        self._subs: Dict[str, Set[GroupSignals]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def subscribe(self, gid: str) -> Iterator[GroupSignals]:
+        signals = GroupSignals()
+        with self._lock:
+            self._subs.setdefault(gid, set()).add(signals)
+        try:
+            yield signals
+        finally:
+            with self._lock:
+                subs = self._subs.get(gid)
+                if subs is not None:
+                    subs.discard(signals)
+                    if not subs:
+                        del self._subs[gid]
+
+    def publish(self, gid: str, kind: str) -> int:
+        """发布信号，返回收到的订阅者数量。可在任意线程调用。"""
+        if kind not in SIGNAL_KINDS:
+            raise ValueError(f"unknown signal: {kind}")
+        with self._lock:
+            subs = list(self._subs.get(gid, ()))
+        for signals in subs:
+            signals._loop.call_soon_threadsafe(signals._deliver, kind)
+        return len(subs)
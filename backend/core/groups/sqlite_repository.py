@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from ...infrastructure.sqlite import SQLiteDatabase
+from .repository import default_orchestrator, normalize_participants, page_bounds, patch_orchestrator
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS group_conversations (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    orchestrator TEXT NOT NULL DEFAULT '{}',
+    last_speaker TEXT,
+    paused INTEGER NOT NULL DEFAULT 0,
+    turn INTEGER NOT NULL DEFAULT 0,
+    summary TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_group_conversations_updated ON group_conversations(updated_at DESC);
+CREATE TABLE IF NOT EXISTS group_participants (
+    group_id TEXT NOT NULL REFERENCES group_conversations(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    agent_id TEXT NOT NULL,
+    role_card_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    model TEXT,
+    provider_alias TEXT,
+    PRIMARY KEY (group_id, position)
+);
+CREATE TABLE IF NOT EXISTS group_messages (
+    group_id TEXT NOT NULL REFERENCES group_conversations(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    ts TEXT NOT NULL,
+    agent_id TEXT,
+    state TEXT,
+    PRIMARY KEY (group_id, seq)
+);
+"""
+
+
+def _now() -> str:
+    # 与 JSON 存储序列化 datetime 的格式（default=str）保持一致
+    return str(datetime.utcnow())
+
+
+def _message(row: sqlite3.Row) -> Dict[str, Any]:
+    msg = {"role": row["role"], "content": row["content"], "ts": row["ts"], "agentId": row["agent_id"]}
+    if row["state"]:
+        msg["state"] = row["state"]
+    return msg
+
+
+class SQLiteGroupStorage:
+    """SQLite (WAL) 版群聊存储，接口与 ``GroupStorage`` 保持一致。"""
+
+    def __init__(self, db_path: str | Path) -> None:
+        self.db = SQLiteDatabase(Path(db_path))
+        self.db.executescript(_SCHEMA)
+        self.db.ensure_column("group_messages", "state", "TEXT")
+        self.db.ensure_column("group_conversations", "summary", "TEXT")
+
+    def _header(self, conn: sqlite3.Connection, gid: str) -> sqlite3.Row:
+        row = conn.execute("SELECT * FROM group_conversations WHERE id = ?", (gid,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(gid)
+        return row
+
+    def _load(self, conn: sqlite3.Connection, gid: str, messages: bool = True) -> Dict[str, Any]:
+        row = self._header(conn, gid)
+        parts = conn.execute(
+            "SELECT agent_id, role_card_id, name, model, provider_alias FROM group_participants "
+            "WHERE group_id = ? ORDER BY position",
+            (gid,),
+        ).fetchall()
+        msgs = []
+        if messages:
+            msgs = conn.execute(
+                "SELECT role, content, ts, agent_id, state FROM group_messages WHERE group_id = ? ORDER BY seq", (gid,)
+            ).fetchall()
+        return {
+            "id": row["id"],
+            "title": row["title"],
+            "createdAt": row["created_at"],
+            "updatedAt": row["updated_at"],
+            "participants": [
+                {
+                    "agentId": p["agent_id"],
+                    "roleCardId": p["role_card_id"],
+                    "name": p["name"],
+                    "model": p["model"],
+                    "providerAlias": p["provider_alias"],
+                }
+                for p in parts
+            ],
+            "messages": [_message(m) for m in msgs],
+            "orchestrator": json.loads(row["orchestrator"] or "{}"),
+            "lastSpeaker": row["last_speaker"],
+            "paused": bool(row["paused"]),
+            "turn": int(row["turn"] or 0),
+            "summary": json.loads(row["summary"]) if row["summary"] else None,
+        }
+
+    def _insert_participants(self, conn: sqlite3.Connection, gid: str, parts: List[Dict[str, Any]]) -> None:
+        conn.executemany(
+            "INSERT INTO group_participants (group_id, position, agent_id, role_card_id, name, model, provider_alias) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (gid, i, p["agentId"], p["roleCardId"], p["name"], p.get("model"), p.get("providerAlias"))
+                for i, p in enumerate(parts)
+            ],
+        )
+
+    def _append(self, gid: str, role: str, text: str, agent_id: Optional[str], state: Optional[str] = None) -> None:
+        now = _now()
+        with self.db.transaction() as conn:
+            self._header(conn, gid)
+            conn.execute(
+                "INSERT INTO group_messages (group_id, seq, role, content, ts, agent_id, state) "
+                "SELECT ?, COALESCE(MAX(seq), -1) + 1, ?, ?, ?, ?, ? FROM group_messages WHERE group_id = ?",
+                (gid, role, text, now, agent_id, state, gid),
+            )
+            conn.execute("UPDATE group_conversations SET updated_at = ? WHERE id = ?", (now, gid))
+
+    def _update(self, gid: str, **columns: Any) -> Dict[str, Any]:
+        now = _now()
+        assignments = ", ".join(f"{col} = ?" for col in columns)
+        with self.db.transaction() as conn:
+            cur = conn.execute(
+                f"UPDATE group_conversations SET {assignments}, updated_at = ? WHERE id = ?",
+                (*columns.values(), now, gid),
+            )
+            if cur.rowcount == 0:
+                raise FileNotFoundError(gid)
+            return self._load(conn, gid)
+
+    def create_conversation(self, title: Optional[str], participants: List[Dict[str, Any]]) -> Dict[str, Any]:
+        gid = str(uuid.uuid4())
+        now = _now()
+        parts = normalize_participants(participants)
+        title = title or "群聊会话"
+        with self.db.transaction() as conn:
+            conn.execute(
+                "INSERT INTO group_conversations (id, title, created_at, updated_at, orchestrator) VALUES (?, ?, ?, ?, ?)",
+                (gid, title, now, now, json.dumps(default_orchestrator(), ensure_ascii=False)),
+            )
+            self._insert_participants(conn, gid, parts)
+        return {"id": gid, "title": title, "createdAt": now, "updatedAt": now, "participants": parts}
+
+    def get(self, gid: str) -> Dict[str, Any]:
+        return self._load(self.db.connection(), gid)
+
+    def get_page(
+        self, gid: str, before: Optional[int] = None, after: Optional[int] = None, limit: int = 50
+    ) -> Dict[str, Any]:
+        conn = self.db.connection()
+        out = self._load(conn, gid, messages=False)
+        last = conn.execute("SELECT MAX(seq) FROM group_messages WHERE group_id = ?", (gid,)).fetchone()[0]
+        total = 0 if last is None else int(last) + 1
+        start, end, has_more = page_bounds(total, before, after, limit)
+        rows = conn.execute(
+            "SELECT role, content, ts, agent_id, state FROM group_messages WHERE group_id = ? AND seq >= ? AND seq < ? "
+            "ORDER BY seq",
+            (gid, start, end),
+        ).fetchall()
+        out["messages"] = [_message(r) for r in rows]
+        out["page"] = {"start": start, "total": total, "hasMore": has_more}
+        return out
+
+    def tail_messages(self, gid: str, n: int) -> List[Dict[str, Any]]:
+        conn = self.db.connection()
+        self._header(conn, gid)
+        rows = conn.execute(
+            "SELECT role, content, ts, agent_id, state FROM group_messages WHERE group_id = ? ORDER BY seq DESC LIMIT ?",
+            (gid, max(0, int(n))),
+        ).fetchall()
+        return [_message(r) for r in reversed(rows)]
+
+    def list(self) -> List[Dict[str, Any]]:
+        rows = self.db.connection().execute(
+            "SELECT id, title, created_at, updated_at FROM group_conversations ORDER BY updated_at DESC"
+        ).fetchall()
+        return [{"id": r["id"], "title": r["title"], "createdAt": r["created_at"], "updatedAt": r["updated_at"]} for r in rows]
+
+    def append_user(self, gid: str, text: str) -> None:
+        self._append(gid, "user", text, None)
+
+    def append_assistant(self, gid: str, agent_id: str, text: str, state: Optional[str] = None) -> None:
+        self._append(gid, "assistant", text, agent_id, state)
+
+    def set_paused(self, gid: str, paused: bool) -> Dict[str, Any]:
+        return self._update(gid, paused=int(bool(paused)))
+
+    def set_last_speaker(self, gid: str, agent_id: Optional[str]) -> Dict[str, Any]:
+        return self._update(gid, last_speaker=agent_id)
+
+    def bump_turn(self, gid: str) -> int:
+        now = _now()
+        with self.db.transaction() as conn:
+            cur = conn.execute(
+                "UPDATE group_conversations SET turn = turn + 1, updated_at = ? WHERE id = ?", (now, gid)
+            )
+            if cur.rowcount == 0:
+                raise FileNotFoundError(gid)
+            return int(conn.execute("SELECT turn FROM group_conversations WHERE id = ?", (gid,)).fetchone()[0])
+
+    def get_summary(self, gid: str) -> Optional[Dict[str, Any]]:
+        row = self._header(self.db.connection(), gid)
+        return json.loads(row["summary"]) if row["summary"] else None
+
+    def set_summary(self, gid: str, summary: Dict[str, Any]) -> Dict[str, Any]:
+        with self.db.transaction() as conn:
+            row = self._header(conn, gid)
+            current = json.loads(row["summary"]) if row["summary"] else None
+            # 摘要只增不减：仅当覆盖范围更大时才替换
+            if current and int(current.get("upto") or 0) >= int(summary["upto"]):
+                return current
+            conn.execute(
+                "UPDATE group_conversations SET summary = ? WHERE id = ?",
+                (json.dumps(summary, ensure_ascii=False), gid),
+            )
+        return summary
+
+    def update_orchestrator(self, gid: str, patch: Dict[str, Any]) -> Dict[str, Any]:
+        return self.commit_round(gid, orchestrator=patch)
+
+    def commit_round(
+        self,
+        gid: str,
+        messages: Sequence[Dict[str, Any]] = (),
+        last_speaker: Optional[str] = None,
+        bump_turn: bool = False,
+        orchestrator: Optional[Dict[str, Any]] = None,
+        summary: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """在一个事务内提交一轮的全部变更，语义同 ``GroupStorage.commit_round``。"""
+        now = _now()
+        with self.db.transaction() as conn:
+            row = self._header(conn, gid)
+            if messages:
+                last = conn.execute("SELECT MAX(seq) FROM group_messages WHERE group_id = ?", (gid,)).fetchone()[0]
+                base = -1 if last is None else int(last)
+                conn.executemany(
+                    "INSERT INTO group_messages (group_id, seq, role, content, ts, agent_id, state) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (gid, base + 1 + i, m["role"], m["content"], now, m.get("agentId"), m.get("state"))
+                        for i, m in enumerate(messages)
+                    ],
+                )
+            columns: Dict[str, Any] = {"updated_at": now}
+            if last_speaker is not None:
+                columns["last_speaker"] = last_speaker
+            if bump_turn:
+                columns["turn"] = int(row["turn"] or 0) + 1
+            if orchestrator:
+                orch = patch_orchestrator(json.loads(row["orchestrator"] or "{}"), orchestrator)
+                columns["orchestrator"] = json.dumps(orch, ensure_ascii=False)
+            if summary:
+                current = json.loads(row["summary"]) if row["summary"] else None
+                # 摘要只增不减：仅当覆盖范围更大时才替换
+                if not current or int(current.get("upto") or 0) < int(summary["upto"]):
+                    columns["summary"] = json.dumps(summary, ensure_ascii=False)
+            assignments = ", ".join(f"{col} = ?" for col in columns)
+            conn.execute(f"UPDATE group_conversations SET {assignments} WHERE id = ?", (*columns.values(), gid))
+            return self._load(conn, gid)
+
+    def import_conversation(self, conv: Dict[str, Any]) -> None:
+        """批量导入一条完整群聊（迁移用），已存在则整体覆盖。"""
+        gid = conv["id"]
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM group_conversations WHERE id = ?", (gid,))
+            conn.execute(
+                "INSERT INTO group_conversations "
+                "(id, title, created_at, updated_at, orchestrator, last_speaker, paused, turn, summary) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    gid,
+                    conv.get("title") or "群聊会话",
+                    str(conv["createdAt"]),
+                    str(conv["updatedAt"]),
+                    json.dumps(conv.get("orchestrator") or {}, ensure_ascii=False),
+                    conv.get("lastSpeaker"),
+                    int(bool(conv.get("paused"))),
+                    int(conv.get("turn") or 0),
+                    json.dumps(conv["summary"], ensure_ascii=False) if conv.get("summary") else None,
+                ),
+            )
+            self._insert_participants(conn, gid, normalize_participants(conv.get("participants") or []))
+            conn.executemany(
+                "INSERT INTO group_messages (group_id, seq, role, content, ts, agent_id, state) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (gid, i, m["role"], m["content"], str(m.get("ts") or conv["updatedAt"]), m.get("agentId"), m.get("state"))
+                    for i, m in enumerate(conv.get("messages") or [])
+                ],
+            )
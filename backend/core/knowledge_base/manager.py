@@ -8,6 +8,8 @@ from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
+from filelock import FileLock
+
 from ...infrastructure.paths import ensure_dir, resolve_data_dir
 from ..settings import get_settings
 
@@ -35,10 +37,13 @@ class KnowledgeBaseManager:
         self.base = base
         self.index_path = self.base / "index.json"
         self.bindings_path = self.base / "bindings.json"
-        if not self.index_path.exists():
-            self._write(self.index_path, [])
-        if not self.bindings_path.exists():
-            self._write(self.bindings_path, {})
+        # index.json / bindings.json / meta.json 的 read-modify-write 由该锁串行化（多线程、多进程均适用）
+        self._lock = FileLock(str(self.base / ".kb.lock"))
+        with self._lock:
+            if not self.index_path.exists():
+                self._write(self.index_path, [])
+            if not self.bindings_path.exists():
+                self._write(self.bindings_path, {})
 
     def _write(self, path: Path, data: Any) -> None:
         tmp = path.with_name(f"{path.name}.tmp")
@@ -63,16 +68,17 @@ class KnowledgeBaseManager:
         docs_dir = kb_dir / "docs"
         ensure_dir(docs_dir)
         self._write(kb_dir / "meta.json", meta)
-        idx = self._read(self.index_path)
-        idx.append(meta)
-        self._write(self.index_path, idx)
-        if roleCardId:
-            bindings = self._read(self.bindings_path)
-            arr = bindings.get(roleCardId, [])
-            if kb_id not in arr:
-                arr.append(kb_id)
-            bindings[roleCardId] = arr
-            self._write(self.bindings_path, bindings)
+        with self._lock:
+            idx = self._read(self.index_path)
+            idx.append(meta)
+            self._write(self.index_path, idx)
+            if roleCardId:
+                bindings = self._read(self.bindings_path)
+                arr = bindings.get(roleCardId, [])
+                if kb_id not in arr:
+                    arr.append(kb_id)
+                bindings[roleCardId] = arr
+                self._write(self.bindings_path, bindings)
         return meta
 
     def list_kb(self) -> List[Dict[str, Any]]:
@@ -134,9 +140,10 @@ class KnowledgeBaseManager:
         self._write(docs_dir / f"{doc_id}.json", doc)
 
         meta_path = kb_dir / "meta.json"
-        meta = self._read(meta_path)
-        meta["updatedAt"] = _now()
-        self._write(meta_path, meta)
+        with self._lock:
+            meta = self._read(meta_path)
+            meta["updatedAt"] = _now()
+            self._write(meta_path, meta)
 
         return doc
 
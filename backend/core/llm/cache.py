@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ...infrastructure.paths import ensure_dir
+
+
+class ResponseCache:
+    """按请求内容哈希缓存非流式 chat completion 的结果。
+
+    key 为 (model, messages, 采样参数等完整 payload) 的 sha256。两级存储：
+    - 内存 LRU：最多 ``max_entries`` 条；
+    - 可选磁盘层（``disk_dir``）：每条一个 JSON 文件，总大小超过 ``max_disk_bytes`` 时按最旧优先淘汰。
+    两级都按 ``ttl`` 秒过期。磁盘读写在线程中执行，不阻塞事件循环。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl: float = 600.0,
+        disk_dir: Optional[Path] = None,
+        max_disk_bytes: int = 64 * 1024 * 1024,
+    ) -> None:
+        self.max_entries = max(0, max_entries)
+        self.ttl = ttl
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._disk_lock = threading.Lock()
+        self._disk_bytes: Optional[int] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+    @staticmethod
+    def key(payload: Dict[str, Any]) -> str:
+        raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        item = self._memory.get(key)
+        if item is not None:
+            expires, raw = item
+            if expires > now:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return json.loads(raw)
+            del self._memory[key]
+        if self.disk_dir is not None:
+            found = await asyncio.to_thread(self._disk_get, key, now)
+            if found is not None:
+                expires, raw = found
+                self._remember(key, expires, raw)
+                self.hits += 1
+                self.disk_hits += 1
+                return json.loads(raw)
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, data: Dict[str, Any]) -> None:
+        raw = json.dumps(data, ensure_ascii=False)
+        expires = time.time() + self.ttl
+        self._remember(key, expires, raw)
+        self.stores += 1
+        if self.disk_dir is not None:
+            await asyncio.to_thread(self._disk_put, key, expires, raw)
+
+    def _remember(self, key: str, expires: float, raw: str) -> None:
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = (expires, raw)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    # ---- 磁盘层 ----
+
+    def _path(self, key: str) -> Path:
+        assert self.disk_dir is not None
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[float, str]]:
+        path = self._path(key)
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                rec = json.load(f)
+        except (OSError, ValueError):
+            return None
+        expires = float(rec.get("expires") or 0)
+        if expires <= now:
+            with self._disk_lock:
+                self._unlink(path)
+            return None
+        return expires, rec["data"]
+
+    def _disk_put(self, key: str, expires: float, raw: str) -> None:
+        path = self._path(key)
+        body = json.dumps({"expires": expires, "data": raw}, ensure_ascii=False).encode("utf-8")
+        with self._disk_lock:
+            total = self._disk_total()
+            ensure_dir(path.parent)
+            old = path.stat().st_size if path.exists() else 0
+            tmp = path.with_suffix(".tmp")
+            tmp.write_bytes(body)
+            os.replace(tmp, path)
+            self._disk_bytes = total - old + len(body)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._disk_evict()
+
+    def _disk_total(self) -> int:
+        if self._disk_bytes is None:
+            self._disk_bytes = sum(p.stat().st_size for p in self._disk_files())
+        return self._disk_bytes
+
+    def _disk_files(self) -> List[Path]:
+        assert self.disk_dir is not None
+        if not self.disk_dir.exists():
+            return []
+        return [p for p in self.disk_dir.glob("*/*.json") if p.is_file()]
+
+    def _disk_evict(self) -> None:
+        # 按写入时间从旧到新淘汰（过期项必然最旧），直到降到上限的 90%
+        now = time.time()
+        target = int(self.max_disk_bytes * 0.9)
+        for path in sorted(self._disk_files(), key=lambda p: p.stat().st_mtime):
+            if self._disk_total() <= target and path.stat().st_mtime + self.ttl >= now:
+                break
+            self._unlink(path)
+            self.disk_evictions += 1
+
+    def _unlink(self, path: Path) -> None:
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except OSError:
+            return
+        if self._disk_bytes is not None:
+            self._disk_bytes = max(0, self._disk_bytes - size)
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._memory),
+            "maxEntries": self.max_entries,
+            "ttlS": self.ttl,
+            "disk": str(self.disk_dir) if self.disk_dir else None,
+            "diskBytes": self._disk_bytes,
+            "hits": self.hits,
+            "diskHits": self.disk_hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / lookups, 3) if lookups else None,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "diskEvictions": self.disk_evictions,
+        }
@@ -1,8 +1,22 @@
+import asyncio
+import copy
+import json
 import os
-from typing import Any, Dict, List, Optional
+import time
+from contextlib import AsyncExitStack, aclosing, nullcontext
+from functools import partial
+from typing import Any, AsyncContextManager, AsyncIterator, Dict, List, Optional, Tuple
 
 import httpx
 
+from .cache import ResponseCache
+from .limiter import PRIORITY_INTERACTIVE, AccountLimiter, estimate_tokens
+from .metrics import CallTiming, LLMMetrics
+from .pool import HTTPClientPool
+from .retry import remaining
+from .singleflight import SingleFlight
+from .tokens import TokenCounter, call_usage
+
 
 class LLMClient:
     """Thin wrapper around an OpenAI-compatible Chat Completions API.
@@ -11,6 +25,20 @@ class LLMClient:
       - LLM_BASE_URL (e.g., http://localhost:8001)
       - LLM_API_KEY  (optional)
       - LLM_MODEL    (e.g., qwen2, llama3)
+
+    When a shared ``HTTPClientPool`` is given, requests reuse its keep-alive
+    connections; otherwise a short-lived client is opened per request.
+    Per-call TTFT / total latency is recorded into ``metrics`` under ``name``.
+    With a ``limiter``, every call first waits for a concurrency / rate slot
+    (ordered by ``priority``); latency is measured from admission.
+    With a ``cache``, non-stream calls made with ``cache=True`` are answered
+    from it when model, messages and sampling params are byte-identical.
+    With ``coalesce`` (default), concurrent identical requests share one
+    upstream call: followers await the leader's result or tee its stream.
+    With a ``usage`` store (async ``record(scope, key, usage)``), the token usage
+    of every upstream call is aggregated under ``("provider", name)``: the
+    upstream ``usage`` field when present, otherwise counted with ``counter``;
+    ``stream_usage`` asks streaming upstreams to append it (``stream_options``).
     """
 
     def __init__(
@@ -19,28 +47,44 @@ class LLMClient:
         api_key: Optional[str] = None,
         default_model: Optional[str] = None,
         timeout: float = 60.0,
+        pool: Optional[HTTPClientPool] = None,
+        metrics: Optional[LLMMetrics] = None,
+        name: Optional[str] = None,
+        limiter: Optional[AccountLimiter] = None,
+        cache: Optional[ResponseCache] = None,
+        coalesce: bool = True,
+        counter: Optional[TokenCounter] = None,
+        usage: Optional[Any] = None,
+        stream_usage: bool = False,
     ) -> None:
         self.base_url = (base_url or os.getenv("LLM_BASE_URL", "")).rstrip("/")
         self.api_key = api_key or os.getenv("LLM_API_KEY")
         self.default_model = default_model or os.getenv("LLM_MODEL") or ""
         self._timeout = timeout
+        self._pool = pool
+        self.metrics = metrics
+        self.name = name or self.base_url
+        self.limiter = limiter
+        self.cache = cache
+        self.flights: Optional[SingleFlight] = SingleFlight() if coalesce else None
+        self.counter = counter or TokenCounter()
+        self.usage = usage
+        self.stream_usage = stream_usage
 
         if not self.base_url:
             raise RuntimeError("LLM_BASE_URL is not set")
 
-    async def chat_completion(
+    def _request(
         self,
         messages: List[Dict[str, Any]],
-        model: Optional[str] = None,
-        temperature: Optional[float] = None,
-        max_tokens: Optional[int] = None,
-        stream: bool = False,
-        extra: Optional[Dict[str, Any]] = None,
-        base_url_override: Optional[str] = None,
-        api_key_override: Optional[str] = None,
-    ) -> Dict[str, Any]:
-        """Calls the /v1/chat/completions endpoint (non-stream by default)."""
-
+        model: Optional[str],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        stream: bool,
+        extra: Optional[Dict[str, Any]],
+        base_url_override: Optional[str],
+        api_key_override: Optional[str],
+    ) -> Tuple[str, str, Dict[str, str], Dict[str, Any]]:
         base = (base_url_override or self.base_url).rstrip("/")
         url = f"{base}/v1/chat/completions"
         headers: Dict[str, str] = {"Content-Type": "application/json"}
@@ -59,8 +103,262 @@ class LLMClient:
             payload["max_tokens"] = max_tokens
         if extra:
             payload.update(extra)
+        return base, url, headers, payload
+
+    def _admit(
+        self, messages: List[Dict[str, Any]], max_tokens: Optional[int], priority: int
+    ) -> AsyncContextManager[None]:
+        if self.limiter is None:
+            return nullcontext()
+        return self.limiter.slot(estimate_tokens(messages, max_tokens, self.counter), priority)
+
+    def _record(self, timing: CallTiming, ok: bool) -> None:
+        if self.metrics is not None:
+            self.metrics.record(self.name, timing, ok=ok)
+
+    async def _record_usage(self, messages: List[Dict[str, Any]], text: str, upstream: Any) -> None:
+        if self.usage is None:
+            return
+        try:
+            await self.usage.record("provider", self.name, call_usage(self.counter, messages, text, upstream))
+        except Exception:
+            # 用量统计失败不影响调用本身
+            pass
+
+    async def chat_completion(
+        self,
+        messages: List[Dict[str, Any]],
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        stream: bool = False,
+        extra: Optional[Dict[str, Any]] = None,
+        base_url_override: Optional[str] = None,
+        api_key_override: Optional[str] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+        cache: bool = False,
+        coalesce: bool = True,
+        deadline: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Calls the /v1/chat/completions endpoint (non-stream by default).
+
+        ``cache=True`` opts this call into the response cache (ignored for streams);
+        ``coalesce=False`` opts it out of single-flight sharing.
+        ``deadline`` (``time.monotonic()`` based, see ``retry.deadline_in``) bounds
+        the whole call including queueing; ``TimeoutError`` is raised when it passes.
+        With coalescing, only this caller gives up: the shared upstream call keeps
+        running for the other waiters.
+        """
+        left = remaining(deadline)
+        if left is None:
+            return await self._chat_completion(
+                messages, model, temperature, max_tokens, stream, extra, base_url_override, api_key_override, priority, cache, coalesce
+            )
+        if left <= 0:
+            raise TimeoutError("deadline exceeded")
+        try:
+            return await asyncio.wait_for(
+                self._chat_completion(
+                    messages, model, temperature, max_tokens, stream, extra, base_url_override, api_key_override, priority, cache, coalesce
+                ),
+                left,
+            )
+        except asyncio.TimeoutError:
+            # 3.10 上 asyncio.TimeoutError 不是内置 TimeoutError，统一成文档约定的异常
+            raise TimeoutError("deadline exceeded") from None
+
+    async def _chat_completion(
+        self,
+        messages: List[Dict[str, Any]],
+        model: Optional[str],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        stream: bool,
+        extra: Optional[Dict[str, Any]],
+        base_url_override: Optional[str],
+        api_key_override: Optional[str],
+        priority: int,
+        cache: bool,
+        coalesce: bool,
+    ) -> Dict[str, Any]:
+        base, url, headers, payload = self._request(
+            messages, model, temperature, max_tokens, stream, extra, base_url_override, api_key_override
+        )
+        cache_key = None
+        if cache and not stream and self.cache is not None:
+            cache_key = self.cache.key(payload)
+            hit = await self.cache.get(cache_key)
+            if hit is not None:
+                return hit
+        if coalesce and self.flights is not None:
+            flight_key = ResponseCache.key({"base": base, "key": headers.get("Authorization"), "payload": payload})
+            call = partial(self._complete, base, url, headers, payload, messages, max_tokens, priority, cache_key)
+            # 结果在多个调用方之间共享：各自拿一份拷贝
+            return copy.deepcopy(await self.flights.do(flight_key, call))
+        return await self._complete(base, url, headers, payload, messages, max_tokens, priority, cache_key)
+
+    async def _complete(
+        self,
+        base: str,
+        url: str,
+        headers: Dict[str, str],
+        payload: Dict[str, Any],
+        messages: List[Dict[str, Any]],
+        max_tokens: Optional[int],
+        priority: int,
+        cache_key: Optional[str],
+    ) -> Dict[str, Any]:
+        async with self._admit(messages, max_tokens, priority):
+            timing = CallTiming()
+            try:
+                if self._pool is not None:
+                    client = self._pool.client_for(base)
+                    resp = await client.post(url, headers=headers, json=payload, timeout=self._timeout)
+                    resp.raise_for_status()
+                    data = resp.json()
+                else:
+                    async with httpx.AsyncClient(timeout=self._timeout) as client:
+                        resp = await client.post(url, headers=headers, json=payload)
+                        resp.raise_for_status()
+                        data = resp.json()
+            except Exception:
+                self._record(timing, ok=False)
+                raise
+            timing.finish()
+            self._record(timing, ok=True)
+        await self._record_usage(messages, chunk_text(data), data.get("usage"))
+        if cache_key is not None and data.get("choices"):
+            await self.cache.put(cache_key, data)
+        return data
+
+    async def stream_chat_completion(
+        self,
+        messages: List[Dict[str, Any]],
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        extra: Optional[Dict[str, Any]] = None,
+        timing: Optional[CallTiming] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+        coalesce: bool = True,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Calls /v1/chat/completions with ``stream=True`` and yields chunk dicts
+        parsed from the upstream SSE ``data:`` frames as they arrive.
+
+        If the upstream ignores ``stream`` and answers with a plain JSON
+        completion, that completion is yielded once as-is (it has
+        ``choices[0].message`` instead of ``choices[0].delta``).
+        Closing the iterator early (``aclose()`` or cancellation) closes the
+        upstream response, so the provider stops generating and the pooled
+        connection is released right away. With coalescing, the upstream stream
+        is only cancelled once every consumer sharing it has gone away.
+        """
+
+        base, url, headers, payload = self._request(messages, model, temperature, max_tokens, True, extra, None, None)
+        if self.stream_usage:
+            # 请求上游在流末尾附带 usage（OpenAI stream_options）
+            payload.setdefault("stream_options", {"include_usage": True})
+        timing = timing or CallTiming()
+        if not (coalesce and self.flights is not None):
+            async with aclosing(self._stream_call(base, url, headers, payload, messages, max_tokens, priority, timing)) as chunks:
+                async for chunk in chunks:
+                    yield chunk
+            return
+        flight_key = ResponseCache.key({"base": base, "key": headers.get("Authorization"), "payload": payload})
+        shared = partial(self._stream_call, base, url, headers, payload, messages, max_tokens, priority, CallTiming())
+        timing.streamed = True
+        async with aclosing(self.flights.stream(flight_key, shared)) as chunks:
+            async for chunk in chunks:
+                if chunk_text(chunk):
+                    timing.first_token()
+                yield chunk
+        timing.finish()
+
+    async def _stream_call(
+        self,
+        base: str,
+        url: str,
+        headers: Dict[str, str],
+        payload: Dict[str, Any],
+        messages: List[Dict[str, Any]],
+        max_tokens: Optional[int],
+        priority: int,
+        timing: CallTiming,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        timing.streamed = True
+        parts: List[str] = []
+        upstream_usage: Any = None
+        async with self._admit(messages, max_tokens, priority):
+            timing.started = time.perf_counter()
+            try:
+                async with AsyncExitStack() as stack:
+                    if self._pool is not None:
+                        client = self._pool.client_for(base)
+                    else:
+                        client = await stack.enter_async_context(httpx.AsyncClient(timeout=self._timeout))
+                    chunks = await stack.enter_async_context(aclosing(self._stream(client, url, headers, payload, timing)))
+                    async for chunk in chunks:
+                        parts.append(chunk_text(chunk))
+                        if chunk.get("usage"):
+                            upstream_usage = chunk["usage"]
+                        yield chunk
+            except (GeneratorExit, asyncio.CancelledError):
+                # consumer went away: not an upstream failure
+                raise
+            except Exception:
+                self._record(timing, ok=False)
+                raise
+            timing.finish()
+            self._record(timing, ok=True)
+        await self._record_usage(messages, "".join(parts), upstream_usage)
+
+    async def _stream(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        headers: Dict[str, str],
+        payload: Dict[str, Any],
+        timing: CallTiming,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        async with client.stream("POST", url, headers=headers, json=payload, timeout=self._timeout) as resp:
+            if resp.is_error:
+                await resp.aread()
+                resp.raise_for_status()
+            if "text/event-stream" not in resp.headers.get("content-type", ""):
+                data = json.loads(await resp.aread())
+                timing.streamed = False
+                timing.first_token()
+                yield data
+                return
+            data_lines: List[str] = []
+            async for line in resp.aiter_lines():
+                if line.startswith("data:"):
+                    data_lines.append(line[5:].strip())
+                    continue
+                if line.strip() or not data_lines:
+                    continue
+                raw = "\n".join(data_lines)
+                data_lines = []
+                if raw == "[DONE]":
+                    return
+                try:
+                    chunk = json.loads(raw)
+                except json.JSONDecodeError:
+                    continue
+                if chunk_text(chunk):
+                    timing.first_token()
+                yield chunk
+            if data_lines and data_lines[0] != "[DONE]":
+                try:
+                    yield json.loads("\n".join(data_lines))
+                except json.JSONDecodeError:
+                    pass
+
 
-        async with httpx.AsyncClient(timeout=self._timeout) as client:
-            resp = await client.post(url, headers=headers, json=payload)
-            resp.raise_for_status()
-            return resp.json()
+def chunk_text(chunk: Dict[str, Any]) -> str:
+    try:
+        choice = chunk["choices"][0]
+    except (KeyError, IndexError, TypeError):
+        return ""
+    part = choice.get("delta") or choice.get("message") or {}
+    return part.get("content") or ""
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from .metrics import LatencyWindow
+from .tokens import TokenCounter
+
+
+# 调用优先级：数值越小越先放行。交互式回复（角色/群聊/判官）优先于后台任务（提问建议等）
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+
+def estimate_tokens(messages: List[Dict[str, Any]], max_tokens: Optional[int], counter: Optional[TokenCounter] = None) -> int:
+    """估算一次调用消耗的 token（提示词用配置的本地计数器，缺省为 CJK 感知的估算，加上补全上限），用于 tpm 限流。"""
+    return (counter or TokenCounter()).count_messages(messages) + (max_tokens or 256)
+
+
+class _TokenBucket:
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """还需等待多久才能取出 amount（超过桶容量的请求按容量计）。"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.level -= min(amount, self.capacity)
+
+
+@dataclass
+class _Waiter:
+    priority: int
+    tokens: int
+    seq: int
+    enqueued: float
+    future: asyncio.Future = field(repr=False)
+
+
+class AccountLimiter:
+    """单个 provider 账号的并发上限 + 请求/令牌速率限制（令牌桶）。
+
+    超出限额的调用进入公平队列：按优先级放行，同级先到先得；等待越久有效优先级越高
+    （每等待 ``aging`` 秒提升一级），后台任务不会被交互式请求永久饿死。
+    """
+
+    def __init__(
+        self,
+        max_concurrent: Optional[int] = None,
+        rpm: Optional[int] = None,
+        tpm: Optional[int] = None,
+        aging: float = 5.0,
+    ) -> None:
+        self.max_concurrent = max_concurrent if max_concurrent and max_concurrent > 0 else None
+        self._requests = _TokenBucket(rpm) if rpm and rpm > 0 else None
+        self._tokens = _TokenBucket(tpm) if tpm and tpm > 0 else None
+        self.aging = aging
+        self._waiters: List[_Waiter] = []
+        self._active = 0
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.wait = LatencyWindow()
+        self.admitted = 0
+        self.queued = 0
+        self.max_depth = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._waiters)
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 0, priority: int = PRIORITY_INTERACTIVE) -> AsyncIterator[None]:
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(priority, tokens, next(self._seq), time.monotonic(), loop.create_future())
+        self._waiters.append(waiter)
+        self._dispatch()
+        if not waiter.future.done():
+            self.queued += 1
+            self.max_depth = max(self.max_depth, len(self._waiters))
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 已被放行但调用方在恢复前被取消：归还名额
+                self._release()
+            else:
+                self._waiters.remove(waiter)
+                self._dispatch()
+            raise
+        self.wait.add(time.monotonic() - waiter.enqueued)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        self._active -= 1
+        self._dispatch()
+
+    def _next(self, now: float) -> _Waiter:
+        return min(self._waiters, key=lambda w: (w.priority - (now - w.enqueued) / self.aging, w.seq))
+
+    def _dispatch(self) -> None:
+        while self._waiters:
+            if self.max_concurrent is not None and self._active >= self.max_concurrent:
+                return
+            now = time.monotonic()
+            waiter = self._next(now)
+            delay = max(
+                self._requests.wait_time(1, now) if self._requests else 0.0,
+                self._tokens.wait_time(waiter.tokens, now) if self._tokens else 0.0,
+            )
+            if delay > 0:
+                self._schedule(delay)
+                return
+            if self._requests:
+                self._requests.take(1)
+            if self._tokens:
+                self._tokens.take(waiter.tokens)
+            self._waiters.remove(waiter)
+            self._active += 1
+            self.admitted += 1
+            waiter.future.set_result(None)
+
+    def _schedule(self, delay: float) -> None:
+        if self._timer is not None and not self._timer.cancelled():
+            self._timer.cancel()
+        loop = asyncio.get_running_loop()
+        self._timer = loop.call_later(delay, self._dispatch)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "maxConcurrent": self.max_concurrent,
+            "rpm": int(self._requests.capacity) if self._requests else None,
+            "tpm": int(self._tokens.capacity) if self._tokens else None,
+            "active": self._active,
+            "queueDepth": len(self._waiters),
+            "maxQueueDepth": self.max_depth,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "wait": self.wait.snapshot(),
+        }
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional
+
+
+class LatencyWindow:
+    """最近 N 个样本（秒）的滑动窗口，提供分位数统计。"""
+
+    def __init__(self, size: int = 256) -> None:
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, value: float) -> None:
+        self._samples.append(value)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        idx = min(len(ordered) - 1, max(0, math.ceil(p / 100.0 * len(ordered)) - 1))
+        return ordered[idx]
+
+    def snapshot(self) -> Dict[str, Any]:
+        def ms(v: Optional[float]) -> Optional[float]:
+            return None if v is None else round(v * 1000, 1)
+
+        return {
+            "samples": len(self._samples),
+            "p50Ms": ms(self.percentile(50)),
+            "p95Ms": ms(self.percentile(95)),
+            "p99Ms": ms(self.percentile(99)),
+        }
+
+
+@dataclass
+class CallTiming:
+    """单次上游调用的计时：ttft 为首个 token 到达耗时（非流式时等于总耗时）。"""
+
+    started: float = field(default_factory=time.perf_counter)
+    ttft: Optional[float] = None
+    total: Optional[float] = None
+    streamed: bool = False
+
+    def first_token(self) -> None:
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.started
+
+    def finish(self) -> None:
+        self.total = time.perf_counter() - self.started
+        if self.ttft is None:
+            self.ttft = self.total
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "ttftMs": None if self.ttft is None else round(self.ttft * 1000, 1),
+            "totalMs": None if self.total is None else round(self.total * 1000, 1),
+            "streamed": self.streamed,
+        }
+
+
+class _Series:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.ttft = LatencyWindow()
+        self.total = LatencyWindow()
+
+
+class LLMMetrics:
+    """按上游（provider alias 或 base URL）聚合的调用指标。"""
+
+    def __init__(self) -> None:
+        self._series: Dict[str, _Series] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> _Series:
+        series = self._series.get(key)
+        if series is None:
+            series = self._series.setdefault(key, _Series())
+        return series
+
+    def record(self, key: str, timing: CallTiming, ok: bool = True) -> None:
+        with self._lock:
+            series = self._get(key)
+            series.calls += 1
+            if not ok:
+                series.errors += 1
+                return
+            if timing.ttft is not None:
+                series.ttft.add(timing.ttft)
+            if timing.total is not None:
+                series.total.add(timing.total)
+
+    def total_percentile(self, key: str, p: float) -> Optional[float]:
+        with self._lock:
+            series = self._series.get(key)
+            return series.total.percentile(p) if series else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                key: {
+                    "calls": s.calls,
+                    "errors": s.errors,
+                    "ttft": s.ttft.snapshot(),
+                    "total": s.total.snapshot(),
+                }
+                for key, s in self._series.items()
+            }
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import importlib.util
+from typing import Dict
+
+import httpx
+
+
+def _h2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class HTTPClientPool:
+    """按 base URL 复用长连接的 httpx.AsyncClient。
+
+    所有 LLMClient（env 默认账号与 providers.json 中的各账号）共享同一个池：
+    相同 base URL 的请求复用 TCP/TLS 连接；安装了 ``h2`` 时启用 HTTP/2。
+    在应用启动时创建，关闭时调用 ``aclose()`` 释放连接。
+    """
+
+    def __init__(
+        self,
+        timeout: float = 60.0,
+        max_connections: int = 100,
+        max_keepalive: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = True,
+    ) -> None:
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = bool(http2) and _h2_available()
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def client_for(self, base_url: str) -> httpx.AsyncClient:
+        key = base_url.rstrip("/")
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                base_url=key,
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2,
+            )
+            self._clients[key] = client
+        return client
+
+    async def aclose(self) -> None:
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
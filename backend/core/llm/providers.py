@@ -2,10 +2,30 @@ from __future__ import annotations
 
 import json
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 
 from ...infrastructure.paths import resolve_data_dir
 from ..settings import get_settings
+from .cache import ResponseCache
+from .client import LLMClient
+from .limiter import AccountLimiter
+from .metrics import LLMMetrics
+from .pool import HTTPClientPool
+from .tokens import TokenCounter
+
+
+def _limit(value: object) -> Optional[int]:
+    try:
+        n = int(value)  # type: ignore[arg-type]
+    except (TypeError, ValueError):
+        return None
+    return n if n > 0 else None
+
+
+def _limiter_for(acc: "ProviderAccount") -> Optional[AccountLimiter]:
+    if not (acc.max_concurrent or acc.rpm or acc.tpm):
+        return None
+    return AccountLimiter(max_concurrent=acc.max_concurrent, rpm=acc.rpm, tpm=acc.tpm)
 
 
 @dataclass(frozen=True)
@@ -15,6 +35,11 @@ class ProviderAccount:
     api_key: Optional[str]
     default_model: Optional[str] = None
     priority: int = 0
+    stream: bool = True
+    weight: float = 1.0
+    max_concurrent: Optional[int] = None
+    rpm: Optional[int] = None
+    tpm: Optional[int] = None
 
 
 class ProviderRegistry:
@@ -25,13 +50,34 @@ class ProviderRegistry:
       { "accounts": [
           {"alias": "openai_a", "base_url": "https://api.openai.com", "api_key": "sk-...", "default_model": "gpt-4o-mini", "priority": 10}
         ] }
+    Optional per-account fields:
+      - stream: false  当上游不支持流式时关闭（退回整段请求后本地切块）
+      - weight: 1      同一 priority 内的流量权重（见 ProviderRouter）
+      - max_concurrent / rpm / tpm  并发上限、每分钟请求数、每分钟 token 数（见 AccountLimiter）
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        pool: Optional[HTTPClientPool] = None,
+        metrics: Optional[LLMMetrics] = None,
+        cache: Optional[ResponseCache] = None,
+        counter: Optional[TokenCounter] = None,
+        usage: Optional[Any] = None,
+    ) -> None:
         s = get_settings()
         self.data_dir = resolve_data_dir(s.data_dir)
         self.path = self.data_dir / "providers.json"
         self._cache: Dict[str, ProviderAccount] = {}
+        self.env_alias: Optional[str] = None
+        self._pool = pool
+        self._metrics = metrics
+        self._cache_store = cache
+        self._counter = counter
+        self._usage = usage
+        self._timeout = s.llm_timeout
+        self._coalesce = s.llm_coalesce
+        self._stream_usage = s.llm_stream_usage
+        self._clients: Dict[str, LLMClient] = {}
         self._load()
 
     def _load(self) -> None:
@@ -48,7 +94,20 @@ class ProviderRegistry:
                     api_key = acc.get("api_key") or None
                     default_model = acc.get("default_model") or None
                     prio = int(acc.get("priority") or 0)
-                    self._cache[alias] = ProviderAccount(alias, base_url, api_key, default_model, prio)
+                    stream = acc.get("stream") is not False
+                    weight = max(0.0, float(acc.get("weight", 1) or 0))
+                    self._cache[alias] = ProviderAccount(
+                        alias,
+                        base_url,
+                        api_key,
+                        default_model,
+                        prio,
+                        stream,
+                        weight,
+                        max_concurrent=_limit(acc.get("max_concurrent")),
+                        rpm=_limit(acc.get("rpm")),
+                        tpm=_limit(acc.get("tpm")),
+                    )
             except Exception:
                 self._cache.clear()
 
@@ -64,7 +123,12 @@ class ProviderRegistry:
                 api_key=s.llm_api_key,
                 default_model=s.llm_model,
                 priority=max_priority,
+                stream=s.llm_stream,
+                max_concurrent=_limit(s.llm_max_concurrent),
+                rpm=_limit(s.llm_rpm),
+                tpm=_limit(s.llm_tpm),
             )
+            self.env_alias = alias
 
     def list(self) -> List[ProviderAccount]:
         return sorted(self._cache.values(), key=lambda a: (-a.priority, a.alias))
@@ -74,3 +138,28 @@ class ProviderRegistry:
             items = self.list()
             return items[0] if items else None
         return self._cache.get(alias)
+
+    def client_for(self, alias: Optional[str]) -> Optional[LLMClient]:
+        """账号对应的 LLMClient（按 alias 缓存，共享连接池）。"""
+        acc = self.get(alias)
+        if not acc:
+            return None
+        client = self._clients.get(acc.alias)
+        if client is None:
+            client = LLMClient(
+                base_url=acc.base_url,
+                api_key=acc.api_key,
+                default_model=acc.default_model,
+                timeout=self._timeout,
+                pool=self._pool,
+                metrics=self._metrics,
+                name=acc.alias,
+                limiter=_limiter_for(acc),
+                cache=self._cache_store,
+                coalesce=self._coalesce,
+                counter=self._counter,
+                usage=self._usage,
+                stream_usage=self._stream_usage,
+            )
+            self._clients[acc.alias] = client
+        return client
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import random
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+
+def deadline_in(seconds: Optional[float]) -> Optional[float]:
+    """从现在起 ``seconds`` 秒后的截止时刻（``time.monotonic()`` 时基）；None/非正数表示不设截止。"""
+    if seconds is None or seconds <= 0:
+        return None
+    return time.monotonic() + seconds
+
+
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    """距截止还剩多少秒（已过期为 0）；无截止返回 None。"""
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+@dataclass
+class RetryPolicy:
+    """幂等调用的重试策略：最多 ``attempts`` 次尝试，间隔按指数退避并加全抖动（full jitter）。"""
+
+    attempts: int = 3
+    base: float = 0.25
+    cap: float = 4.0
+
+    def delay(self, retry: int) -> float:
+        """第 ``retry`` 次重试（从 1 开始）前的等待秒数：在 [0, min(cap, base·2^(retry-1))] 内均匀取值。"""
+        return random.uniform(0.0, min(self.cap, self.base * (2 ** max(0, retry - 1))))
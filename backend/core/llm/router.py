@@ -0,0 +1,430 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import aclosing
+from functools import partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+import httpx
+
+from .client import LLMClient, chunk_text
+from .limiter import PRIORITY_INTERACTIVE
+from .metrics import CallTiming, LatencyWindow
+from .providers import ProviderAccount, ProviderRegistry
+from .retry import RetryPolicy, remaining
+
+
+# 视为账号故障、可以换账号重试的状态码（其余 4xx 是请求本身的问题，换账号也没用）
+_RETRYABLE_STATUS = {408, 409, 425, 429}
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        code = exc.response.status_code
+        return code >= 500 or code in _RETRYABLE_STATUS
+    return isinstance(exc, httpx.RequestError)
+
+
+class AccountHealth:
+    """单个账号的滚动健康状态与熔断器（closed → open → half_open → closed）。"""
+
+    def __init__(self, window: int = 20) -> None:
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.latency = LatencyWindow(window)
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probing = False
+        # 本账号作为主请求被对冲的次数，以及对冲请求先返回的次数
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for ok in self.outcomes if not ok) / len(self.outcomes)
+
+
+class ProviderRouter:
+    """在 ProviderRegistry 的各账号之间分发请求。
+
+    - 按 priority 分层，同层内按 weight 加权随机（并按在途请求数折减），优先使用指定的 alias；
+    - 每个账号记录滚动错误率与延迟，连续失败或错误率超阈值时熔断，冷却后放行一个探测请求；
+    - 请求失败（网络错误、429、5xx）时换下一个账号重试；流式请求在产出首个 token 前可换账号；
+    - 幂等的非流式调用可选退避重试、对冲请求（hedging）与截止时间，见 ``chat_completion``。
+    所有账号都熔断时仍按优先级兜底尝试，而不是直接报错。
+    """
+
+    def __init__(
+        self,
+        registry: ProviderRegistry,
+        failure_threshold: int = 3,
+        error_rate: float = 0.5,
+        cooldown: float = 30.0,
+        window: int = 20,
+        min_samples: int = 5,
+        retry_policy: Optional[RetryPolicy] = None,
+        hedge_percentile: Optional[float] = 95.0,
+    ) -> None:
+        self.registry = registry
+        self.failure_threshold = max(1, failure_threshold)
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.window = window
+        self.min_samples = min_samples
+        self._health: Dict[str, AccountHealth] = {}
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.hedge_percentile = hedge_percentile
+
+    def _get(self, alias: str) -> AccountHealth:
+        health = self._health.get(alias)
+        if health is None:
+            health = self._health[alias] = AccountHealth(self.window)
+        return health
+
+    def _available(self, health: AccountHealth, now: float) -> bool:
+        if health.state == "closed":
+            return True
+        if health.state == "open":
+            return now - health.opened_at >= self.cooldown
+        return not health.probing
+
+    def _tripped(self, health: AccountHealth) -> bool:
+        if health.consecutive_failures >= self.failure_threshold:
+            return True
+        return len(health.outcomes) >= self.min_samples and health.error_rate() >= self.error_rate
+
+    def _acquire(self, health: AccountHealth) -> None:
+        health.in_flight += 1
+        if health.state == "open":
+            health.state = "half_open"
+        if health.state == "half_open":
+            health.probing = True
+
+    def _release(self, health: AccountHealth, ok: Optional[bool], latency: Optional[float] = None) -> None:
+        """ok=None 表示调用方取消，不计入健康统计。"""
+        health.in_flight = max(0, health.in_flight - 1)
+        if ok is None:
+            health.probing = False
+            return
+        if ok:
+            health.consecutive_failures = 0
+            if health.state != "closed":
+                # 探测成功：关闭熔断并丢弃熔断前的旧样本
+                health.state = "closed"
+                health.outcomes.clear()
+            health.outcomes.append(True)
+            if latency is not None:
+                health.latency.add(latency)
+        else:
+            health.consecutive_failures += 1
+            health.outcomes.append(False)
+            if health.state == "half_open" or self._tripped(health):
+                health.state = "open"
+                health.opened_at = time.monotonic()
+        health.probing = False
+
+    def plan(self, preferred: Optional[str] = None) -> List[Tuple[ProviderAccount, bool]]:
+        """本次请求依次尝试的账号；第二项为 True 表示熔断中、仅作兜底。"""
+        now = time.monotonic()
+        accounts = self.registry.list()
+        healthy = [a for a in accounts if self._available(self._get(a.alias), now)]
+        fallback = [a for a in accounts if a not in healthy]
+        ordered: List[ProviderAccount] = []
+        pref = next((a for a in healthy if a.alias == preferred), None)
+        if pref is not None:
+            ordered.append(pref)
+            healthy.remove(pref)
+        tiers: Dict[int, List[ProviderAccount]] = {}
+        for acc in healthy:
+            tiers.setdefault(acc.priority, []).append(acc)
+        for prio in sorted(tiers, reverse=True):
+            ordered.extend(sorted(tiers[prio], key=self._draw, reverse=True))
+        return [(a, False) for a in ordered] + [(a, True) for a in fallback]
+
+    def _draw(self, acc: ProviderAccount) -> float:
+        # 加权随机排序（Efraimidis–Spirakis），在途请求越多权重越低
+        weight = max(acc.weight, 1e-6) / (1 + self._get(acc.alias).in_flight)
+        return random.random() ** (1.0 / weight)
+
+    def _attempts(self, preferred: Optional[str]):
+        for acc, forced in self.plan(preferred):
+            health = self._get(acc.alias)
+            if not forced and not self._available(health, time.monotonic()):
+                continue
+            client = self.registry.client_for(acc.alias)
+            if client is not None:
+                yield acc, client, health
+
+    async def chat_completion(
+        self,
+        preferred: Optional[str],
+        model: Optional[str] = None,
+        retry: bool = False,
+        hedge: bool = False,
+        deadline: Optional[float] = None,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """非流式调用：失败时换账号重试。
+
+        - ``retry=True``（仅用于幂等调用）：按 ``retry_policy`` 最多尝试若干次，失败后指数退避（全抖动）再换账号；
+        - ``hedge=True``：当前账号超过其延迟分位数（``hedge_percentile``）仍未返回时，向另一健康账号发出同样的请求，
+          取先成功的结果并取消另一个；
+        - ``deadline``：整个调用（含重试与退避）的截止时刻，到期抛出 ``TimeoutError``。
+        """
+        attempts = self.retry_policy.attempts if retry else 0
+        tried = 0
+        last_exc: Optional[BaseException] = None
+        while True:
+            progressed = False
+            for acc, client, health in self._attempts(preferred):
+                if tried and retry:
+                    await self._backoff(tried, deadline)
+                progressed = True
+                partner = self._hedge_partner(acc, preferred) if hedge else None
+                try:
+                    if partner is not None:
+                        data = await self._hedged(acc, client, health, partner, preferred, model, deadline, kwargs)
+                    else:
+                        data = await self._attempt(acc, client, health, preferred, model, deadline, kwargs)
+                except Exception as e:
+                    if not _is_retryable(e):
+                        raise
+                    last_exc = e
+                    tried += 1
+                    if retry and tried >= attempts:
+                        raise
+                    continue
+                return data
+            # 不重试时只把账号列表走一遍；重试时可以再轮一遍（熔断的账号届时会被跳过或作为兜底）
+            if not retry or not progressed:
+                break
+        raise last_exc or RuntimeError("no provider account available")
+
+    async def _attempt(
+        self,
+        acc: ProviderAccount,
+        client: LLMClient,
+        health: AccountHealth,
+        preferred: Optional[str],
+        model: Optional[str],
+        deadline: Optional[float],
+        kwargs: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        self._acquire(health)
+        started = time.perf_counter()
+        try:
+            data = await client.chat_completion(model=self._model_for(acc, preferred, model), deadline=deadline, **kwargs)
+        except Exception:
+            self._release(health, ok=False)
+            raise
+        except BaseException:
+            self._release(health, ok=None)
+            raise
+        self._release(health, ok=True, latency=time.perf_counter() - started)
+        return data
+
+    async def _backoff(self, retry: int, deadline: Optional[float]) -> None:
+        delay = self.retry_policy.delay(retry)
+        left = remaining(deadline)
+        if left is not None:
+            if left <= 0:
+                raise TimeoutError("deadline exceeded")
+            delay = min(delay, left)
+        await asyncio.sleep(delay)
+
+    def _hedge_delay(self, alias: str) -> Optional[float]:
+        if self.hedge_percentile is None:
+            return None
+        latency = self._get(alias).latency
+        if len(latency) < self.min_samples:
+            return None
+        return latency.percentile(self.hedge_percentile)
+
+    def _hedge_partner(self, acc: ProviderAccount, preferred: Optional[str]) -> Optional[Tuple[ProviderAccount, LLMClient, AccountHealth]]:
+        if self._hedge_delay(acc.alias) is None:
+            return None
+        now = time.monotonic()
+        for other, forced in self.plan(preferred):
+            if forced or other.alias == acc.alias:
+                continue
+            health = self._get(other.alias)
+            client = self.registry.client_for(other.alias)
+            if client is not None and self._available(health, now):
+                return other, client, health
+        return None
+
+    async def _hedged(
+        self,
+        acc: ProviderAccount,
+        client: LLMClient,
+        health: AccountHealth,
+        partner: Tuple[ProviderAccount, LLMClient, AccountHealth],
+        preferred: Optional[str],
+        model: Optional[str],
+        deadline: Optional[float],
+        kwargs: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        primary = asyncio.ensure_future(self._attempt(acc, client, health, preferred, model, deadline, kwargs))
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=self._hedge_delay(acc.alias))
+            if done:
+                return primary.result()
+            # 主请求超过该账号的延迟分位数仍未返回：向另一账号发出对冲请求，先成功者胜出
+            health.hedged += 1
+            hedge = asyncio.ensure_future(self._attempt(*partner, preferred, model, deadline, kwargs))
+            pending.add(hedge)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            health.hedge_wins += 1
+                        return task.result()
+                    error = error or task.exception()
+            assert error is not None
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stream_chat_completion(
+        self,
+        preferred: Optional[str],
+        messages: List[Dict[str, Any]],
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        extra: Optional[Dict[str, Any]] = None,
+        timing: Optional[CallTiming] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        timing = timing or CallTiming()
+        last_exc: Optional[BaseException] = None
+        for acc, client, health in self._attempts(preferred):
+            self._acquire(health)
+            attempt = CallTiming()
+            emitted = False
+            kwargs = dict(
+                messages=messages,
+                model=self._model_for(acc, preferred, model),
+                temperature=temperature,
+                max_tokens=max_tokens,
+                extra=extra,
+                priority=priority,
+            )
+            try:
+                if acc.stream:
+                    upstream = client.stream_chat_completion(timing=attempt, **kwargs)
+                else:
+                    upstream = _single(partial(client.chat_completion, stream=False, **kwargs))
+                async with aclosing(upstream) as chunks:
+                    async for chunk in chunks:
+                        if chunk_text(chunk):
+                            emitted = True
+                            timing.first_token()
+                        yield chunk
+            except Exception as e:
+                self._release(health, ok=False)
+                if emitted or not _is_retryable(e):
+                    raise
+                last_exc = e
+                continue
+            except BaseException:
+                self._release(health, ok=None)
+                raise
+            attempt.finish()
+            self._release(health, ok=True, latency=attempt.total)
+            timing.streamed = attempt.streamed
+            timing.finish()
+            return
+        raise last_exc or RuntimeError("no provider account available")
+
+    @staticmethod
+    def _model_for(acc: ProviderAccount, preferred: Optional[str], model: Optional[str]) -> Optional[str]:
+        # 指定的模型只属于首选账号；换到其他账号时用该账号自己的默认模型
+        if preferred and acc.alias != preferred:
+            return None
+        return model
+
+    def _limits(self, alias: str) -> Optional[Dict[str, Any]]:
+        client = self.registry.client_for(alias)
+        return client.limiter.snapshot() if client is not None and client.limiter is not None else None
+
+    def _flights(self, alias: str) -> Optional[Dict[str, Any]]:
+        client = self.registry.client_for(alias)
+        return client.flights.snapshot() if client is not None and client.flights is not None else None
+
+    def bound(self, preferred: Optional[str] = None) -> "RoutedClient":
+        return RoutedClient(self, preferred)
+
+    def status(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        items = []
+        for acc in self.registry.list():
+            h = self._get(acc.alias)
+            lat = h.latency.snapshot()
+            items.append(
+                {
+                    "alias": acc.alias,
+                    "priority": acc.priority,
+                    "weight": acc.weight,
+                    "state": h.state,
+                    "available": self._available(h, now),
+                    "inFlight": h.in_flight,
+                    "errorRate": round(h.error_rate(), 3),
+                    "samples": len(h.outcomes),
+                    "consecutiveFailures": h.consecutive_failures,
+                    "retryInS": round(max(0.0, self.cooldown - (now - h.opened_at)), 1) if h.state == "open" else None,
+                    "latencyP50Ms": lat["p50Ms"],
+                    "latencyP95Ms": lat["p95Ms"],
+                    "hedged": h.hedged,
+                    "hedgeWins": h.hedge_wins,
+                    "limits": self._limits(acc.alias),
+                    "singleFlight": self._flights(acc.alias),
+                }
+            )
+        return items
+
+
+async def _single(call: Callable[[], Awaitable[Dict[str, Any]]]) -> AsyncIterator[Dict[str, Any]]:
+    # 不支持流式的账号：整段结果作为一个完整 completion 产出，由 OpenAICompatProvider 本地切块
+    yield await call()
+
+
+class RoutedClient:
+    """绑定首选账号的路由客户端，接口与 LLMClient 一致，可直接交给 OpenAICompatProvider。"""
+
+    def __init__(self, router: ProviderRouter, preferred: Optional[str] = None) -> None:
+        self.router = router
+        self.preferred = preferred
+
+    @property
+    def account(self) -> Optional[ProviderAccount]:
+        return self.router.registry.get(self.preferred)
+
+    @property
+    def default_model(self) -> str:
+        acc = self.account
+        return (acc.default_model if acc else None) or ""
+
+    @property
+    def name(self) -> str:
+        acc = self.account
+        return acc.alias if acc else ""
+
+    async def chat_completion(self, messages: List[Dict[str, Any]], **kwargs: Any) -> Dict[str, Any]:
+        return await self.router.chat_completion(self.preferred, messages=messages, **kwargs)
+
+    def stream_chat_completion(self, messages: List[Dict[str, Any]], **kwargs: Any) -> AsyncIterator[Dict[str, Any]]:
+        return self.router.stream_chat_completion(self.preferred, messages, **kwargs)
+
+
+# 回复/判官/建议生成等调用方接受的客户端：单账号 LLMClient 或带故障转移的 RoutedClient
+ChatClient = Union[LLMClient, RoutedClient]
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task) -> None:
+        self.task = task
+        self.waiters = 0
+        self.abandoned = False
+
+
+class _StreamFlight:
+    """把一条上游流广播给多个订阅者：每个订阅者都从第一个 chunk 开始读（tee）。"""
+
+    def __init__(self, source: AsyncIterator[Any]) -> None:
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.abandoned = False
+        self._changed = asyncio.Event()
+        self.task = asyncio.ensure_future(self._pump(source))
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _pump(self, source: AsyncIterator[Any]) -> None:
+        try:
+            async with aclosing(source) as items:
+                async for item in items:
+                    self.items.append(item)
+                    self._notify()
+        except BaseException as e:
+            self.error = e
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            self.done = True
+            self._notify()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        self.subscribers += 1
+        i = 0
+        try:
+            while True:
+                changed = self._changed
+                while i < len(self.items):
+                    yield self.items[i]
+                    i += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                # 所有订阅者都走了：取消上游
+                self.abandoned = True
+                self.task.cancel()
+
+
+class SingleFlight:
+    """合并并发的相同请求：同一 key 同时只有一个上游调用，其余调用方等待（或旁听）它的结果。
+
+    上游调用运行在独立任务里：发起者（leader）断开不会影响仍在等待的其他调用方；
+    只有当所有调用方都离开时才取消上游请求。
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, _StreamFlight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None or call.abandoned:
+            call = _Call(asyncio.ensure_future(factory()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _t, c=call: self._forget(self._calls, key, c))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.abandoned = True
+                call.task.cancel()
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        flight = self._streams.get(key)
+        if flight is None or flight.abandoned or flight.done:
+            flight = _StreamFlight(factory())
+            self._streams[key] = flight
+            flight.task.add_done_callback(lambda _t, f=flight: self._forget(self._streams, key, f))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        async with aclosing(flight.subscribe()) as items:
+            async for item in items:
+                yield item
+
+    @staticmethod
+    def _forget(table: Dict[str, Any], key: str, entry: Any) -> None:
+        if table.get(key) is entry:
+            del table[key]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "inFlight": len(self._calls) + len(self._streams),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
@@ -1,18 +1,46 @@
 from __future__ import annotations
 
-from typing import AsyncGenerator, Dict, List
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, Dict, List, Optional
 
-from .client import LLMClient
+import httpx
+
+from .client import chunk_text
+from .limiter import PRIORITY_INTERACTIVE
+from .metrics import CallTiming
+from .router import ChatClient
+from .tokens import TokenCounter, call_usage
 from ..roles.registry import RoleCard
 
 
+# 上游拒绝 stream=True 时可能返回的状态码：此时退回非流式请求
+_STREAM_UNSUPPORTED = {400, 404, 405, 415, 422, 501}
+
+
 class OpenAICompatProvider:
-    """OpenAI-compatible provider using LLMClient. If stream isn't available, it
-    fetches a full completion and re-chunks locally for SSE.
+    """OpenAI-compatible provider using LLMClient (or a RoutedClient). Streams upstream deltas as they
+    arrive; if the provider can't stream (disabled, rejected, or answered with a
+    plain JSON completion), it fetches a full completion and re-chunks locally for SSE.
+
+    ``last_timing`` holds TTFT / total latency of the most recent reply, and
+    ``last_usage`` its token usage (upstream ``usage`` when reported, otherwise
+    counted locally with ``counter``; see ``call_usage``).
+    ``priority`` is passed to per-account limiters (see ``AccountLimiter``).
     """
 
-    def __init__(self, client: LLMClient) -> None:
+    def __init__(
+        self,
+        client: ChatClient,
+        stream: bool = True,
+        priority: int = PRIORITY_INTERACTIVE,
+        counter: Optional[TokenCounter] = None,
+    ) -> None:
         self.client = client
+        self.stream = stream
+        self.priority = priority
+        self.counter = counter or TokenCounter()
+        self.last_timing: Optional[CallTiming] = None
+        self.last_usage: Optional[Dict[str, Any]] = None
 
     async def stream_reply(
         self,
@@ -24,20 +52,73 @@ class OpenAICompatProvider:
     ) -> AsyncGenerator[str, None]:
         # Prepend persona as system if not present
         messages = _ensure_persona_system(role, history)
+        timing = CallTiming()
+        self.last_timing = timing
+        self.last_usage = None
+        if self.stream:
+            emitted = False
+            parts: List[str] = []
+            upstream_usage: Any = None
+            try:
+                upstream = self.client.stream_chat_completion(
+                    messages=messages,
+                    model=model,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    timing=timing,
+                    priority=self.priority,
+                )
+                async with aclosing(upstream) as chunks:
+                    async for chunk in chunks:
+                        if chunk.get("usage"):
+                            upstream_usage = chunk["usage"]
+                        if _is_full_completion(chunk):
+                            for piece in _rechunk(chunk_text(chunk)):
+                                emitted = True
+                                parts.append(piece)
+                                yield piece
+                            continue
+                        delta = chunk_text(chunk)
+                        if delta:
+                            emitted = True
+                            parts.append(delta)
+                            yield delta
+                self.last_usage = call_usage(self.counter, messages, "".join(parts), upstream_usage)
+                return
+            except httpx.HTTPStatusError as e:
+                if emitted or e.response.status_code not in _STREAM_UNSUPPORTED:
+                    raise
+            timing = CallTiming()
+            self.last_timing = timing
+
         result = await self.client.chat_completion(
             messages=messages,
             model=model,
             temperature=temperature,
             max_tokens=max_tokens,
             stream=False,
+            priority=self.priority,
         )
+        timing.finish()
         try:
             content = result["choices"][0]["message"]["content"] or ""
         except Exception:
             content = ""
+        self.last_usage = call_usage(self.counter, messages, content, result.get("usage"))
         # Re-chunk for SSE delivery
-        for i in range(0, len(content), 64):
-            yield content[i : i + 64]
+        for piece in _rechunk(content):
+            yield piece
+
+
+def _is_full_completion(chunk: Dict) -> bool:
+    try:
+        return "message" in chunk["choices"][0]
+    except (KeyError, IndexError, TypeError):
+        return False
+
+
+def _rechunk(content: str, size: int = 64) -> List[str]:
+    return [content[i : i + size] for i in range(0, len(content), size)]
 
 
 def _ensure_persona_system(role: RoleCard, history: List[Dict[str, str]]) -> List[Dict[str, str]]:
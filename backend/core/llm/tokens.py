@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import base64
+import importlib.util
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence
+
+
+# chat 格式中每条消息的固定开销（role、分隔符），以及回复前缀
+MESSAGE_OVERHEAD = 4
+REPLY_PRIMING = 3
+
+# 近似 cl100k 的预切分：英文缩写、字母串（含 CJK）、最多 3 位数字、标点串、空白
+_PRETOKENIZE = re.compile(
+    r"'(?:s|t|re|ve|m|ll|d)| ?[^\W\d_]+| ?\d{1,3}| ?[^\s\w]+|\s+(?!\S)|\s+",
+    re.UNICODE,
+)
+
+
+def _is_cjk(ch: str) -> bool:
+    return "⺀" <= ch <= "鿿" or "豈" <= ch <= "﫿" or "＀" <= ch <= "￯" or "가" <= ch <= "힯"
+
+
+def heuristic_tokens(text: str) -> int:
+    """无词表时的估算：CJK 字符各算 1 个 token，其余约 4 字符 1 个。"""
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if _is_cjk(ch))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class BPEVocab:
+    """字节级 BPE 词表（tiktoken 格式：每行 ``base64(token) rank``），纯 Python 实现编码。
+
+    只用于计数，不需要 decode；每个预切分片段的结果会被缓存。
+    """
+
+    def __init__(self, ranks: Mapping[bytes, int], name: str = "bpe") -> None:
+        self.ranks = dict(ranks)
+        self.name = name
+        self._pieces: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path: Path) -> "BPEVocab":
+        ranks: Dict[bytes, int] = {}
+        with Path(path).open("rb") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2:
+                    ranks[base64.b64decode(parts[0])] = int(parts[1])
+        return cls(ranks, name=f"bpe:{Path(path).name}")
+
+    def _merge(self, piece: bytes) -> int:
+        if piece in self.ranks:
+            return 1
+        parts: List[bytes] = [piece[i : i + 1] for i in range(len(piece))]
+        while len(parts) > 1:
+            best: Optional[int] = None
+            best_rank: Optional[int] = None
+            for i in range(len(parts) - 1):
+                rank = self.ranks.get(parts[i] + parts[i + 1])
+                if rank is not None and (best_rank is None or rank < best_rank):
+                    best, best_rank = i, rank
+            if best is None:
+                break
+            parts[best : best + 2] = [parts[best] + parts[best + 1]]
+        return len(parts)
+
+    def _piece(self, piece: str) -> int:
+        with self._lock:
+            n = self._pieces.get(piece)
+            if n is not None:
+                self._pieces.move_to_end(piece)
+                return n
+        n = self._merge(piece.encode("utf-8"))
+        with self._lock:
+            self._pieces[piece] = n
+            if len(self._pieces) > 65536:
+                self._pieces.popitem(last=False)
+        return n
+
+    def count(self, text: str) -> int:
+        return sum(self._piece(m.group(0)) for m in _PRETOKENIZE.finditer(text))
+
+
+class TokenCounter:
+    """本地 token 计数：可插拔的编码函数（BPE 词表 / tiktoken / HF tokenizer），缺省为 CJK 感知的估算。
+
+    按文本内容做 LRU 记忆化：同一条历史消息在每轮组装上下文时只真正计数一次。
+    """
+
+    def __init__(self, count: Optional[Callable[[str], int]] = None, name: str = "heuristic", cache_size: int = 4096) -> None:
+        self._count = count or heuristic_tokens
+        self.name = name
+        self.cache_size = cache_size
+        self._memo: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        with self._lock:
+            n = self._memo.get(text)
+            if n is not None:
+                self._memo.move_to_end(text)
+                self.hits += 1
+                return n
+            self.misses += 1
+        n = self._count(text)
+        if self.cache_size > 0:
+            with self._lock:
+                self._memo[text] = n
+                if len(self._memo) > self.cache_size:
+                    self._memo.popitem(last=False)
+        return n
+
+    def count_message(self, content: str) -> int:
+        return self.count(content) + MESSAGE_OVERHEAD
+
+    def count_messages(self, messages: Sequence[Dict[str, Any]]) -> int:
+        return sum(self.count_message(str(m.get("content") or "")) for m in messages) + REPLY_PRIMING
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "tokenizer": self.name,
+            "memoEntries": len(self._memo),
+            "hitRate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+def load_counter(spec: Optional[str], cache_size: int = 4096) -> TokenCounter:
+    """按 TOKENIZER 配置构造计数器：
+
+    - 空 / ``heuristic``：CJK 感知估算；
+    - ``tiktoken:<encoding>``：使用 tiktoken（需安装）；
+    - ``*.json``：HuggingFace ``tokenizer.json``（需安装 tokenizers）；
+    - 其他路径：tiktoken 格式的 BPE 词表文件（纯 Python，无额外依赖）。
+    加载失败（依赖缺失、文件不存在）时退回估算，``name`` 会标明实际使用的计数方式。
+    """
+    spec = (spec or "").strip()
+    if not spec or spec == "heuristic":
+        return TokenCounter(cache_size=cache_size)
+    try:
+        if spec.startswith("tiktoken:"):
+            if importlib.util.find_spec("tiktoken") is None:
+                raise ImportError("tiktoken")
+            import tiktoken
+
+            enc = tiktoken.get_encoding(spec.split(":", 1)[1])
+            return TokenCounter(lambda t: len(enc.encode_ordinary(t)), name=spec, cache_size=cache_size)
+        if spec.endswith(".json"):
+            if importlib.util.find_spec("tokenizers") is None:
+                raise ImportError("tokenizers")
+            from tokenizers import Tokenizer
+
+            tok = Tokenizer.from_file(spec)
+            return TokenCounter(
+                lambda t: len(tok.encode(t, add_special_tokens=False).ids), name=f"hf:{Path(spec).name}", cache_size=cache_size
+            )
+        vocab = BPEVocab.from_file(Path(spec).expanduser())
+        return TokenCounter(vocab.count, name=vocab.name, cache_size=cache_size)
+    except (ImportError, OSError, ValueError):
+        return TokenCounter(name=f"heuristic (failed to load {spec})", cache_size=cache_size)
+
+
+def parse_usage(raw: Any) -> Optional[Dict[str, int]]:
+    """解析上游 OpenAI 风格的 usage 字段；缺失或格式不对时返回 None。"""
+    if not isinstance(raw, dict):
+        return None
+    try:
+        prompt = int(raw.get("prompt_tokens") or 0)
+        completion = int(raw.get("completion_tokens") or 0)
+    except (TypeError, ValueError):
+        return None
+    if not prompt and not completion:
+        return None
+    return {"promptTokens": prompt, "completionTokens": completion, "totalTokens": prompt + completion}
+
+
+def call_usage(
+    counter: TokenCounter, messages: Sequence[Dict[str, Any]], completion: str, upstream: Any = None
+) -> Dict[str, Any]:
+    """一次调用的 usage：优先采用上游返回值，否则用本地计数估算（``estimated=True``）。"""
+    usage = parse_usage(upstream)
+    if usage is not None:
+        return {**usage, "estimated": False}
+    prompt = counter.count_messages(messages)
+    done = counter.count(completion)
+    return {"promptTokens": prompt, "completionTokens": done, "totalTokens": prompt + done, "estimated": True}
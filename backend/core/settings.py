@@ -10,7 +10,70 @@ class Settings:
         self.llm_base_url: str = (os.getenv("LLM_BASE_URL", "").rstrip("/"))
         self.llm_api_key: str | None = os.getenv("LLM_API_KEY") or None
         self.llm_model: str = os.getenv("LLM_MODEL", "")
+        # 上游连接池：按 base URL 复用长连接（安装 h2 时启用 HTTP/2）
+        self.llm_timeout: float = float(os.getenv("LLM_TIMEOUT", "60"))
+        self.llm_http2: bool = os.getenv("LLM_HTTP2", "1").strip().lower() not in ("0", "false", "no", "off")
+        self.llm_max_connections: int = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+        self.llm_max_keepalive: int = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+        self.llm_keepalive_expiry: float = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+        # 角色回复是否向上游请求流式输出（上游不支持时自动退回整段请求）
+        self.llm_stream: bool = os.getenv("LLM_STREAM", "1").strip().lower() not in ("0", "false", "no", "off")
+        # 流式请求附带 stream_options.include_usage，让上游在流末尾返回真实 usage（上游拒绝该参数时设为 0）
+        self.llm_stream_usage: bool = os.getenv("LLM_STREAM_USAGE", "1").strip().lower() not in ("0", "false", "no", "off")
+        # 账号熔断：连续失败次数 / 滚动错误率达到阈值后熔断，冷却若干秒后放行探测请求
+        self.llm_breaker_failures: int = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+        self.llm_breaker_error_rate: float = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+        self.llm_breaker_cooldown: float = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+        # 幂等非流式调用（判官、提问建议、摘要）的重试：最多尝试次数、指数退避基数与上限（秒，带全抖动）
+        self.llm_retry_attempts: int = int(os.getenv("LLM_RETRY_ATTEMPTS", "3"))
+        self.llm_retry_backoff: float = float(os.getenv("LLM_RETRY_BACKOFF", "0.25"))
+        self.llm_retry_backoff_max: float = float(os.getenv("LLM_RETRY_BACKOFF_MAX", "4"))
+        # 对冲请求：超过账号延迟的该分位数仍未返回时向另一账号发同样的请求（0 关闭）
+        self.llm_hedge_percentile: float = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+        # 上述调用的截止时间（秒）：群聊一轮中判官与摘要共用这一预算，超时后退回轮询选人
+        self.llm_deadline: float = float(os.getenv("LLM_DEADLINE", "20"))
+        # env 默认账号的限流（0 表示不限）；providers.json 中的账号用 max_concurrent / rpm / tpm 字段配置
+        self.llm_max_concurrent: int = int(os.getenv("LLM_MAX_CONCURRENT", "0"))
+        self.llm_rpm: int = int(os.getenv("LLM_RPM", "0"))
+        self.llm_tpm: int = int(os.getenv("LLM_TPM", "0"))
+        # 判官/提问建议等非流式调用的响应缓存：内存 LRU 条数（0 关闭）、过期秒数、可选磁盘层及其容量上限
+        self.llm_cache_size: int = int(os.getenv("LLM_CACHE_SIZE", "512"))
+        self.llm_cache_ttl: float = float(os.getenv("LLM_CACHE_TTL", "600"))
+        self.llm_cache_disk: bool = os.getenv("LLM_CACHE_DISK", "0").strip().lower() in ("1", "true", "yes", "on")
+        self.llm_cache_disk_mb: int = int(os.getenv("LLM_CACHE_DISK_MB", "64"))
+        # 合并并发的相同上游请求（single-flight）
+        self.llm_coalesce: bool = os.getenv("LLM_COALESCE", "1").strip().lower() not in ("0", "false", "no", "off")
+        # 发给模型的上下文 token 预算（含补全上限）；可按模型覆盖：CONTEXT_TOKENS_BY_MODEL="deepseek-chat=60000,qwen2=8000"
+        self.context_tokens: int = int(os.getenv("CONTEXT_TOKENS", "8000"))
+        self.context_tokens_by_model: dict[str, int] = {
+            k.strip(): int(v)
+            for k, _, v in (item.partition("=") for item in os.getenv("CONTEXT_TOKENS_BY_MODEL", "").split(","))
+            if k.strip() and v.strip()
+        }
+        # 本地 token 计数：heuristic（默认）、tiktoken:<encoding>、HF tokenizer.json 或 tiktoken 格式的 BPE 词表文件路径
+        self.tokenizer: str = os.getenv("TOKENIZER", "heuristic")
+        # 可续传 SSE：每个流在内存中保留的事件数、断线后等待重连的秒数（期间生成继续）、结束后保留供补发的秒数、
+        # 是否把事件溢写到 DATA_DIR/streams（超出内存缓冲的部分也能补发）
+        self.sse_buffer_events: int = int(os.getenv("SSE_BUFFER_EVENTS", "2048"))
+        self.sse_resume_grace: float = float(os.getenv("SSE_RESUME_GRACE", "30"))
+        self.sse_retain: float = float(os.getenv("SSE_RETAIN", "300"))
+        self.sse_spill: bool = os.getenv("SSE_SPILL", "0").strip().lower() in ("1", "true", "yes", "on")
+        # 群聊广播（多人观看同一群聊）：每个订阅者的队列长度、每个群保留的积压事件数、慢消费策略（catchup / drop）、
+        # 多 worker 共享广播的 Unix socket 路径（留空则只在进程内广播）
+        self.group_broadcast_queue: int = int(os.getenv("GROUP_BROADCAST_QUEUE", "256"))
+        self.group_broadcast_backlog: int = int(os.getenv("GROUP_BROADCAST_BACKLOG", "4096"))
+        self.group_broadcast_policy: str = os.getenv("GROUP_BROADCAST_POLICY", "catchup").strip().lower()
+        self.group_broadcast_ipc: str = os.getenv("GROUP_BROADCAST_IPC", "").strip()
+        # 群聊参与者上限（判官只看本地预筛后的前 k 位，提示词长度与人数无关）
+        self.group_max_participants: int = int(os.getenv("GROUP_MAX_PARTICIPANTS", "50"))
+        # 面板作答（全体参与者同时回答）时同时进行的模型调用数
+        self.group_panel_concurrency: int = int(os.getenv("GROUP_PANEL_CONCURRENCY", "8"))
         self.data_dir: str = os.getenv("DATA_DIR", "./data")
+        # 存储后端：json（默认，文件 + filelock）或 sqlite（WAL）
+        self.storage_backend: str = os.getenv("STORAGE_BACKEND", "json").strip().lower()
+        self.sqlite_path: str = os.getenv("SQLITE_PATH") or os.path.join(self.data_dir, "philohumanities.db")
+        # async 路由访问存储时使用的线程池大小
+        self.storage_workers: int = int(os.getenv("STORAGE_WORKERS", "8"))
         env_origins = os.getenv("ALLOW_ORIGINS")
         self.allow_origins = [o.strip() for o in env_origins.split(",") if o.strip()] if env_origins else ["*"]
 
@@ -22,4 +85,6 @@ def get_settings() -> Settings:
         raise RuntimeError("LLM_BASE_URL is not set in env")
     if not s.llm_model:
         raise RuntimeError("LLM_MODEL is not set in env")
+    if s.storage_backend not in ("json", "sqlite"):
+        raise RuntimeError(f"unsupported STORAGE_BACKEND: {s.storage_backend}")
     return s
@@ -6,9 +6,13 @@ import re
 from pathlib import Path
 from typing import Any, Dict, List, Tuple
 
+from filelock import FileLock
+
 from ...infrastructure.paths import ensure_dir, resolve_data_dir
-from ..conversations.repository import Storage
-from ..llm.client import LLMClient
+from ...infrastructure.async_io import AsyncStore
+from ..llm.limiter import PRIORITY_BACKGROUND
+from ..llm.retry import deadline_in
+from ..llm.router import ChatClient
 from ..settings import get_settings
 
 
@@ -31,12 +35,16 @@ def _load_cache() -> Dict[str, Any]:
         return {}
 
 
-def _save_cache(cache: Dict[str, Any]) -> None:
-    _, path = _data_paths()
-    tmp = path.with_name(f"{path.name}.tmp")
-    with tmp.open("w", encoding="utf-8") as f:
-        json.dump(cache, f, ensure_ascii=False, indent=2)
-    tmp.replace(path)
+def _save_cache_entry(key: str, value: Dict[str, Any]) -> None:
+    """在文件锁内重新读取后写入单个条目，并发请求之间既不会丢更新，也不会争用同一个临时文件。"""
+    base, path = _data_paths()
+    with FileLock(str(base / ".cache.lock")):
+        cache = _load_cache()
+        cache[key] = value
+        tmp = path.with_name(f"{path.name}.tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False, indent=2)
+        tmp.replace(path)
 
 
 def _limit_sentences(text: str, max_sentences: int = 2) -> str:
@@ -70,25 +78,28 @@ def _dedup_texts(items: List[Dict[str, str]]) -> List[Dict[str, str]]:
 
 async def generate_suggestions(
     cid: str,
+    storage: AsyncStore,
+    client: ChatClient,
     k: int = 4,
     max_sentences: int = 2,
     angles: List[str] | None = None,
     locale: str | None = None,
     diversify: bool = False,
 ) -> Dict[str, Any]:
-    s = get_settings()
-    st = Storage(s.data_dir)
-    msgs = st.get_messages(cid)
-    last_id = f"{len(msgs)}"
+    # 只需要人设（首条 system）与最近几条消息：分别读取头部与尾部，不加载整段历史
+    page = await storage.get_messages_page(cid, limit=6)
+    msgs = page.messages
+    last_id = f"{page.total}"
     key_src = json.dumps({"cid": cid, "last": last_id, "k": k, "angles": angles, "locale": locale}, ensure_ascii=False)
     cache_key = hashlib.sha256(key_src.encode("utf-8")).hexdigest()[:24]
-    cache = _load_cache()
+    cache = await storage.run(_load_cache)
     if (not diversify) and cache_key in cache:
         return cache[cache_key]
 
-    system = next((m.content for m in msgs if m.role == "system"), None)
+    head = msgs if page.start == 0 else (await storage.get_messages_page(cid, after=-1, limit=1)).messages
+    system = next((m.content for m in head if m.role == "system"), None)
     tail = []
-    for m in msgs[-6:]:
+    for m in msgs:
         if m.role in ("user", "assistant"):
             tail.append({"role": m.role, "content": m.content})
 
@@ -117,9 +128,18 @@ async def generate_suggestions(
     user_prompt += "\n".join(context_lines)
     user_prompt += "\n严格输出JSON数组，例如: [{\"text\":\"...\",\"angle\":\"clarify\"}, ...]"
 
-    client = LLMClient(base_url=s.llm_base_url, api_key=s.llm_api_key, default_model=s.llm_model)
     messages = [{"role": "system", "content": sys_prompt}, {"role": "user", "content": user_prompt}]
-    resp = await client.chat_completion(messages=messages, stream=False, max_tokens=256)
+    # 幂等的后台调用：失败退避重试，慢请求对冲到其他账号，整体受 LLM_DEADLINE 约束
+    resp = await client.chat_completion(
+        messages=messages,
+        stream=False,
+        max_tokens=256,
+        priority=PRIORITY_BACKGROUND,
+        cache=not diversify,
+        retry=True,
+        hedge=True,
+        deadline=deadline_in(get_settings().llm_deadline),
+    )
     try:
         content = resp["choices"][0]["message"]["content"] or "[]"
     except Exception:
@@ -143,11 +163,10 @@ async def generate_suggestions(
     result = {
         "suggestions": suggestions,
         "meta": {
-            "model": s.llm_model,
+            "model": client.default_model,
             "promptVersion": 1,
             "cached": False,
         },
     }
-    cache[cache_key] = result | {"meta": {**result["meta"], "cached": True}}
-    _save_cache(cache)
+    await storage.run(_save_cache_entry, cache_key, result | {"meta": {**result["meta"], "cached": True}})
     return result
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from filelock import FileLock
+
+from ...infrastructure.paths import ensure_dir, resolve_data_dir
+
+
+# 聚合维度：单人会话 / 群聊会话 / provider 账号
+USAGE_SCOPES = ("conversation", "group", "provider")
+# usage.journal 超过该大小时合并回快照
+_JOURNAL_COMPACT_BYTES = 256 * 1024
+
+
+def empty_totals() -> Dict[str, Any]:
+    return {"calls": 0, "promptTokens": 0, "completionTokens": 0, "totalTokens": 0, "estimatedCalls": 0, "updatedAt": None}
+
+
+def add_usage(totals: Dict[str, Any], usage: Dict[str, Any]) -> Dict[str, Any]:
+    totals["calls"] += 1
+    totals["promptTokens"] += int(usage.get("promptTokens") or 0)
+    totals["completionTokens"] += int(usage.get("completionTokens") or 0)
+    totals["totalTokens"] = totals["promptTokens"] + totals["completionTokens"]
+    if usage.get("estimated"):
+        totals["estimatedCalls"] += 1
+    totals["updatedAt"] = str(datetime.utcnow())
+    return totals
+
+
+def _fold(data: Dict[str, Dict[str, Dict[str, Any]]], rec: Dict[str, Any]) -> None:
+    totals = data.setdefault(rec["scope"], {}).setdefault(rec["key"], empty_totals())
+    add_usage(totals, rec)
+    totals["updatedAt"] = rec.get("at") or totals["updatedAt"]
+
+
+class UsageStorage:
+    """token 用量聚合（JSON 文件）：``{scope: {key: totals}}``。
+
+    usage.json 是快照，usage.journal 每次调用追加一行增量（O(1)，不重写快照）；
+    读取时把增量合并进快照，增量累积到阈值时也在记录时合并。
+    """
+
+    def __init__(self, data_dir: str) -> None:
+        base = resolve_data_dir(data_dir)
+        ensure_dir(base)
+        self.path = base / "usage.json"
+        self.journal_path = base / "usage.journal"
+        self._lock = FileLock(str(base / ".usage.lock"))
+
+    def _read(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write(self, data: Dict[str, Any]) -> None:
+        tmp: Path = self.path.with_name(f"{self.path.name}.tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        tmp.replace(self.path)
+
+    def _compact(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """快照 + 增量合并后的全量数据；有增量时写回快照并清空 journal（调用方持有锁）。"""
+        data = self._read()
+        try:
+            with self.journal_path.open("rb") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return data
+        if not lines:
+            return data
+        for raw_line in lines:
+            try:
+                _fold(data, json.loads(raw_line))
+            except (ValueError, KeyError, TypeError):
+                # 写到一半的行（进程中途退出）
+                continue
+        self._write(data)
+        self.journal_path.write_bytes(b"")
+        return data
+
+    def record(self, scope: str, key: str, usage: Dict[str, Any]) -> None:
+        rec = {
+            "scope": scope,
+            "key": key,
+            "promptTokens": int(usage.get("promptTokens") or 0),
+            "completionTokens": int(usage.get("completionTokens") or 0),
+            "estimated": bool(usage.get("estimated")),
+            "at": str(datetime.utcnow()),
+        }
+        line = (json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            with self.journal_path.open("ab") as f:
+                f.write(line)
+                size = f.tell()
+            if size >= _JOURNAL_COMPACT_BYTES:
+                self._compact()
+
+    def get(self, scope: str, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            totals = self._compact().get(scope, {}).get(key)
+        return {"key": key, **totals} if totals else None
+
+    def list(self, scope: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = self._compact().get(scope, {})
+        return sorted(({"key": k, **v} for k, v in items.items()), key=lambda x: x["totalTokens"], reverse=True)
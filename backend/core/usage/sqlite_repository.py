@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from ...infrastructure.sqlite import SQLiteDatabase
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS token_usage (
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    estimated_calls INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (scope, key)
+);
+"""
+
+
+def _totals(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "key": row["key"],
+        "calls": row["calls"],
+        "promptTokens": row["prompt_tokens"],
+        "completionTokens": row["completion_tokens"],
+        "totalTokens": row["prompt_tokens"] + row["completion_tokens"],
+        "estimatedCalls": row["estimated_calls"],
+        "updatedAt": row["updated_at"],
+    }
+
+
+class SQLiteUsageStorage:
+    """UsageStorage 的 SQLite 实现：每次记录是一条 upsert 累加。"""
+
+    def __init__(self, db_path: Path) -> None:
+        self.db = SQLiteDatabase(db_path)
+        self.db.executescript(_SCHEMA)
+
+    def record(self, scope: str, key: str, usage: Dict[str, Any]) -> None:
+        with self.db.transaction() as conn:
+            conn.execute(
+                "INSERT INTO token_usage (scope, key, calls, prompt_tokens, completion_tokens, estimated_calls, updated_at)"
+                " VALUES (?, ?, 1, ?, ?, ?, ?)"
+                " ON CONFLICT(scope, key) DO UPDATE SET calls = calls + 1,"
+                " prompt_tokens = prompt_tokens + excluded.prompt_tokens,"
+                " completion_tokens = completion_tokens + excluded.completion_tokens,"
+                " estimated_calls = estimated_calls + excluded.estimated_calls,"
+                " updated_at = excluded.updated_at",
+                (
+                    scope,
+                    key,
+                    int(usage.get("promptTokens") or 0),
+                    int(usage.get("completionTokens") or 0),
+                    1 if usage.get("estimated") else 0,
+                    str(datetime.utcnow()),
+                ),
+            )
+
+    def import_totals(self, scope: str, key: str, totals: Dict[str, Any]) -> None:
+        """导入一个 key 的累计用量（迁移用），已存在则覆盖。"""
+        with self.db.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO token_usage (scope, key, calls, prompt_tokens, completion_tokens, estimated_calls, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    scope,
+                    key,
+                    int(totals.get("calls") or 0),
+                    int(totals.get("promptTokens") or 0),
+                    int(totals.get("completionTokens") or 0),
+                    int(totals.get("estimatedCalls") or 0),
+                    str(totals.get("updatedAt") or datetime.utcnow()),
+                ),
+            )
+
+    def get(self, scope: str, key: str) -> Optional[Dict[str, Any]]:
+        row = self.db.connection().execute("SELECT * FROM token_usage WHERE scope = ? AND key = ?", (scope, key)).fetchone()
+        return _totals(row) if row else None
+
+    def list(self, scope: str) -> List[Dict[str, Any]]:
+        rows = self.db.connection().execute(
+            "SELECT * FROM token_usage WHERE scope = ? ORDER BY prompt_tokens + completion_tokens DESC", (scope,)
+        )
+        return [_totals(r) for r in rows]
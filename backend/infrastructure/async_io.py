@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, TypeVar
+
+
+T = TypeVar("T")
+
+
+class AsyncStore:
+    """把同步存储（Storage/GroupStorage 及其 SQLite 版本）包装成 async 接口。
+
+    每个方法调用都提交到有界线程池执行，文件锁等待和整文件读写都不会阻塞事件循环。
+    调用方被取消时，已提交的写操作仍会在线程里完成，不会留下半写状态。
+    """
+
+    def __init__(self, store: Any, executor: ThreadPoolExecutor) -> None:
+        self._store = store
+        self._executor = executor
+        self._methods: Dict[str, Callable[..., Any]] = {}
+
+    @property
+    def sync(self) -> Any:
+        """底层同步存储（供线程内或非 async 代码直接使用）。"""
+        return self._store
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """在存储线程池中执行任意阻塞调用（如附带的日志/缓存文件读写）。"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        method = self._methods.get(name)
+        if method is None:
+            target = getattr(self._store, name)
+            if not callable(target) or name.startswith("_"):
+                raise AttributeError(name)
+
+            async def method(*args: Any, **kwargs: Any) -> Any:
+                return await self.run(target, *args, **kwargs)
+
+            method.__name__ = name
+            self._methods[name] = method
+        return method
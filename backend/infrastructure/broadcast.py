@@ -0,0 +1,333 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import uuid
+from collections import deque
+from contextlib import aclosing
+from itertools import islice
+from pathlib import Path
+from typing import AsyncIterator, Deque, Dict, Optional, Set, Tuple
+
+from filelock import FileLock, Timeout
+
+from .paths import ensure_dir
+from .sse import ResumableStream, StreamRegistry, parse_last_event_id
+
+
+logger = logging.getLogger(__name__)
+
+# 订阅者的慢消费策略：drop 丢弃队列中最旧的事件并告知丢了多少；catchup 队列满时转为从频道积压按游标补发
+POLICIES = ("drop", "catchup")
+# 空闲时发送注释行保活，避免代理断开长连接
+HEARTBEAT_INTERVAL = 15.0
+
+_LAG = object()
+
+
+class _Subscriber:
+    def __init__(self, queue_size: int, policy: str, cursor: int) -> None:
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size))
+        self.policy = policy
+        self.cursor = cursor  # 最后一个已发出事件的序号
+        self.lagging = False  # True 时不再入队，由订阅方从积压补发
+        self.dropped = 0
+
+
+class _Channel:
+    """一个话题（群聊 gid）的广播频道：事件按序编号并保留有界积压，供落后的订阅者补发与 Last-Event-ID 续接。"""
+
+    def __init__(self, backlog: int) -> None:
+        self.epoch = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self.backlog: Deque[Tuple[int, bytes]] = deque(maxlen=max(1, backlog))
+        self.subs: Set[_Subscriber] = set()
+        self.live: Optional[ResumableStream] = None  # 本进程中正在生成的一轮
+        self.round_start = 0  # 当前一轮第一个事件之前的序号
+
+    def producing(self) -> Optional[ResumableStream]:
+        return self.live if self.live is not None and not self.live.finished else None
+
+
+class GroupBroadcast:
+    """按 gid 广播群聊事件：每轮只有一个生成任务，任意多个观看者收到同样的 judge.* / agent.message.* 事件。
+
+    每个订阅者有自己的有界队列，生成方从不因慢消费者阻塞；队列满时按订阅者的策略丢弃旧事件（drop）
+    或改为从频道积压补发（catchup），积压也已被挤出时先收到 stream.gap。
+    配置 ``ipc_path`` 后，同一台机器上的多个 worker 经 Unix socket 中继互相转发事件，
+    连到任一 worker 的观看者都能看到其他 worker 上生成的轮次。
+    """
+
+    def __init__(
+        self,
+        queue_size: int = 256,
+        backlog: int = 4096,
+        policy: str = "catchup",
+        ipc_path: Optional[Path] = None,
+        heartbeat: float = HEARTBEAT_INTERVAL,
+    ) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"unknown broadcast policy: {policy}")
+        self.queue_size = queue_size
+        self.backlog = backlog
+        self.policy = policy
+        self.heartbeat = heartbeat
+        self._channels: Dict[str, _Channel] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._relay = _UnixSocketRelay(ipc_path, self._deliver) if ipc_path is not None else None
+
+    async def start(self) -> None:
+        self._bind_loop()
+        if self._relay is not None:
+            self._relay.start()
+
+    async def aclose(self) -> None:
+        if self._relay is not None:
+            await self._relay.aclose()
+
+    def _bind_loop(self) -> None:
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+
+    def _channel(self, topic: str) -> _Channel:
+        ch = self._channels.get(topic)
+        if ch is None:
+            ch = self._channels[topic] = _Channel(self.backlog)
+        return ch
+
+    def _gc(self, topic: str) -> None:
+        ch = self._channels.get(topic)
+        if ch is not None and not ch.subs and ch.producing() is None:
+            del self._channels[topic]
+
+    def live(self, topic: str) -> Optional[ResumableStream]:
+        """本进程中该话题正在进行的生成（没有则为 None）。"""
+        ch = self._channels.get(topic)
+        return ch.producing() if ch is not None else None
+
+    def produce(self, topic: str, registry: StreamRegistry, events: AsyncIterator[bytes]) -> ResumableStream:
+        """在 ``registry`` 中开始一次生成，其事件同时广播给该话题的所有订阅者。调用方负责保证同一话题只有一个生成。"""
+        self._bind_loop()
+        ch = self._channel(topic)
+        stream = registry.start(self._relay_events(topic, ch, events))
+        ch.live = stream
+        ch.round_start = ch.seq
+        return stream
+
+    async def _relay_events(self, topic: str, ch: _Channel, events: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        try:
+            async with aclosing(events) as it:
+                async for chunk in it:
+                    self._deliver(topic, chunk, forward=True)
+                    yield chunk
+        finally:
+            ch.live = None
+            self._gc(topic)
+
+    def publish(self, topic: str, chunk: bytes) -> None:
+        """发布一条不属于某次生成的事件（如暂停、插话）。可在任意线程调用；没有订阅者时是空操作。"""
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._deliver(topic, chunk, forward=True)
+        else:
+            loop.call_soon_threadsafe(self._deliver, topic, chunk, True)
+
+    def _deliver(self, topic: str, chunk: bytes, forward: bool = False) -> None:
+        if forward and self._relay is not None:
+            self._relay.send(topic, chunk)
+        ch = self._channels.get(topic)
+        if ch is None:
+            return
+        ch.seq += 1
+        framed = f"id: {ch.epoch}:{ch.seq}\n".encode() + chunk
+        ch.backlog.append((ch.seq, framed))
+        for sub in ch.subs:
+            if sub.lagging:
+                continue
+            if sub.queue.full():
+                if sub.policy == "catchup":
+                    # 丢掉队列，改由订阅方按游标从积压补发；放入 _LAG 唤醒正在等待的订阅方
+                    sub.lagging = True
+                    while not sub.queue.empty():
+                        sub.queue.get_nowait()
+                    sub.queue.put_nowait(_LAG)
+                    continue
+                sub.queue.get_nowait()
+                sub.dropped += 1
+            sub.queue.put_nowait((ch.seq, framed))
+
+    async def subscribe(self, topic: str, policy: Optional[str] = None, last_event_id: Optional[str] = None) -> AsyncIterator[bytes]:
+        """订阅话题直到客户端断开。带 Last-Event-ID 时从该事件之后补发；否则若有一轮正在进行，从这一轮开头补发。"""
+        self._bind_loop()
+        ch = self._channel(topic)
+        resume = parse_last_event_id(last_event_id)
+        reset = resume is not None and resume[0] != ch.epoch
+        if resume is not None and not reset:
+            cursor = min(resume[1], ch.seq)
+        elif ch.producing() is not None:
+            cursor = ch.round_start
+        else:
+            cursor = ch.seq
+        sub = _Subscriber(self.queue_size, policy or self.policy, cursor)
+        sub.lagging = cursor < ch.seq
+        ch.subs.add(sub)
+        try:
+            if reset:
+                # 频道已重建（期间没有任何订阅者），错过的事件无从补发：客户端应重新拉取会话
+                yield b"event: stream.reset\ndata: {}\n\n"
+            while True:
+                if sub.lagging:
+                    async for framed in self._catch_up(ch, sub):
+                        yield framed
+                    continue
+                try:
+                    item = await asyncio.wait_for(sub.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                if item is _LAG:
+                    continue
+                if sub.dropped:
+                    yield f"event: stream.dropped\ndata: {json.dumps({'count': sub.dropped})}\n\n".encode()
+                    sub.dropped = 0
+                sub.cursor, framed = item
+                yield framed
+        finally:
+            ch.subs.discard(sub)
+            self._gc(topic)
+
+    @staticmethod
+    async def _catch_up(ch: _Channel, sub: _Subscriber) -> AsyncIterator[bytes]:
+        """按游标从积压补发，追到最新后恢复从队列接收。"""
+        while True:
+            first = ch.backlog[0][0] if ch.backlog else ch.seq + 1
+            if sub.cursor + 1 < first:
+                gap = {"from": sub.cursor + 1, "to": first - 1}
+                yield f"event: stream.gap\ndata: {json.dumps(gap)}\n\n".encode()
+                sub.cursor = first - 1
+            pending = list(islice(ch.backlog, sub.cursor + 1 - first, None))
+            for seq, framed in pending:
+                sub.cursor = seq
+                yield framed
+            if sub.cursor >= ch.seq:
+                # 与 _deliver 在同一事件循环中执行，这里到清除 lagging 之间不会插入新事件
+                while not sub.queue.empty():
+                    sub.queue.get_nowait()
+                sub.lagging = False
+                return
+
+
+class _UnixSocketRelay:
+    """同一台机器上多个 worker 之间转发广播事件。
+
+    拿到 ``<path>.lock`` 的 worker 绑定 Unix socket 充当中继，其余 worker 作为客户端连接；
+    每条消息是一行 JSON ``{"t": topic, "c": chunk}``，中继把收到的消息转给其他所有连接。
+    中继所在进程退出时锁随之释放，其他 worker 重连时重新竞选。积压过多的连接直接断开，不拖慢生成方。
+    """
+
+    _MAX_BUFFER = 4 * 1024 * 1024
+
+    def __init__(self, path: Path, on_message) -> None:
+        self.path = path
+        self._on_message = on_message
+        self._lock = FileLock(str(path) + ".lock")
+        self._peers: Set[asyncio.StreamWriter] = set()  # 作为中继时的客户端连接
+        self._upstream: Optional[asyncio.StreamWriter] = None  # 作为客户端时到中继的连接
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        ensure_dir(self.path.parent)
+        self._task = asyncio.create_task(self._run())
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._server is not None:
+            self._server.close()
+            self.path.unlink(missing_ok=True)
+        for w in list(self._peers) + ([self._upstream] if self._upstream else []):
+            w.close()
+        if self._lock.is_locked:
+            self._lock.release()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if self._try_lead():
+                    await self._lead()
+                else:
+                    await self._follow()
+            except asyncio.CancelledError:
+                raise
+            except OSError:
+                pass
+            except Exception:
+                logger.exception("broadcast relay failed")
+            await asyncio.sleep(0.5)
+
+    def _try_lead(self) -> bool:
+        if self._lock.is_locked:
+            return True
+        try:
+            self._lock.acquire(timeout=0)
+            return True
+        except Timeout:
+            return False
+
+    async def _lead(self) -> None:
+        self.path.unlink(missing_ok=True)  # 上一个中继异常退出留下的 socket 文件
+        self._server = await asyncio.start_unix_server(self._accept, path=str(self.path))
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _accept(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._peers.add(writer)
+        try:
+            async for line in reader:
+                self._dispatch(line)
+                for peer in list(self._peers):
+                    if peer is not writer:
+                        self._write(peer, line)
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+    async def _follow(self) -> None:
+        reader, writer = await asyncio.open_unix_connection(str(self.path))
+        self._upstream = writer
+        try:
+            async for line in reader:
+                self._dispatch(line)
+        finally:
+            self._upstream = None
+            writer.close()
+
+    def _dispatch(self, line: bytes) -> None:
+        try:
+            msg = json.loads(line)
+            self._on_message(msg["t"], msg["c"].encode())
+        except (ValueError, KeyError, TypeError):
+            logger.warning("dropping malformed broadcast message")
+
+    def _write(self, writer: asyncio.StreamWriter, line: bytes) -> None:
+        if writer.transport.get_write_buffer_size() > self._MAX_BUFFER:
+            writer.close()
+            self._peers.discard(writer)
+            return
+        writer.write(line)
+
+    def send(self, topic: str, chunk: bytes) -> None:
+        line = (json.dumps({"t": topic, "c": chunk.decode()}, ensure_ascii=False) + "\n").encode()
+        if self._upstream is not None:
+            self._write(self._upstream, line)
+        for peer in list(self._peers):
+            self._write(peer, line)
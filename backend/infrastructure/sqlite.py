@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from .paths import ensure_dir
+
+
+class SQLiteDatabase:
+    """SQLite 数据库句柄（WAL 模式），每个线程持有独立连接。
+
+    写操作通过 ``transaction()`` 以 ``BEGIN IMMEDIATE`` 开启，保证单次 read-modify-write
+    在多个线程/进程间串行化；读操作直接使用 ``connection()``，WAL 下不会阻塞写者。
+    """
+
+    def __init__(self, path: Path, busy_timeout_ms: int = 5000) -> None:
+        self.path = Path(path)
+        ensure_dir(self.path.parent)
+        self._busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.execute(f"PRAGMA busy_timeout={int(self._busy_timeout_ms)}")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    def executescript(self, script: str) -> None:
+        with self._schema_lock:
+            self.connection().executescript(script)
+
+    def ensure_column(self, table: str, column: str, decl: str) -> None:
+        """为旧库补齐新增列（仅支持可空 / 带默认值的列）。"""
+        with self._schema_lock:
+            conn = self.connection()
+            existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
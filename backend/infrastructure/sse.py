@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import uuid
+from contextlib import aclosing
+from pathlib import Path
+from typing import IO, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import anyio
+from fastapi import HTTPException
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from .paths import ensure_dir
+
+
+logger = logging.getLogger(__name__)
+
+
+class EventStreamResponse(StreamingResponse):
+    """客户端断开时确定性地关闭生成器的 SSE 响应。
+
+    Starlette 在断开时只取消发送任务：若生成器正停在 ``yield`` 上，它不会被恢复，
+    只能等 GC 回收，期间上游请求仍在生成、连接也不会归还连接池。
+    这里在响应结束后（无论正常结束还是断开）总是 ``aclose()`` 生成器，
+    使其 ``finally`` 中的清理（取消上游、记录中断消息）立即执行。
+    """
+
+    media_type = "text/event-stream"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            aclose = getattr(self.body_iterator, "aclose", None)
+            if aclose is not None:
+                with anyio.CancelScope(shield=True):
+                    await aclose()
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    """解析 ``<streamId>:<seq>`` 形式的 Last-Event-ID；格式不对返回 None。"""
+    if not value:
+        return None
+    sid, _, seq = value.strip().rpartition(":")
+    if not sid or not seq.isdigit():
+        return None
+    return sid, int(seq)
+
+
+class ResumableStream:
+    """一次生成的事件日志：事件按序编号，保存在有界环形缓冲里（可选溢写到磁盘），任意多个订阅者按游标读取。
+
+    生成由独立任务驱动，与 HTTP 连接解耦：客户端断线后带 Last-Event-ID 重连，
+    从断点补发错过的事件后继续跟随同一次生成，不会再发起新的模型调用。
+    """
+
+    def __init__(self, sid: str, capacity: int, spill_path: Optional[Path] = None) -> None:
+        self.id = sid
+        self.capacity = max(1, capacity)
+        self._buf: List[bytes] = []
+        self._base = 1  # _buf[0] 的序号
+        self.last_seq = 0
+        self.finished = False
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+        self._spill_path = spill_path
+        self._spill: Optional[IO[str]] = None
+        if spill_path is not None:
+            ensure_dir(spill_path.parent)
+            self._spill = spill_path.open("a", encoding="utf-8")
+
+    def append(self, chunk: bytes) -> int:
+        self.last_seq += 1
+        framed = f"id: {self.id}:{self.last_seq}\n".encode() + chunk
+        self._buf.append(framed)
+        # 攒到两倍容量再整体裁剪，摊还 O(1)
+        if len(self._buf) >= 2 * self.capacity:
+            drop = len(self._buf) - self.capacity
+            del self._buf[:drop]
+            self._base += drop
+        if self._spill is not None:
+            self._spill.write(json.dumps({"seq": self.last_seq, "raw": framed.decode()}, ensure_ascii=False) + "\n")
+        self._wake()
+        return self.last_seq
+
+    def finish(self) -> None:
+        self.finished = True
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+        self._wake()
+
+    def discard(self) -> None:
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+        if self._spill_path is not None:
+            self._spill_path.unlink(missing_ok=True)
+
+    def _wake(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _replay_spill(self, after: int, before: int) -> List[bytes]:
+        if self._spill_path is None or not self._spill_path.exists():
+            return []
+        if self._spill is not None:
+            self._spill.flush()
+        out = []
+        with self._spill_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                rec = json.loads(line)
+                if after < rec["seq"] < before:
+                    out.append(rec["raw"].encode())
+        return out
+
+    async def follow(self, after: int = 0) -> AsyncIterator[bytes]:
+        """从序号 ``after`` 之后开始产出事件，直到生成结束。"""
+        # 超出当前序号的 after（过期标签页、上一次流的 id）按“已读到最新”处理，不能跳过之后的实时事件
+        cursor = max(0, min(after, self.last_seq))
+        while True:
+            if cursor + 1 < self._base:
+                # 已被挤出环形缓冲：从溢写文件补发，没有溢写时告知客户端丢失的区间
+                missed = self._replay_spill(cursor, self._base)
+                if missed:
+                    for framed in missed:
+                        yield framed
+                else:
+                    gap = {"from": cursor + 1, "to": self._base - 1}
+                    yield f"event: stream.gap\ndata: {json.dumps(gap)}\n\n".encode()
+                cursor = self._base - 1
+            pending = self._buf[cursor + 1 - self._base :]
+            for framed in pending:
+                yield framed
+            cursor += len(pending)
+            if cursor >= self.last_seq:
+                if self.finished:
+                    return
+                await self._changed.wait()
+
+
+class StreamRegistry:
+    """进程内可续传流的注册表。
+
+    最后一个订阅者断开后保留 ``grace`` 秒等待重连，仍无人订阅则取消生成（生成器的 finally 照常记录中断）；
+    结束的流再保留 ``retain`` 秒供迟到的重连补发。多 worker 部署时续传需落到同一进程（粘性会话）。
+    """
+
+    def __init__(self, capacity: int = 2048, grace: float = 30.0, retain: float = 300.0, spill_dir: Optional[Path] = None) -> None:
+        self.capacity = capacity
+        self.grace = grace
+        self.retain = retain
+        self.spill_dir = spill_dir
+        self._streams: Dict[str, ResumableStream] = {}
+
+    def get(self, sid: str) -> Optional[ResumableStream]:
+        return self._streams.get(sid)
+
+    def start(self, events: AsyncIterator[bytes]) -> ResumableStream:
+        sid = uuid.uuid4().hex[:16]
+        spill = self.spill_dir / f"{sid}.jsonl" if self.spill_dir is not None else None
+        stream = ResumableStream(sid, self.capacity, spill)
+        self._streams[sid] = stream
+        stream.task = asyncio.create_task(self._pump(stream, events))
+        return stream
+
+    async def _pump(self, stream: ResumableStream, events: AsyncIterator[bytes]) -> None:
+        try:
+            async with aclosing(events) as it:
+                async for chunk in it:
+                    stream.append(chunk)
+        except Exception:
+            logger.exception("stream %s failed", stream.id)
+            stream.append(b'event: error\ndata: {"code": "internal_error", "message": "stream failed"}\n\n')
+        finally:
+            stream.finish()
+            asyncio.get_running_loop().call_later(self.retain, self._evict, stream.id)
+
+    def _evict(self, sid: str) -> None:
+        stream = self._streams.pop(sid, None)
+        if stream is not None:
+            stream.discard()
+
+    def _release(self, stream: ResumableStream) -> None:
+        stream.subscribers -= 1
+        if stream.subscribers == 0 and not stream.finished:
+            asyncio.get_running_loop().call_later(self.grace, self._cancel_if_idle, stream)
+
+    @staticmethod
+    def _cancel_if_idle(stream: ResumableStream) -> None:
+        if stream.subscribers == 0 and stream.task is not None and not stream.task.done():
+            stream.task.cancel()
+
+    async def _subscribe(self, stream: ResumableStream, after: int) -> AsyncIterator[bytes]:
+        stream.subscribers += 1
+        try:
+            async for framed in stream.follow(after):
+                yield framed
+        finally:
+            self._release(stream)
+
+    def response(self, stream: ResumableStream, after: int = 0) -> EventStreamResponse:
+        return EventStreamResponse(self._subscribe(stream, after), headers={"X-Stream-Id": stream.id})
+
+    def serve(self, last_event_id: Optional[str], factory: Callable[[], AsyncIterator[bytes]]) -> EventStreamResponse:
+        """带合法 Last-Event-ID 时续接已有的流（流已过期返回 404），否则用 ``factory`` 开始新的生成。"""
+        resume = parse_last_event_id(last_event_id)
+        if resume is not None:
+            stream = self.get(resume[0])
+            if stream is None:
+                raise HTTPException(status_code=404, detail="stream not found or expired")
+            return self.response(stream, resume[1])
+        return self.response(self.start(factory()))
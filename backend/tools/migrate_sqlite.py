@@ -0,0 +1,77 @@
+"""把现有 DATA_DIR（JSON 文件存储）批量导入 SQLite 存储。
+
+用法：
+  python -m backend.tools.migrate_sqlite [--data-dir ./data] [--db ./data/philohumanities.db]
+
+迁移是幂等的：重复执行会以 JSON 内容覆盖 SQLite 中的同 id 会话与同 key 的 token 用量。
+完成后设置 STORAGE_BACKEND=sqlite（以及可选 SQLITE_PATH）即可切换后端。
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from typing import Optional, Sequence
+
+from ..core.conversations.repository import Storage
+from ..core.conversations.sqlite_repository import SQLiteStorage
+from ..core.groups.repository import GroupStorage
+from ..core.groups.sqlite_repository import SQLiteGroupStorage
+from ..core.settings import Settings
+from ..core.usage.repository import USAGE_SCOPES, UsageStorage
+from ..core.usage.sqlite_repository import SQLiteUsageStorage
+from ..infrastructure.paths import resolve_data_dir
+
+
+def migrate(data_dir: str, db_path: str) -> dict:
+    target = resolve_data_dir(db_path)
+    src, dst = Storage(data_dir), SQLiteStorage(target)
+    conversations = 0
+    for meta in src.list_conversations():
+        try:
+            messages = src.get_messages(meta.id)
+        except FileNotFoundError:
+            continue
+        dst.import_conversation(meta, messages)
+        summary = src.get_summary(meta.id)
+        if summary is not None:
+            dst.set_summary(meta.id, summary)
+        conversations += 1
+
+    gsrc, gdst = GroupStorage(data_dir), SQLiteGroupStorage(target)
+    groups = 0
+    for item in gsrc.list():
+        try:
+            conv = gsrc.get(item["id"])
+        except FileNotFoundError:
+            continue
+        gdst.import_conversation(conv)
+        groups += 1
+
+    # usage.json 快照与 usage.journal 增量（读取时合并）
+    usrc, udst = UsageStorage(data_dir), SQLiteUsageStorage(target)
+    usage = 0
+    for scope in USAGE_SCOPES:
+        for totals in usrc.list(scope):
+            udst.import_totals(scope, totals["key"], totals)
+            usage += 1
+    return {"db": str(target), "conversations": conversations, "groups": groups, "usage": usage}
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    defaults = Settings()
+    parser = argparse.ArgumentParser(description="Import JSON conversation files into the SQLite backend.")
+    parser.add_argument("--data-dir", default=defaults.data_dir, help="source DATA_DIR (default: %(default)s)")
+    parser.add_argument("--db", default=None, help="target SQLite file (default: SQLITE_PATH or <data-dir>/philohumanities.db)")
+    args = parser.parse_args(argv)
+    db_path = args.db or os.getenv("SQLITE_PATH") or os.path.join(args.data_dir, "philohumanities.db")
+    result = migrate(args.data_dir, db_path)
+    print(
+        f"imported {result['conversations']} conversations, {result['groups']} group conversations"
+        f" and {result['usage']} usage totals into {result['db']}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""事件循环阻塞基准：并发 SSE 流 + 并发存储写入。
+
+模拟 N 条 SSE 流（每条每 ``--tick-ms`` 产生一个 delta）与 M 个并发写者
+（每个写者循环 append_message）。分别在两种模式下运行：
+
+  sync   写者在事件循环里直接调用同步 Storage（旧实现）
+  async  写者通过 AsyncStore 把调用放到线程池
+
+输出每种模式下的 delta 吞吐（ticks/s）、事件循环最大延迟与写入次数。
+``--slow-ms`` 可在每次写入时额外注入阻塞，模拟慢盘。
+
+用法：
+  python -m benchmarks.async_storage --streams 200 --writers 50 --seconds 3
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.core.conversations.models import Message
+from backend.core.conversations.repository import Storage
+from backend.infrastructure.async_io import AsyncStore
+
+
+class _SlowStorage(Storage):
+    def __init__(self, data_dir: str, slow_ms: float) -> None:
+        super().__init__(data_dir)
+        self._slow = slow_ms / 1000.0
+
+    def append_message(self, cid, message):
+        if self._slow:
+            time.sleep(self._slow)
+        return super().append_message(cid, message)
+
+
+async def _stream(stop: asyncio.Event, tick: float, counter: list, lag: list) -> None:
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(tick)
+        late = time.perf_counter() - t0 - tick
+        lag[0] = max(lag[0], late)
+        counter[0] += 1
+
+
+async def _run(mode: str, args: argparse.Namespace) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        store = _SlowStorage(tmp, args.slow_ms)
+        cids = [store.create_conversation(f"bench-{i}", None).id for i in range(args.writers)]
+        executor = ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="storage")
+        astore = AsyncStore(store, executor)
+        stop = asyncio.Event()
+        ticks, lag, writes = [0], [0.0], [0]
+
+        async def writer(cid: str) -> None:
+            while not stop.is_set():
+                msg = Message(role="user", content="异化劳动" * 20)
+                if mode == "sync":
+                    store.append_message(cid, msg)
+                    await asyncio.sleep(0)
+                else:
+                    await astore.append_message(cid, msg)
+                writes[0] += 1
+
+        tasks = [asyncio.create_task(_stream(stop, args.tick_ms / 1000.0, ticks, lag)) for _ in range(args.streams)]
+        tasks += [asyncio.create_task(writer(cid)) for cid in cids]
+        await asyncio.sleep(args.seconds)
+        stop.set()
+        await asyncio.gather(*tasks)
+        executor.shutdown(wait=True)
+        return {
+            "mode": mode,
+            "ticksPerSec": round(ticks[0] / args.seconds, 1),
+            "maxLoopLagMs": round(lag[0] * 1000, 2),
+            "writes": writes[0],
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--writers", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=8, help="storage thread pool size")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--tick-ms", type=float, default=10.0)
+    parser.add_argument("--slow-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    results = [asyncio.run(_run(mode, args)) for mode in ("sync", "async")]
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""端到端并发 SSE 压测：模拟大量用户同时使用角色对话、群聊、提问建议与知识库导入。
+
+默认在本进程的后台线程里启动两个 uvicorn 实例：被测应用（临时 DATA_DIR，真实的 Storage /
+GroupStorage / KnowledgeBaseManager 代码路径）与 ``benchmarks.mock_llm`` 模拟上游；压测客户端
+在主线程的事件循环里通过真实 HTTP 连接发请求，TTFT 与完成耗时按客户端收到 SSE 事件的时间计算。
+也可用 ``--app-url`` / ``--llm-url`` 指向已在运行的实例（此时无法统计存储写入耗时）。
+
+每个模拟用户按 ``--mix`` 的比例扮演一种角色，循环 ``--iterations`` 次：
+  role    创建角色会话 → 流式回复 → 请求提问建议
+  group   创建两人群聊 → 流式跑一轮
+  kb      创建知识库 → 导入一段文本
+
+输出 p50/p95/p99 的 TTFT、完成耗时（到 done 事件）、建议与导入耗时、存储写入耗时（按方法）与错误计数，
+并把结果写成 JSON（含 git commit），``--compare`` 可与之前的结果对比，便于在提交之间发现性能回退。
+
+用法：
+  python -m benchmarks.load_sse --users 200 --iterations 3
+  python -m benchmarks.load_sse --users 200 --backend sqlite --compare benchmarks/results/<old>.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import functools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from backend.core.llm.metrics import LatencyWindow
+
+
+_RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# 计入“存储写入耗时”的同步存储方法（在存储线程里执行，按方法名分别统计）
+_WRITE_METHODS = {
+    "conversations": ("append_message", "set_summary"),
+    "groups": ("commit_round", "append_user", "append_assistant", "set_last_speaker", "bump_turn", "update_orchestrator", "set_summary"),
+    "kb": ("create_kb", "ingest_text"),
+}
+
+
+class _Recorder:
+    def __init__(self) -> None:
+        self.series: Dict[str, LatencyWindow] = {}
+        self.errors: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            window = self.series.get(name)
+            if window is None:
+                window = self.series[name] = LatencyWindow(1_000_000)
+            window.add(seconds)
+
+    def error(self, kind: str) -> None:
+        with self._lock:
+            self.errors[kind] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {name: w.snapshot() for name, w in sorted(self.series.items())}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _serve(app: Any, port: int) -> Any:
+    """在后台线程中运行 uvicorn，返回 server（``should_exit = True`` 即可停止）。"""
+    import uvicorn
+
+    # keep-alive 超时要长于压测中连接的空闲时间，否则复用被服务端关闭的连接会在客户端表现为 ReadError
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on", timeout_keep_alive=120)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, name=f"uvicorn-{port}", daemon=True)
+    thread.start()
+    deadline = time.time() + 15
+    while not server.started:
+        if time.time() > deadline or not thread.is_alive():
+            raise RuntimeError(f"server on port {port} failed to start")
+        time.sleep(0.05)
+    server._thread = thread  # type: ignore[attr-defined]
+    return server
+
+
+def _instrument(recorder: _Recorder) -> None:
+    """给存储类的写方法套上计时（类级别替换，覆盖 JSON 与 SQLite 两种实现）。"""
+    from backend.core.conversations.repository import Storage
+    from backend.core.conversations.sqlite_repository import SQLiteStorage
+    from backend.core.groups.repository import GroupStorage
+    from backend.core.groups.sqlite_repository import SQLiteGroupStorage
+    from backend.core.knowledge_base.manager import KnowledgeBaseManager
+
+    classes = {
+        "conversations": (Storage, SQLiteStorage),
+        "groups": (GroupStorage, SQLiteGroupStorage),
+        "kb": (KnowledgeBaseManager,),
+    }
+    for group, names in _WRITE_METHODS.items():
+        for cls in classes[group]:
+            for name in names:
+                original = cls.__dict__.get(name)
+                if original is None:
+                    continue
+
+                def timed(*args: Any, __fn: Callable[..., Any] = original, __name: str = f"storage.{group}.{name}", **kwargs: Any) -> Any:
+                    started = time.perf_counter()
+                    try:
+                        return __fn(*args, **kwargs)
+                    finally:
+                        recorder.add(__name, time.perf_counter() - started)
+
+                setattr(cls, name, functools.wraps(original)(timed))
+
+
+async def _stream(
+    client: httpx.AsyncClient, url: str, payload: Dict[str, Any], recorder: _Recorder, prefix: str, delta_event: str
+) -> None:
+    started = time.perf_counter()
+    first = None
+    event = None
+    async with client.stream("POST", url, json=payload) as resp:
+        if resp.status_code != 200:
+            await resp.aread()
+            recorder.error(f"{prefix}.http_{resp.status_code}")
+            return
+        async for line in resp.aiter_lines():
+            if line.startswith("event:"):
+                event = line[6:].strip()
+                if event == "done":
+                    break
+                continue
+            if not line.startswith("data:"):
+                continue
+            if event == delta_event and first is None:
+                first = time.perf_counter() - started
+            elif event == "error":
+                recorder.error(f"{prefix}.sse_error")
+                return
+    if first is None:
+        recorder.error(f"{prefix}.no_output")
+        return
+    recorder.add(f"{prefix}.ttft", first)
+    recorder.add(f"{prefix}.done", time.perf_counter() - started)
+
+
+async def _timed_post(client: httpx.AsyncClient, url: str, payload: Dict[str, Any], recorder: _Recorder, name: str) -> Optional[Dict[str, Any]]:
+    started = time.perf_counter()
+    resp = await client.post(url, json=payload)
+    if resp.status_code != 200:
+        recorder.error(f"{name}.http_{resp.status_code}")
+        return None
+    recorder.add(name, time.perf_counter() - started)
+    return resp.json()
+
+
+_QUESTIONS = ["什么是异化劳动？", "如何理解剩余价值？", "家庭在历史中如何演变？", "谈谈生产力与生产关系。"]
+_KB_TEXT = "第一章 商品\n\n" + "资本主义生产方式占统治地位的社会的财富，表现为“庞大的商品堆积”。" * 20
+
+
+async def _role_user(client: httpx.AsyncClient, rng: random.Random, args: argparse.Namespace, recorder: _Recorder) -> None:
+    conv = await _timed_post(client, "/api/role-conversations", {"roleCardId": rng.choice(["Marx", "Engels"])}, recorder, "role.create")
+    if conv is None:
+        return
+    cid = conv["conversationId"]
+    for _ in range(args.iterations):
+        payload = {"roleCardId": conv["roleCardId"], "text": rng.choice(_QUESTIONS), "max_tokens": args.max_tokens}
+        await _stream(client, f"/api/role-conversations/{cid}/assistant/stream", payload, recorder, "role", "message.delta")
+        await _timed_post(client, f"/api/conversations/{cid}/suggestions", {"k": 3}, recorder, "suggestions")
+
+
+async def _group_user(client: httpx.AsyncClient, rng: random.Random, args: argparse.Namespace, recorder: _Recorder) -> None:
+    participants = [{"roleCardId": "Marx", "agentId": "marx"}, {"roleCardId": "Engels", "agentId": "engels"}]
+    conv = await _timed_post(client, "/api/group-conversations", {"participants": participants}, recorder, "group.create")
+    if conv is None:
+        return
+    for i in range(args.iterations):
+        payload = {"text": rng.choice(_QUESTIONS)} if i == 0 else {}
+        await _stream(client, f"/api/group-conversations/{conv['id']}/assistant/stream", payload, recorder, "group", "agent.message.delta")
+
+
+async def _kb_user(client: httpx.AsyncClient, rng: random.Random, args: argparse.Namespace, recorder: _Recorder) -> None:
+    kb = await _timed_post(client, "/api/kb", {"title": "压测语料", "roleCardId": "Marx"}, recorder, "kb.create")
+    if kb is None:
+        return
+    for i in range(args.iterations):
+        await _timed_post(client, f"/api/kb/{kb['id']}/ingest-text", {"title": f"文档{i}", "text": _KB_TEXT}, recorder, "kb.ingest")
+
+
+_SCENARIOS = {"role": _role_user, "group": _group_user, "kb": _kb_user}
+
+
+def _parse_mix(spec: str) -> List[Tuple[str, float]]:
+    mix = []
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in _SCENARIOS:
+            raise SystemExit(f"unknown scenario in --mix: {name}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+async def _drive(app_url: str, args: argparse.Namespace, recorder: _Recorder) -> Dict[str, int]:
+    rng = random.Random(args.seed)
+    mix = _parse_mix(args.mix)
+    names = [n for n, _ in mix]
+    weights = [w for _, w in mix]
+    roles = [rng.choices(names, weights)[0] for _ in range(args.users)]
+    limits = httpx.Limits(max_connections=args.users * 2, max_keepalive_connections=args.users)
+    timeout = httpx.Timeout(args.timeout)
+    async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=timeout) as client:
+
+        async def user(i: int, role: str) -> None:
+            # 错开启动，避免所有用户在同一毫秒发起连接
+            await asyncio.sleep(rng.uniform(0, args.ramp))
+            try:
+                await _SCENARIOS[role](client, random.Random(args.seed + i), args, recorder)
+            except httpx.HTTPError as e:
+                recorder.error(f"{role}.{type(e).__name__}")
+
+        await asyncio.gather(*(user(i, role) for i, role in enumerate(roles)))
+    return dict(Counter(roles))
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def _compare(current: Dict[str, Any], baseline_path: str) -> Dict[str, Any]:
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    diff: Dict[str, Any] = {}
+    for name, cur in current["metrics"].items():
+        old = baseline.get("metrics", {}).get(name)
+        if not old:
+            continue
+        row = {}
+        for key in ("p50Ms", "p95Ms", "p99Ms"):
+            if cur.get(key) is not None and old.get(key):
+                row[key] = f"{old[key]} -> {cur[key]} ({(cur[key] - old[key]) / old[key] * 100:+.1f}%)"
+        diff[name] = row
+    return {"baseline": baseline.get("meta", {}).get("commit"), "metrics": diff}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=3, help="turns / rounds / ingests per user")
+    parser.add_argument("--mix", default="role=6,group=3,kb=1", help="scenario weights")
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--max-tokens", type=int, default=120)
+    parser.add_argument("--ttft-ms", type=float, default=300.0, help="mock LLM time to first token")
+    parser.add_argument("--tps", type=float, default=40.0, help="mock LLM tokens per second")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="mock LLM 429 probability")
+    parser.add_argument("--ramp", type=float, default=1.0, help="spread user start over this many seconds")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--app-url", default=None, help="benchmark an already running app instead")
+    parser.add_argument("--llm-url", default=None, help="use an already running mock LLM instead")
+    parser.add_argument("--out", default=None, help="result JSON path (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", default=None, help="previous result JSON to compare against")
+    args = parser.parse_args()
+
+    recorder = _Recorder()
+    servers = []
+    data_dir = None
+    try:
+        llm_url = args.llm_url
+        if llm_url is None:
+            from benchmarks.mock_llm import MockConfig, create_app as create_mock
+
+            port = _free_port()
+            mock = create_mock(MockConfig(ttft_ms=args.ttft_ms, tps=args.tps, tokens=args.max_tokens, rate_429=args.rate_429), seed=args.seed)
+            servers.append(_serve(mock, port))
+            llm_url = f"http://127.0.0.1:{port}"
+        app_url = args.app_url
+        if app_url is None:
+            data_dir = tempfile.TemporaryDirectory(prefix="bench-")
+            os.environ.update(
+                DATA_DIR=data_dir.name,
+                STORAGE_BACKEND=args.backend,
+                LLM_BASE_URL=llm_url,
+                LLM_MODEL=os.environ.get("LLM_MODEL") or "mock",
+            )
+            os.environ.pop("SQLITE_PATH", None)
+            _instrument(recorder)
+            from backend.app.main import app
+
+            port = _free_port()
+            servers.append(_serve(app, port))
+            app_url = f"http://127.0.0.1:{port}"
+
+        started = time.perf_counter()
+        users = asyncio.run(_drive(app_url, args, recorder))
+        elapsed = time.perf_counter() - started
+    finally:
+        for server in reversed(servers):
+            server.should_exit = True
+            server._thread.join(timeout=10)
+        if data_dir is not None:
+            data_dir.cleanup()
+
+    commit = _git_commit()
+    result = {
+        "meta": {
+            "commit": commit,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "elapsedS": round(elapsed, 2),
+            "users": users,
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        },
+        "metrics": recorder.snapshot(),
+        "errors": dict(recorder.errors),
+    }
+    out = Path(args.out) if args.out else _RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{commit or 'nogit'}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.compare:
+        print(json.dumps(_compare(result, args.compare), ensure_ascii=False, indent=2))
+    print(f"saved to {out}")
+
+
+if __name__ == "__main__":
+    main()
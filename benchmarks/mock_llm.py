@@ -0,0 +1,248 @@
+"""本地 OpenAI 兼容的模拟 LLM 服务，用于压测与延迟测试（不消耗真实 provider 配额、无需联网）。
+
+实现 ``POST /v1/chat/completions``（流式 / 非流式）与 ``GET /v1/models``，可配置：
+
+  --ttft-ms / --ttft-jitter-ms   首个 token 前的延迟（加均匀抖动）
+  --prefill-tps                  每秒处理的提示词 token 数（按字符计；首个 token 前额外等待，0 为不模拟）
+  --tps                          每秒输出的 token 数（流式按此节奏逐个推送，非流式按总时长等待）
+  --tokens                       每次回复的 token 数上限（同时受请求里的 max_tokens 约束）
+  --error-rate                   以该概率返回 500
+  --rate-429                     以该概率返回 429（带 Retry-After）
+  --seed                         随机种子，便于复现
+
+回复内容是随机拼接的中文片段；判官请求（提示词含“候选: [...]”）会回答其中一个候选 agentId，
+提问建议请求（要求输出 JSON 数组）会返回合法的 JSON，群聊与提问建议的完整流程都能跑通。
+请求带 ``stream_options.include_usage`` 时流末尾附带 usage。
+
+运行时调参与统计：
+  GET  /mock/stats    请求数、流数、被客户端中断的流、注入的错误等
+  POST /mock/config   body 为上述参数的 JSON（如 {"ttft_ms": 800, "rate_429": 0.2}），即时生效
+
+接入方式：LLM_BASE_URL=http://127.0.0.1:8001（LLM_MODEL 任意），或在 providers.json 中添加
+{"alias": "mock", "base_url": "http://127.0.0.1:8001", "default_model": "mock"}。
+
+用法：
+  python -m benchmarks.mock_llm --port 8001 --ttft-ms 300 --tps 40 --rate-429 0.05
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from dataclasses import asdict, dataclass, fields
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+_PIECES = [
+    "资本", "劳动", "的", "异化", "社会", "关系", "在", "历史", "中", "生产力", "与", "生产关系",
+    "辩证", "地", "看", "，", "。", "人", "是", "一切", "社会关系", "的总和", "我们", "必须", "首先",
+    "承认", "物质", "条件", "决定", "意识", "而", "不是", "相反", "；", "因此", "阶级", "斗争",
+]
+_CANDIDATES = re.compile(r"候选: \[([^\]]*)\]")
+
+
+@dataclass
+class MockConfig:
+    ttft_ms: float = 300.0
+    ttft_jitter_ms: float = 100.0
+    prefill_tps: float = 0.0
+    tps: float = 40.0
+    tokens: int = 120
+    error_rate: float = 0.0
+    rate_429: float = 0.0
+
+
+class _Stats:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.streams = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.errors_500 = 0
+        self.errors_429 = 0
+        self.in_flight = 0
+        self.started = time.time()
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "streams": self.streams,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "errors500": self.errors_500,
+            "errors429": self.errors_429,
+            "inFlight": self.in_flight,
+            "uptimeS": round(time.time() - self.started, 1),
+        }
+
+
+def _prompt_text(messages: List[Dict[str, Any]]) -> str:
+    return "\n".join(str(m.get("content") or "") for m in messages)
+
+
+def _reply(rng: random.Random, prompt: str, limit: int) -> List[str]:
+    """按请求类型生成回复，返回逐 token 的片段列表。"""
+    m = _CANDIDATES.search(prompt)
+    if m:
+        candidates = [c.strip() for c in m.group(1).split(",") if c.strip()]
+        return [rng.choice(candidates)] if candidates else ["?"]
+    if "JSON数组" in prompt:
+        items = [{"text": "".join(rng.choice(_PIECES) for _ in range(8)) + "？", "angle": "clarify"} for _ in range(4)]
+        return [json.dumps(items, ensure_ascii=False)]
+    return [rng.choice(_PIECES) for _ in range(max(1, limit))]
+
+
+def create_app(config: MockConfig, seed: Optional[int] = None) -> FastAPI:
+    app = FastAPI(title="mock-llm")
+    rng = random.Random(seed)
+    stats = _Stats()
+
+    def _fault() -> Optional[JSONResponse]:
+        roll = rng.random()
+        if roll < config.rate_429:
+            stats.errors_429 += 1
+            return JSONResponse(
+                {"error": {"message": "rate limited (mock)", "type": "rate_limit_exceeded"}},
+                status_code=429,
+                headers={"Retry-After": "1"},
+            )
+        if roll < config.rate_429 + config.error_rate:
+            stats.errors_500 += 1
+            return JSONResponse({"error": {"message": "internal error (mock)", "type": "server_error"}}, status_code=500)
+        return None
+
+    def _ttft(prompt_tokens: int) -> float:
+        base = max(0.0, config.ttft_ms + rng.uniform(-config.ttft_jitter_ms, config.ttft_jitter_ms)) / 1000.0
+        return base + (prompt_tokens / config.prefill_tps if config.prefill_tps > 0 else 0.0)
+
+    @app.get("/v1/models")
+    async def models() -> Dict[str, Any]:
+        return {"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "mock"}]}
+
+    @app.get("/mock/stats")
+    async def get_stats() -> Dict[str, Any]:
+        return {"config": asdict(config), **stats.as_dict()}
+
+    @app.post("/mock/config")
+    async def set_config(payload: Dict[str, Any]) -> Dict[str, Any]:
+        for f in fields(MockConfig):
+            if f.name in payload:
+                setattr(config, f.name, type(getattr(config, f.name))(payload[f.name]))
+        return asdict(config)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats.requests += 1
+        fault = _fault()
+        if fault is not None:
+            return fault
+        messages = body.get("messages") or []
+        model = body.get("model") or "mock"
+        limit = min(config.tokens, int(body.get("max_tokens") or config.tokens))
+        pieces = _reply(rng, _prompt_text(messages), limit)
+        prompt_tokens = sum(len(str(m.get("content") or "")) for m in messages)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(pieces),
+            "total_tokens": prompt_tokens + len(pieces),
+        }
+        cid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        interval = 1.0 / config.tps if config.tps > 0 else 0.0
+
+        if not body.get("stream"):
+            stats.in_flight += 1
+            try:
+                await asyncio.sleep(_ttft(prompt_tokens) + interval * max(0, len(pieces) - 1))
+            finally:
+                stats.in_flight -= 1
+            stats.completed += 1
+            return {
+                "id": cid,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": "".join(pieces)}, "finish_reason": "stop"}
+                ],
+                "usage": usage,
+            }
+
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+        def frame(delta: Dict[str, Any], finish: Optional[str] = None) -> str:
+            chunk = {
+                "id": cid,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }
+            return "data: " + json.dumps(chunk, ensure_ascii=False) + "\n\n"
+
+        async def events() -> AsyncIterator[str]:
+            stats.streams += 1
+            stats.in_flight += 1
+            try:
+                await asyncio.sleep(_ttft(prompt_tokens))
+                yield frame({"role": "assistant", "content": ""})
+                for i, piece in enumerate(pieces):
+                    if i:
+                        await asyncio.sleep(interval)
+                    yield frame({"content": piece})
+                yield frame({}, "stop")
+                if include_usage:
+                    tail = {"id": cid, "object": "chat.completion.chunk", "created": created, "model": model, "choices": [], "usage": usage}
+                    yield "data: " + json.dumps(tail) + "\n\n"
+                yield "data: [DONE]\n\n"
+                stats.completed += 1
+            except asyncio.CancelledError:
+                # 客户端断开（上游取消）
+                stats.cancelled += 1
+                raise
+            finally:
+                stats.in_flight -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--ttft-ms", type=float, default=300.0)
+    parser.add_argument("--ttft-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--prefill-tps", type=float, default=0.0, help="prompt tokens processed per second before the first token")
+    parser.add_argument("--tps", type=float, default=40.0, help="tokens per second while streaming")
+    parser.add_argument("--tokens", type=int, default=120, help="max tokens per reply")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of a 500 response")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="probability of a 429 response")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    config = MockConfig(
+        ttft_ms=args.ttft_ms,
+        ttft_jitter_ms=args.ttft_jitter_ms,
+        prefill_tps=args.prefill_tps,
+        tps=args.tps,
+        tokens=args.tokens,
+        error_rate=args.error_rate,
+        rate_429=args.rate_429,
+    )
+
+    import uvicorn
+
+    uvicorn.run(create_app(config, seed=args.seed), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
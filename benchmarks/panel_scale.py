@@ -0,0 +1,151 @@
+"""大群编排基准：参与者人数与每轮耗时、判官提示词长度的关系。
+
+对每个 ``--sizes`` 中的人数各建一个群（参与者轮流使用已有角色卡，agentId / 名字各不相同），
+分别在两种编排下连续跑 ``--rounds`` 轮：
+
+  prefilter   默认：候选多于 judgeTopK 时先本地打分，判官只看前 k 位
+  full        judgeTopK=0：判官看到全部候选与名册（旧行为）
+
+被测应用与 ``benchmarks.mock_llm`` 在本进程的后台线程中运行；模拟上游按 ``--prefill-tps`` 随提示词长度增加首 token 延迟，
+使判官耗时像真实模型一样随提示词增长。输出每种组合的判官决定耗时、整轮耗时（到 done）的 p50 / p95，
+以及判官提示词的平均 token 数（取自 referee_log）。
+
+用法：
+  python -m benchmarks.panel_scale --sizes 3,10,25,50 --rounds 5
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import httpx
+
+from backend.core.llm.metrics import LatencyWindow
+from backend.core.llm.tokens import TokenCounter
+from benchmarks.load_sse import _free_port, _serve
+
+
+_CARDS = ("Marx", "Engels")
+_OPENING = "请各位谈谈分工、异化劳动与家庭结构之间的关系。"
+
+
+async def _round(client: httpx.AsyncClient, gid: str, text: str) -> Tuple[float, float]:
+    """跑一轮，返回 (到 judge.decision 的秒数, 到 done 的秒数)。"""
+    started = time.perf_counter()
+    decided = None
+    async with client.stream("POST", f"/api/group-conversations/{gid}/assistant/stream", json={"text": text}) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if not line.startswith("event:"):
+                continue
+            event = line[6:].strip()
+            if event == "judge.decision":
+                decided = time.perf_counter() - started
+            elif event == "error":
+                raise RuntimeError(f"round failed in group {gid}")
+            elif event == "done":
+                break
+    return decided or 0.0, time.perf_counter() - started
+
+
+def _judge_prompt_tokens(data_dir: Path, gid: str, counter: TokenCounter) -> List[int]:
+    sizes = []
+    for path in sorted((data_dir / "referee_log" / gid).glob("turn_*.jsonl")):
+        for line in path.read_text(encoding="utf-8").splitlines():
+            sizes.append(counter.count(json.loads(line)["prompt"]))
+    return sizes
+
+
+async def _run(app_url: str, data_dir: Path, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    counter = TokenCounter()
+    rows = []
+    async with httpx.AsyncClient(base_url=app_url, timeout=args.timeout) as client:
+        for size in args.sizes:
+            for mode, top_k in (("prefilter", None), ("full", 0)):
+                participants = [
+                    {"agentId": f"p{i:02d}", "roleCardId": _CARDS[i % len(_CARDS)], "name": f"{_CARDS[i % len(_CARDS)]}#{i}"}
+                    for i in range(size)
+                ]
+                resp = await client.post("/api/group-conversations", json={"participants": participants})
+                resp.raise_for_status()
+                gid = resp.json()["id"]
+                if top_k is not None:
+                    (await client.patch(f"/api/group-conversations/{gid}/orchestrator", json={"judgeTopK": top_k})).raise_for_status()
+                judge, total = LatencyWindow(args.rounds), LatencyWindow(args.rounds)
+                for i in range(args.rounds):
+                    decided, done = await _round(client, gid, _OPENING if i == 0 else "")
+                    judge.add(decided)
+                    total.add(done)
+                prompts = _judge_prompt_tokens(data_dir, gid, counter)
+                j, t = judge.snapshot(), total.snapshot()
+                rows.append(
+                    {
+                        "participants": size,
+                        "mode": mode,
+                        "judgeP50Ms": j["p50Ms"],
+                        "judgeP95Ms": j["p95Ms"],
+                        "roundP50Ms": t["p50Ms"],
+                        "roundP95Ms": t["p95Ms"],
+                        "judgePromptTokens": round(sum(prompts) / len(prompts)) if prompts else 0,
+                    }
+                )
+                print(json.dumps(rows[-1], ensure_ascii=False), flush=True)
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=lambda v: [int(x) for x in v.split(",")], default=[3, 10, 25, 50])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--ttft-ms", type=float, default=300.0, help="mock LLM time to first token")
+    parser.add_argument("--prefill-tps", type=float, default=4000.0, help="mock LLM prompt tokens processed per second")
+    parser.add_argument("--tps", type=float, default=200.0, help="mock LLM tokens per second")
+    parser.add_argument("--max-tokens", type=int, default=60)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--out", default=None, help="also write the rows to this JSON file")
+    args = parser.parse_args()
+
+    from benchmarks.mock_llm import MockConfig, create_app as create_mock
+
+    servers = []
+    data_dir = tempfile.TemporaryDirectory(prefix="bench-panel-")
+    try:
+        port = _free_port()
+        mock = create_mock(
+            MockConfig(ttft_ms=args.ttft_ms, ttft_jitter_ms=0.0, prefill_tps=args.prefill_tps, tps=args.tps, tokens=args.max_tokens), seed=7
+        )
+        servers.append(_serve(mock, port))
+        os.environ.update(
+            DATA_DIR=data_dir.name,
+            LLM_BASE_URL=f"http://127.0.0.1:{port}",
+            LLM_MODEL=os.environ.get("LLM_MODEL") or "mock",
+            GROUP_MAX_PARTICIPANTS=str(max(args.sizes)),
+        )
+        from backend.app.main import app
+
+        port = _free_port()
+        servers.append(_serve(app, port))
+        rows = asyncio.run(_run(f"http://127.0.0.1:{port}", Path(data_dir.name), args))
+    finally:
+        for server in reversed(servers):
+            server.should_exit = True
+            server._thread.join(timeout=10)
+        data_dir.cleanup()
+
+    print(f"\n{'participants':>12} {'mode':>10} {'judge p50':>10} {'round p50':>10} {'round p95':>10} {'judge prompt':>13}")
+    for r in rows:
+        print(
+            f"{r['participants']:>12} {r['mode']:>10} {r['judgeP50Ms']:>8}ms {r['roundP50Ms']:>8}ms {r['roundP95Ms']:>8}ms {r['judgePromptTokens']:>9} tok"
+        )
+    if args.out:
+        Path(args.out).write_text(json.dumps(rows, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -68,9 +68,13 @@
     wantSpeak: false,
     paused: false,
     selectedRole: null, // { slug, name }
-    selectedGroup: new Set()
+    selectedGroup: new Set(),
+    // 历史分页：start 为当前已加载的最早消息序号
+    history: { start: 0, hasMore: false, loading: false }
   };
 
+  const HISTORY_PAGE_SIZE = 50;
+
   // 更新群聊控制UI
   function updateGroupControlsUI() {
     if (DOM.groupControls) {
@@ -150,8 +154,10 @@
     });
   }
 
-  // 渲染消息
-  function renderMessages() {
+  // 渲染消息（keepScroll：向上加载更早历史时保持当前阅读位置）
+  function renderMessages(keepScroll = false) {
+    const prevHeight = DOM.messages.scrollHeight;
+    const prevTop = DOM.messages.scrollTop;
     DOM.messages.innerHTML = '';
     const messages = state.isGroupMode ? (window.__gmsgs || []) : (window.__msgs || []);
 
@@ -172,7 +178,11 @@
       DOM.messages.appendChild(div);
     });
 
-    DOM.messages.scrollTop = DOM.messages.scrollHeight;
+    if (keepScroll) {
+      DOM.messages.scrollTop = DOM.messages.scrollHeight - prevHeight + prevTop;
+    } else {
+      DOM.messages.scrollTop = DOM.messages.scrollHeight;
+    }
   }
 
   // 处理流式响应
@@ -276,13 +286,13 @@
     }
   }
 
-  // 加载消息
+  // 加载消息（只取最近一页，更早的历史在滚动到顶部时按需加载）
   async function loadMessages() {
     if (!state.activeId && !state.activeGroupId) return;
 
     try {
       if (state.isGroupMode) {
-        const data = await fetchJSON(`/api/group-conversations/${state.activeGroupId}`);
+        const data = await fetchJSON(`/api/group-conversations/${state.activeGroupId}?limit=${HISTORY_PAGE_SIZE}`);
         const parts = data.participants || [];
         state.groupParticipantsById = {};
         parts.forEach(p => {
@@ -292,9 +302,12 @@
           };
         });
         window.__gmsgs = data.messages || [];
+        const page = data.page || {};
+        state.history = { start: page.start || 0, hasMore: !!page.hasMore, loading: false };
       } else {
-        const data = await fetchJSON(`/api/conversations/${state.activeId}/messages`);
+        const data = await fetchJSON(`/api/conversations/${state.activeId}/messages?limit=${HISTORY_PAGE_SIZE}`);
         window.__msgs = data.messages || [];
+        state.history = { start: data.start || 0, hasMore: !!data.hasMore, loading: false };
       }
       renderMessages();
     } catch (err) {
@@ -302,6 +315,38 @@
     }
   }
 
+  // 向上滚动时加载更早的一页历史
+  async function loadOlderMessages() {
+    const hist = state.history;
+    if (!hist.hasMore || hist.loading) return;
+    if (!state.isGroupMode && !state.activeId) return;
+    if (state.isGroupMode && !state.activeGroupId) return;
+
+    hist.loading = true;
+    const groupMode = state.isGroupMode;
+    const convId = groupMode ? state.activeGroupId : state.activeId;
+    try {
+      const query = `before=${hist.start}&limit=${HISTORY_PAGE_SIZE}`;
+      if (groupMode) {
+        const data = await fetchJSON(`/api/group-conversations/${convId}?${query}`);
+        if (!state.isGroupMode || state.activeGroupId !== convId) return;
+        const page = data.page || {};
+        window.__gmsgs = (data.messages || []).concat(window.__gmsgs || []);
+        state.history = { start: page.start || 0, hasMore: !!page.hasMore, loading: false };
+      } else {
+        const data = await fetchJSON(`/api/conversations/${convId}/messages?${query}`);
+        if (state.isGroupMode || state.activeId !== convId) return;
+        window.__msgs = (data.messages || []).concat(window.__msgs || []);
+        state.history = { start: data.start || 0, hasMore: !!data.hasMore, loading: false };
+      }
+      renderMessages(true);
+    } catch (err) {
+      console.error('加载更早消息失败', err);
+    } finally {
+      hist.loading = false;
+    }
+  }
+
   // 发送私聊消息
   async function handleSend(text) {
     if (!state.activeId) {
@@ -532,6 +577,13 @@
 
   // 初始化事件监听
   function initEvents() {
+    // 滚动到顶部时懒加载更早的历史
+    DOM.messages.addEventListener('scroll', () => {
+      if (DOM.messages.scrollTop < 40) {
+        loadOlderMessages();
+      }
+    });
+
     // 表单提交
     DOM.composer.addEventListener('submit', (e) => {
       e.preventDefault();
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 测试直接导入 backend / benchmarks（仓库根目录不是可安装的包）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
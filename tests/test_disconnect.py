@@ -0,0 +1,143 @@
+"""客户端中途断开 SSE 时取消上游生成，并把中断的回复记为 partial / aborted。
+
+用本地 ``benchmarks.mock_llm`` 作为慢上游（逐 token 缓慢推送），被测应用与模拟上游都在后台线程的
+uvicorn 中运行，客户端通过真实 HTTP 连接读取几条事件后断开。
+"""
+from __future__ import annotations
+
+import time
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import httpx
+import pytest
+
+from benchmarks.load_sse import _free_port, _serve
+from benchmarks.mock_llm import MockConfig, create_app as create_mock
+
+
+# 断线后等待重连的宽限期（SSE_RESUME_GRACE），测试里缩短以便很快看到取消
+_GRACE = 0.2
+
+
+@pytest.fixture(scope="module")
+def servers(tmp_path_factory: pytest.TempPathFactory) -> Iterator[Dict[str, str]]:
+    mock_port = _free_port()
+    mock = _serve(create_mock(MockConfig(ttft_ms=100.0, ttft_jitter_ms=0.0, tps=5.0, tokens=200), seed=1), mock_port)
+    mock_url = f"http://127.0.0.1:{mock_port}"
+    env = pytest.MonkeyPatch()
+    env.setenv("DATA_DIR", str(tmp_path_factory.mktemp("data")))
+    env.setenv("STORAGE_BACKEND", "json")
+    env.setenv("LLM_BASE_URL", mock_url)
+    env.setenv("LLM_MODEL", "mock")
+    env.setenv("SSE_RESUME_GRACE", str(_GRACE))
+    from backend.app import dependencies
+    from backend.app.main import app
+
+    # 依赖是进程级单例：按本测试的环境变量重新创建
+    for value in vars(dependencies).values():
+        if callable(getattr(value, "cache_clear", None)):
+            value.cache_clear()
+    app_port = _free_port()
+    server = _serve(app, app_port)
+    try:
+        yield {"app": f"http://127.0.0.1:{app_port}", "mock": mock_url}
+    finally:
+        server.should_exit = True
+        mock.should_exit = True
+        server._thread.join(timeout=10)
+        mock._thread.join(timeout=10)
+        env.undo()
+
+
+def _mock(servers: Dict[str, str], **config: Any) -> Dict[str, Any]:
+    if config:
+        httpx.post(f"{servers['mock']}/mock/config", json=config).raise_for_status()
+    return httpx.get(f"{servers['mock']}/mock/stats").json()
+
+
+def _read_then_disconnect(url: str, payload: Dict[str, Any], stop_at: str) -> None:
+    """读到事件 ``stop_at`` 后立即关闭连接。"""
+    with httpx.Client(timeout=30) as client:
+        with client.stream("POST", url, json=payload) as resp:
+            assert resp.status_code == 200
+            for line in resp.iter_lines():
+                if line.startswith("event:") and line[6:].strip() == stop_at:
+                    return
+    pytest.fail(f"stream ended before {stop_at}")
+
+
+def _wait_for(check: Callable[[], Optional[Any]], timeout: float = 10.0) -> Any:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = check()
+        if value:
+            return value
+        time.sleep(0.05)
+    pytest.fail("condition not met before timeout")
+
+
+def _last_role_message(servers: Dict[str, str], cid: str) -> Optional[Dict[str, Any]]:
+    data = httpx.get(f"{servers['app']}/api/conversations/{cid}/messages").json()
+    messages = data if isinstance(data, list) else data.get("messages", [])
+    return messages[-1] if messages and messages[-1]["role"] == "assistant" else None
+
+
+def _last_group_message(servers: Dict[str, str], gid: str) -> Optional[Dict[str, Any]]:
+    messages = httpx.get(f"{servers['app']}/api/group-conversations/{gid}").json()["messages"]
+    return messages[-1] if messages and messages[-1]["role"] == "assistant" else None
+
+
+def test_role_stream_disconnect_cancels_upstream_and_saves_partial(servers: Dict[str, str]) -> None:
+    _mock(servers, ttft_ms=100.0)
+    cid = httpx.post(f"{servers['app']}/api/role-conversations", json={"roleCardId": "Marx"}).json()["conversationId"]
+    before = _mock(servers)["cancelled"]
+
+    _read_then_disconnect(
+        f"{servers['app']}/api/role-conversations/{cid}/assistant/stream",
+        {"roleCardId": "Marx", "text": "什么是商品？"},
+        stop_at="message.delta",
+    )
+
+    _wait_for(lambda: _mock(servers)["cancelled"] > before)
+    message = _wait_for(lambda: _last_role_message(servers, cid))
+    assert message["state"] == "partial"
+    assert message["content"]
+
+
+def test_role_stream_disconnect_before_first_token_saves_aborted(servers: Dict[str, str]) -> None:
+    _mock(servers, ttft_ms=5000.0)
+    try:
+        cid = httpx.post(f"{servers['app']}/api/role-conversations", json={"roleCardId": "Marx"}).json()["conversationId"]
+        before = _mock(servers)["cancelled"]
+
+        _read_then_disconnect(
+            f"{servers['app']}/api/role-conversations/{cid}/assistant/stream",
+            {"roleCardId": "Marx", "text": "什么是价值？"},
+            stop_at="message.created",
+        )
+
+        _wait_for(lambda: _mock(servers)["cancelled"] > before)
+        message = _wait_for(lambda: _last_role_message(servers, cid))
+        assert message["state"] == "aborted"
+        assert message["content"] == ""
+    finally:
+        _mock(servers, ttft_ms=100.0)
+
+
+def test_group_stream_disconnect_cancels_upstream_and_saves_partial(servers: Dict[str, str]) -> None:
+    _mock(servers, ttft_ms=100.0)
+    participants = [{"agentId": "marx", "roleCardId": "Marx"}, {"agentId": "engels", "roleCardId": "Engels"}]
+    gid = httpx.post(f"{servers['app']}/api/group-conversations", json={"participants": participants}).json()["id"]
+    before = _mock(servers)["cancelled"]
+
+    _read_then_disconnect(
+        f"{servers['app']}/api/group-conversations/{gid}/assistant/stream",
+        {"text": "谈谈异化劳动"},
+        stop_at="agent.message.delta",
+    )
+
+    _wait_for(lambda: _mock(servers)["cancelled"] > before)
+    message = _wait_for(lambda: _last_group_message(servers, gid))
+    assert message["state"] == "partial"
+    assert message["agentId"] in ("marx", "engels")
+    assert httpx.get(f"{servers['app']}/api/group-conversations/{gid}").json()["turn"] == 0